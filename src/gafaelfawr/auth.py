@@ -6,7 +6,7 @@ import base64
 import re
 from dataclasses import dataclass
 from enum import Enum, auto
-from typing import Optional, Set
+from typing import AbstractSet, Optional
 
 from fastapi import HTTPException, status
 
@@ -106,7 +106,7 @@ def generate_challenge(
     context: RequestContext,
     auth_type: AuthType,
     exc: OAuthBearerError,
-    scopes: Optional[Set[str]] = None,
+    scopes: Optional[AbstractSet[str]] = None,
 ) -> HTTPException:
     """Convert an exception into an HTTP error with ``WWW-Authenticate``.
 
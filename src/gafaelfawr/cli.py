@@ -2,21 +2,38 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
 from typing import TYPE_CHECKING
 
 import click
+import structlog
 import uvicorn
-
-from gafaelfawr.database import initialize_database
+from aioredis import create_redis_pool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from gafaelfawr.constants import RECONCILE_BATCH_SIZE
+from gafaelfawr.database import (
+    create_async_database_engine,
+    initialize_database,
+)
 from gafaelfawr.dependencies.config import config_dependency
 from gafaelfawr.keypair import RSAKeyPair
-from gafaelfawr.models.token import Token
+from gafaelfawr.models.token import Token, TokenData
+from gafaelfawr.services.reconcile import ReconcileService
+from gafaelfawr.storage.base import RedisStorage
+from gafaelfawr.storage.history import TokenChangeHistoryStore
+from gafaelfawr.storage.sweeper import TokenSweeper
+from gafaelfawr.storage.token import TokenDatabaseStore, TokenRedisStore
+from gafaelfawr.storage.transaction import TransactionManager
 
 if TYPE_CHECKING:
     from typing import Union
 
-__all__ = ["main", "generate_key", "help", "run"]
+    from gafaelfawr.config import Config
+
+__all__ = ["main", "generate_key", "help", "reconcile", "run", "sweep"]
 
 
 @click.group(context_settings={"help_option_names": ["-h", "--help"]})
@@ -85,3 +102,95 @@ def init(settings: str) -> None:
     config_dependency.set_settings_path(settings)
     config = config_dependency()
     initialize_database(config)
+
+
+@main.command()
+@click.option(
+    "--settings",
+    envvar="GAFAELFAWR_SETTINGS_PATH",
+    type=str,
+    default="/etc/gafaelfawr/gafaelfawr.yaml",
+    help="Application settings file.",
+)
+def sweep(settings: str) -> None:
+    """Delete expired tokens from the database."""
+    config_dependency.set_settings_path(settings)
+    config = config_dependency()
+    count = asyncio.run(_sweep(config))
+    print(f"Deleted {count} expired tokens")
+
+
+async def _sweep(config: Config) -> int:
+    """Delete expired tokens using a temporary database engine."""
+    logger = structlog.get_logger(config.safir.logger_name)
+    engine = create_async_database_engine(config.database_url)
+    try:
+        session_factory = sessionmaker(engine, class_=AsyncSession)
+        sweeper = TokenSweeper(config.token_sweeper, session_factory, logger)
+        return await sweeper.sweep()
+    finally:
+        await engine.dispose()
+
+
+@main.command()
+@click.option(
+    "--settings",
+    envvar="GAFAELFAWR_SETTINGS_PATH",
+    type=str,
+    default="/etc/gafaelfawr/gafaelfawr.yaml",
+    help="Application settings file.",
+)
+@click.option(
+    "--fix", is_flag=True, default=False, help="Repair inconsistencies."
+)
+@click.option(
+    "--batch-size",
+    type=int,
+    default=RECONCILE_BATCH_SIZE,
+    help="Number of tokens to check at a time.",
+)
+def reconcile(settings: str, fix: bool, batch_size: int) -> None:
+    """Find tokens in only one of Redis and the database."""
+    config_dependency.set_settings_path(settings)
+    config = config_dependency()
+    count = asyncio.run(_reconcile(config, fix, batch_size))
+    if fix:
+        print(f"Found and repaired {count} inconsistencies")
+    else:
+        print(f"Found {count} inconsistencies")
+
+
+async def _reconcile(config: Config, fix: bool, batch_size: int) -> int:
+    """Reconcile the token stores, printing each inconsistency found."""
+    logger = structlog.get_logger(config.safir.logger_name)
+    engine = create_async_database_engine(config.database_url)
+    redis = await create_redis_pool(
+        config.redis_url, password=config.redis_password
+    )
+    count = 0
+    try:
+        async with AsyncSession(engine) as session:
+            storage = RedisStorage(
+                TokenData,
+                config.session_secret,
+                redis,
+                compact=config.redis_compact_storage,
+            )
+            reconcile_service = ReconcileService(
+                token_db_store=TokenDatabaseStore(session),
+                token_redis_store=TokenRedisStore(storage, logger),
+                token_change_store=TokenChangeHistoryStore(session),
+                transaction_manager=TransactionManager(session),
+                logger=logger,
+            )
+            problems = reconcile_service.reconcile(
+                batch_size=batch_size, fix=fix
+            )
+            async for problem in problems:
+                print(f"{problem.type.value} {problem.key}")
+                count += 1
+    finally:
+        redis.close()
+        await redis.wait_closed()
+        await engine.dispose()
+    return count
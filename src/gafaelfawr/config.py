@@ -15,16 +15,23 @@ import os
 from collections import defaultdict
 from dataclasses import dataclass
 from ipaddress import _BaseNetwork
-from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 import yaml
 from pydantic import AnyHttpUrl, BaseModel, IPvAnyNetwork, validator
 from safir.logging import configure_logging
 
 from gafaelfawr.keypair import RSAKeyPair
-from gafaelfawr.models.token import Token
+from gafaelfawr.models.token import Token, TokenType
+from gafaelfawr.scopes import GroupMapping, ScopeIndex
 
 __all__ = [
+    "AuthHistoryConfig",
+    "AuthHistorySettings",
+    "AuthProfileConfig",
+    "AuthProfileSettings",
+    "ChangeHistoryConfig",
+    "ChangeHistorySettings",
     "Config",
     "GitHubConfig",
     "GitHubSettings",
@@ -36,10 +43,30 @@ __all__ = [
     "OIDCSettings",
     "SafirConfig",
     "Settings",
+    "TokenCacheConfig",
+    "TokenCacheSettings",
+    "TokenSweeperConfig",
+    "TokenSweeperSettings",
+    "TokenUsageConfig",
+    "TokenUsageSettings",
     "VerifierConfig",
 ]
 
 
+def _validate_positive(v: float) -> float:
+    """Pydantic validator for settings that must be positive."""
+    if v <= 0:
+        raise ValueError("must be positive")
+    return v
+
+
+def _validate_nonnegative(v: float) -> float:
+    """Pydantic validator for settings that must not be negative."""
+    if v < 0:
+        raise ValueError("must not be negative")
+    return v
+
+
 class IssuerSettings(BaseModel):
     """pydantic model of issuer configuration."""
 
@@ -64,6 +91,13 @@ class IssuerSettings(BaseModel):
     influxdb_username: Optional[str] = None
     """The username to set in all InfluxDB tokens."""
 
+    metadata_max_age: int = 3600
+    """How long, in seconds, clients may cache the ``/.well-known`` routes."""
+
+    _nonnegative = validator("metadata_max_age", allow_reuse=True)(
+        _validate_nonnegative
+    )
+
 
 class GitHubSettings(BaseModel):
     """pydantic model of GitHub configuration."""
@@ -115,6 +149,174 @@ class OIDCSettings(BaseModel):
     key_ids: List[str] = []
     """List of acceptable kids that may be used to sign the ID token."""
 
+    keys_cache_lifetime: int = 300
+    """Minimum number of seconds for which to cache the provider's keys.
+
+    A longer ``max-age`` in the ``Cache-Control`` header of the provider's
+    responses is honored.
+    """
+
+    keys_refresh_interval: int = 30
+    """Minimum number of seconds between retrievals of the keys.
+
+    A token signed with an unknown key ID forces the keys to be retrieved
+    again, but only if they were last retrieved at least this long ago.
+    Otherwise the token is rejected.
+    """
+
+    _nonnegative = validator(
+        "keys_cache_lifetime", "keys_refresh_interval", allow_reuse=True
+    )(_validate_nonnegative)
+
+
+class TokenCacheSettings(BaseModel):
+    """pydantic model of the in-memory token cache configuration."""
+
+    size: int = 10000
+    """Maximum number of verified tokens to cache in each worker.
+
+    This is a count of entries, not a limit in bytes.
+    """
+
+    lifetime: int = 60
+    """Maximum number of seconds for which to cache a token."""
+
+    _positive = validator("size", "lifetime", allow_reuse=True)(
+        _validate_positive
+    )
+
+
+class TokenUsageSettings(BaseModel):
+    """pydantic model of the token usage tracking configuration."""
+
+    flush_interval: float = 60
+    """How often, in seconds, to write token usage to the database."""
+
+    batch_size: int = 1000
+    """Maximum number of tokens to update in one database statement."""
+
+    queue_size: int = 100000
+    """Maximum number of tokens whose usage is waiting to be written."""
+
+    _positive = validator(
+        "flush_interval", "batch_size", "queue_size", allow_reuse=True
+    )(_validate_positive)
+
+
+class TokenSweeperSettings(BaseModel):
+    """pydantic model of the expired token sweeper configuration."""
+
+    enabled: bool = False
+    """Whether to delete expired tokens in the background of the app."""
+
+    interval: float = 3600
+    """How often, in seconds, to delete expired tokens."""
+
+    batch_size: int = 1000
+    """Maximum number of tokens to delete in one database statement."""
+
+    delay: float = 1
+    """How long, in seconds, to pause between batches."""
+
+    _positive = validator("interval", "batch_size", allow_reuse=True)(
+        _validate_positive
+    )
+
+    _nonnegative = validator("delay", allow_reuse=True)(_validate_nonnegative)
+
+
+class AuthHistorySettings(BaseModel):
+    """pydantic model of the authentication history configuration."""
+
+    queue_size: int = 10000
+    """Maximum number of authentication events waiting to be written."""
+
+    batch_size: int = 1000
+    """Maximum number of events to write in one database statement."""
+
+    flush_interval: float = 5
+    """How often, in seconds, to write authentication events."""
+
+    sample_rates: Dict[TokenType, float] = {}
+    """Fraction of authentications to record, by token type."""
+
+    _positive = validator(
+        "queue_size", "batch_size", "flush_interval", allow_reuse=True
+    )(_validate_positive)
+
+    @validator("sample_rates")
+    def _valid_rates(cls, v: Dict[TokenType, float]) -> Dict[TokenType, float]:
+        for token_type, rate in v.items():
+            if not 0 <= rate <= 1:
+                msg = f"sample rate for {token_type.value} must be 0 to 1"
+                raise ValueError(msg)
+        return v
+
+
+class ChangeHistorySettings(BaseModel):
+    """pydantic model of the background token change history configuration."""
+
+    queue_size: int = 10000
+    """Maximum number of token changes waiting to be written."""
+
+    batch_size: int = 1000
+    """Maximum number of changes to write in one database statement."""
+
+    flush_interval: float = 5
+    """How often, in seconds, to write token changes."""
+
+    _positive = validator(
+        "queue_size", "batch_size", "flush_interval", allow_reuse=True
+    )(_validate_positive)
+
+
+class AuthProfileSettings(BaseModel):
+    """pydantic model of an authorization profile for the ``/auth`` route."""
+
+    scopes: List[str]
+    """The scopes the authentication token must have."""
+
+    satisfy: str = "all"
+    """Whether ``all`` or ``any`` of the scopes are required."""
+
+    auth_type: str = "bearer"
+    """The authentication type to use in challenges."""
+
+    notebook: bool = False
+    """Whether to generate a notebook token."""
+
+    delegate_to: Optional[str] = None
+    """Internal service for which to create an internal token."""
+
+    delegate_scopes: List[str] = []
+    """List of scopes the delegated token should have."""
+
+    @validator("scopes")
+    def _nonempty_scopes(cls, v: List[str]) -> List[str]:
+        if not v:
+            raise ValueError("scopes is empty")
+        return v
+
+    @validator("satisfy")
+    def _valid_satisfy(cls, v: str) -> str:
+        if v not in ("all", "any"):
+            raise ValueError("satisfy must be all or any")
+        return v
+
+    @validator("auth_type")
+    def _valid_auth_type(cls, v: str) -> str:
+        if v not in ("basic", "bearer"):
+            raise ValueError("auth_type must be basic or bearer")
+        return v
+
+    @validator("delegate_to")
+    def _not_both_tokens(
+        cls, v: Optional[str], values: Dict[str, object]
+    ) -> Optional[str]:
+        if v and values.get("notebook"):
+            raise ValueError("delegate_to cannot be set for notebook tokens")
+        return v
+
 
 class Settings(BaseModel):
     """pydantic model of Gafaelfawr settings file.
@@ -146,6 +348,9 @@ class Settings(BaseModel):
     redis_password_file: Optional[str] = None
     """File containing the password to use when connecting to Redis."""
 
+    redis_compact_storage: bool = False
+    """Whether to write data to Redis in the compact encoding."""
+
     bootstrap_token: Optional[Token] = None
     """Bootstrap authentication token.
 
@@ -198,6 +403,30 @@ class Settings(BaseModel):
     group_mapping: Dict[str, List[str]] = {}
     """Mappings of scopes to lists of groups that provide them."""
 
+    token_cache: Optional[TokenCacheSettings] = None
+    """Settings for the in-memory cache of verified tokens.
+
+    If not set, every token verification goes to Redis.
+    """
+
+    token_usage: TokenUsageSettings = TokenUsageSettings()
+    """Settings for recording when tokens were last used."""
+
+    token_sweeper: TokenSweeperSettings = TokenSweeperSettings()
+    """Settings for deleting expired tokens from the database."""
+
+    auth_history: AuthHistorySettings = AuthHistorySettings()
+    """Settings for recording the history of token authentications."""
+
+    change_history: ChangeHistorySettings = ChangeHistorySettings()
+    """Settings for recording internal and notebook token creation."""
+
+    fast_auth: bool = False
+    """Whether to use the raw ASGI implementation of the ``/auth`` route."""
+
+    auth_profiles: Dict[str, AuthProfileSettings] = {}
+    """Named authorization profiles for the ``/auth`` route."""
+
     class Config:
         env_prefix = "GAFAELFAWR_"
 
@@ -290,7 +519,7 @@ class IssuerConfig:
     exp_minutes: int
     """Number of minutes into the future that a token should expire."""
 
-    group_mapping: Mapping[str, FrozenSet[str]]
+    group_mapping: GroupMapping
     """Mapping of group names to the set of scopes that group grants."""
 
     username_claim: str
@@ -305,6 +534,9 @@ class IssuerConfig:
     influxdb_username: Optional[str]
     """The username to set in all InfluxDB tokens."""
 
+    metadata_max_age: int
+    """How long, in seconds, clients may cache the ``/.well-known`` routes."""
+
 
 @dataclass(frozen=True)
 class VerifierConfig:
@@ -334,6 +566,12 @@ class VerifierConfig:
     oidc_kids: Tuple[str, ...]
     """List of acceptable kids that may be used to sign the ID token."""
 
+    oidc_keys_lifetime: int
+    """Minimum time in seconds to cache the keys of the provider."""
+
+    oidc_keys_refresh_interval: int
+    """Minimum time in seconds between retrievals of the provider's keys."""
+
 
 @dataclass(frozen=True)
 class GitHubConfig:
@@ -418,6 +656,158 @@ class OIDCServerConfig:
     """Supported OpenID Connect clients."""
 
 
+@dataclass(frozen=True)
+class TokenUsageConfig:
+    """Configuration for recording when tokens were last used."""
+
+    flush_interval: float
+    """How often, in seconds, to write token usage to the database.
+
+    Usage is recorded in memory and written to the database in the
+    background, so this bounds how out of date the ``last_used`` time of a
+    token may be.
+    """
+
+    batch_size: int
+    """Maximum number of tokens to update in one database statement.
+
+    Reaching this many pending updates also triggers an early write.
+    """
+
+    queue_size: int
+    """Maximum number of tokens whose usage is waiting to be written.
+
+    Repeated uses of the same token take up one place.  If the database
+    cannot keep up and the queue is full, the use of further tokens is not
+    recorded until it drains.
+    """
+
+
+@dataclass(frozen=True)
+class TokenSweeperConfig:
+    """Configuration for deleting expired tokens from the database."""
+
+    enabled: bool
+    """Whether to delete expired tokens in the background of the app.
+
+    If false, expired tokens are only deleted by ``gafaelfawr sweep``.
+    """
+
+    interval: float
+    """How often, in seconds, to delete expired tokens.
+
+    Used only when the sweeper runs in the background of the application.
+    """
+
+    batch_size: int
+    """Maximum number of tokens to delete in one database statement.
+
+    Each batch is deleted in its own short transaction.
+    """
+
+    delay: float
+    """How long, in seconds, to pause between batches.
+
+    This limits the rate of deletes so that the sweeper does not compete
+    with logins and token creation for the token table.
+    """
+
+
+@dataclass(frozen=True)
+class AuthHistoryConfig:
+    """Configuration for recording the history of token authentications."""
+
+    queue_size: int
+    """Maximum number of authentication events waiting to be written.
+
+    Events are queued in memory and written to the database in the
+    background.  If the database cannot keep up and the queue is full, new
+    events are dropped rather than slowing down authentication.
+    """
+
+    batch_size: int
+    """Maximum number of events to write in one database statement.
+
+    Reaching this many queued events also triggers an early write.
+    """
+
+    flush_interval: float
+    """How often, in seconds, to write authentication events."""
+
+    sample_rates: Mapping[TokenType, float]
+    """Fraction of authentications to record, by token type.
+
+    Token types not listed here have all of their authentications recorded.
+    """
+
+
+@dataclass(frozen=True)
+class ChangeHistoryConfig:
+    """Configuration for recording token changes in the background.
+
+    Changes made directly by users are recorded in the same transaction as
+    the change.  This configures the background writer used for the creation
+    of internal and notebook tokens, which may happen at a high rate while
+    authenticating requests.
+    """
+
+    queue_size: int
+    """Maximum number of token changes waiting to be written."""
+
+    batch_size: int
+    """Maximum number of changes to write in one database statement.
+
+    Reaching this many queued changes also triggers an early write.
+    """
+
+    flush_interval: float
+    """How often, in seconds, to write token changes."""
+
+
+@dataclass(frozen=True)
+class AuthProfileConfig:
+    """Configuration of an authorization profile for the ``/auth`` route."""
+
+    scopes: Tuple[str, ...]
+    """The scopes the authentication token must have."""
+
+    satisfy: str
+    """Whether ``all`` or ``any`` of the scopes are required."""
+
+    auth_type: str
+    """The authentication type to use in challenges."""
+
+    notebook: bool
+    """Whether to generate a notebook token."""
+
+    delegate_to: Optional[str]
+    """Internal service for which to create an internal token."""
+
+    delegate_scopes: Tuple[str, ...]
+    """List of scopes the delegated token should have."""
+
+
+@dataclass(frozen=True)
+class TokenCacheConfig:
+    """Configuration for the in-memory cache of verified tokens."""
+
+    size: int
+    """Maximum number of verified tokens to cache in each worker.
+
+    This stands in for a memory limit.  The memory used by each entry depends
+    on the size of the token data, so the memory used by a full cache is only
+    approximately proportional to this count.
+    """
+
+    lifetime: int
+    """Maximum number of seconds for which to cache a token.
+
+    Tokens are never cached past their own expiration time.  This bounds how
+    long a revoked token may remain usable in a worker that missed the
+    invalidation message.
+    """
+
+
 @dataclass(frozen=True)
 class Config:
     """Configuration for Gafaelfawr.
@@ -443,6 +833,13 @@ class Config:
     redis_password: Optional[str]
     """Password for the Redis server that stores sessions."""
 
+    redis_compact_storage: bool
+    """Whether to write data to Redis in the compact encoding.
+
+    Data in either encoding is always read, so this can only be enabled once
+    every running Gafaelfawr process can read the compact encoding.
+    """
+
     bootstrap_token: Optional[Token]
     """Bootstrap authentication token.
 
@@ -483,12 +880,36 @@ class Config:
     known_scopes: Mapping[str, str]
     """Known scopes (the keys) and their descriptions (the values)."""
 
+    scope_index: ScopeIndex
+    """Bit positions of the known scopes, for authorization checks."""
+
     database_url: str
     """URL for the PostgreSQL database."""
 
     initial_admins: Tuple[str, ...]
     """Initial token administrators to configure when initializing database."""
 
+    token_cache: Optional[TokenCacheConfig]
+    """Configuration for the in-memory token cache, if enabled."""
+
+    token_usage: TokenUsageConfig
+    """Configuration for recording when tokens were last used."""
+
+    token_sweeper: TokenSweeperConfig
+    """Configuration for deleting expired tokens from the database."""
+
+    auth_history: AuthHistoryConfig
+    """Configuration for recording the history of token authentications."""
+
+    change_history: ChangeHistoryConfig
+    """Configuration for recording token changes in the background."""
+
+    fast_auth: bool
+    """Whether to use the raw ASGI implementation of the ``/auth`` route."""
+
+    auth_profiles: Mapping[str, AuthProfileConfig]
+    """Named authorization profiles for the ``/auth`` route."""
+
     safir: SafirConfig
     """Configuration for the Safir middleware."""
 
@@ -558,9 +979,9 @@ class Config:
         for scope, groups in settings.group_mapping.items():
             for group in groups:
                 group_mapping[group].add(scope)
-        group_mapping_frozen = {
-            k: frozenset(v) for k, v in group_mapping.items()
-        }
+        compiled_group_mapping = GroupMapping(
+            {k: frozenset(v) for k, v in group_mapping.items()}
+        )
 
         # Build the Config object.
         issuer_config = IssuerConfig(
@@ -569,11 +990,12 @@ class Config:
             aud=settings.issuer.aud,
             keypair=keypair,
             exp_minutes=settings.issuer.exp_minutes,
-            group_mapping=group_mapping_frozen,
+            group_mapping=compiled_group_mapping,
             username_claim=settings.username_claim,
             uid_claim=settings.uid_claim,
             influxdb_secret=influxdb_secret,
             influxdb_username=settings.issuer.influxdb_username,
+            metadata_max_age=settings.issuer.metadata_max_age,
         )
         verifier_config = VerifierConfig(
             iss=settings.issuer.iss,
@@ -584,6 +1006,12 @@ class Config:
             oidc_iss=settings.oidc.issuer if settings.oidc else None,
             oidc_aud=settings.oidc.audience if settings.oidc else None,
             oidc_kids=tuple(settings.oidc.key_ids if settings.oidc else []),
+            oidc_keys_lifetime=(
+                settings.oidc.keys_cache_lifetime if settings.oidc else 0
+            ),
+            oidc_keys_refresh_interval=(
+                settings.oidc.keys_refresh_interval if settings.oidc else 0
+            ),
         )
         github_config = None
         if settings.github:
@@ -607,12 +1035,30 @@ class Config:
                 audience=settings.oidc.audience,
                 key_ids=tuple(settings.oidc.key_ids),
             )
+        token_cache_config = None
+        if settings.token_cache:
+            token_cache_config = TokenCacheConfig(
+                size=settings.token_cache.size,
+                lifetime=settings.token_cache.lifetime,
+            )
+        auth_profiles = {
+            name: AuthProfileConfig(
+                scopes=tuple(profile.scopes),
+                satisfy=profile.satisfy,
+                auth_type=profile.auth_type,
+                notebook=profile.notebook,
+                delegate_to=profile.delegate_to,
+                delegate_scopes=tuple(profile.delegate_scopes),
+            )
+            for name, profile in settings.auth_profiles.items()
+        }
         log_level = os.getenv("SAFIR_LOG_LEVEL", settings.loglevel)
         config = cls(
             realm=settings.realm,
             session_secret=session_secret.decode(),
             redis_url=settings.redis_url,
             redis_password=redis_password,
+            redis_compact_storage=settings.redis_compact_storage,
             bootstrap_token=settings.bootstrap_token,
             proxies=tuple(settings.proxies if settings.proxies else []),
             after_logout_url=str(settings.after_logout_url),
@@ -622,8 +1068,34 @@ class Config:
             oidc=oidc_config,
             oidc_server=oidc_server_config,
             known_scopes=settings.known_scopes or {},
+            scope_index=ScopeIndex(settings.known_scopes or {}),
             database_url=settings.database_url,
             initial_admins=tuple(settings.initial_admins),
+            token_cache=token_cache_config,
+            token_usage=TokenUsageConfig(
+                flush_interval=settings.token_usage.flush_interval,
+                batch_size=settings.token_usage.batch_size,
+                queue_size=settings.token_usage.queue_size,
+            ),
+            token_sweeper=TokenSweeperConfig(
+                enabled=settings.token_sweeper.enabled,
+                interval=settings.token_sweeper.interval,
+                batch_size=settings.token_sweeper.batch_size,
+                delay=settings.token_sweeper.delay,
+            ),
+            auth_history=AuthHistoryConfig(
+                queue_size=settings.auth_history.queue_size,
+                batch_size=settings.auth_history.batch_size,
+                flush_interval=settings.auth_history.flush_interval,
+                sample_rates=dict(settings.auth_history.sample_rates),
+            ),
+            change_history=ChangeHistoryConfig(
+                queue_size=settings.change_history.queue_size,
+                batch_size=settings.change_history.batch_size,
+                flush_interval=settings.change_history.flush_interval,
+            ),
+            fast_auth=settings.fast_auth,
+            auth_profiles=auth_profiles,
             safir=SafirConfig(log_level=log_level),
         )
 
@@ -6,14 +6,62 @@ ALGORITHM = "RS256"
 COOKIE_NAME = "gafaelfawr"
 """Name of the state cookie."""
 
+DATABASE_MAX_PARAMETERS = 32767
+"""Maximum number of bind parameters in one statement (the asyncpg limit)."""
+
+GITHUB_CACHE_LIFETIME = 7 * 24 * 60 * 60
+"""How long (in seconds) to keep cached GitHub API responses in Redis."""
+
+GITHUB_TEAMS_PER_PAGE = 100
+"""Number of teams to request per page from GitHub (the maximum allowed)."""
+
+GITHUB_USER_INFO_TIMEOUT = 30
+"""Deadline in seconds for retrieving all user information from GitHub."""
+
+GROUP_MAPPING_CACHE_SIZE = 1000
+"""Number of distinct sets of groups whose scopes to cache in each process."""
+
 MINIMUM_LIFETIME = 5 * 60
 """Minimum expiration lifetime for a token in seconds."""
 
 OIDC_AUTHORIZATION_LIFETIME = 60 * 60
 """How long (in seconds) an authorization code is good for."""
 
+RECONCILE_BATCH_SIZE = 1000
+"""Default number of tokens to check at a time when reconciling stores."""
+
+RECONCILE_MIN_AGE = 5 * 60
+"""Minimum age in seconds of a token to check when reconciling stores."""
+
+SCOPE_CACHE_SIZE = 1000
+"""Number of distinct sets of scopes to cache compiled in each process."""
+
 SETTINGS_PATH = "/etc/gafaelfawr/gafaelfawr.yaml"
 """Default configuration path."""
 
+STATE_CACHE_SIZE = 1000
+"""Number of decoded state cookies to cache in each process."""
+
+TOKEN_CACHE_CHANNEL = "token-invalidate"
+"""Redis pub/sub channel used to invalidate cached tokens in all workers."""
+
+TOKEN_CACHE_RESUBSCRIBE_DELAY = 1
+"""Initial delay in seconds before resubscribing to token invalidations."""
+
+TOKEN_CACHE_RESUBSCRIBE_MAX_DELAY = 60
+"""Maximum delay in seconds between attempts to resubscribe."""
+
+TOKEN_REVOKE_BATCH_SIZE = 1000
+"""Number of revocations to record per statement when deleting a token tree."""
+
+TOKEN_LIST_BATCH_SIZE = 1000
+"""Number of tokens to retrieve at a time when streaming a token list."""
+
+TOKEN_LIST_MAX_LIMIT = 1000
+"""Maximum number of tokens that may be requested in one page."""
+
+VERIFIED_TOKEN_CACHE_SIZE = 1000
+"""Number of verified internal JWTs to cache in each process."""
+
 USERNAME_REGEX = "^[a-z0-9._-]+$"
 """Regex matching all valid usernames."""
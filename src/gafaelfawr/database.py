@@ -12,18 +12,49 @@ from typing import TYPE_CHECKING
 
 import structlog
 from sqlalchemy import create_engine
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import Session
 
-from gafaelfawr.models.admin import Admin
-from gafaelfawr.schema import initialize_schema
-from gafaelfawr.storage.admin import AdminStore
-from gafaelfawr.storage.transaction import TransactionManager
+from gafaelfawr.schema import Admin, initialize_schema
 
 if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
     from gafaelfawr.config import Config
 
-__all__ = ["initialize_database"]
+__all__ = ["create_async_database_engine", "initialize_database"]
+
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+"""Mapping of synchronous database drivers to their asyncio equivalents."""
+
+
+def create_async_database_engine(database_url: str) -> AsyncEngine:
+    """Create an asyncio database engine.
+
+    The configured database URL normally names a synchronous driver, since it
+    is also used by :py:func:`initialize_database`.  Switch it to the
+    corresponding asyncio driver before creating the engine.
+
+    Parameters
+    ----------
+    database_url : `str`
+        The configured database URL.
+
+    Returns
+    -------
+    engine : `sqlalchemy.ext.asyncio.AsyncEngine`
+        The new engine.
+    """
+    url = make_url(database_url)
+    if url.drivername in _ASYNC_DRIVERS:
+        url = url.set(drivername=_ASYNC_DRIVERS[url.drivername])
+    return create_async_engine(url)
 
 
 def initialize_database(config: Config) -> None:
@@ -55,10 +86,11 @@ def initialize_database(config: Config) -> None:
         msg = "database schema initialization failed (database not reachable?)"
         logger.error(msg)
 
-    session = Session(bind=engine)
-    with TransactionManager(session).transaction():
-        admin_store = AdminStore(session)
-        if not admin_store.list():
+    # This runs outside of the application and its event loop, so use the
+    # schema directly rather than the asyncio storage layer.
+    with Session(bind=engine) as session:
+        if not session.query(Admin).count():
             for admin in config.initial_admins:
                 logger.info("adding initial admin %s", admin)
-                admin_store.add(Admin(username=admin))
+                session.add(Admin(username=admin))
+        session.commit()
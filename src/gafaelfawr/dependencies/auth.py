@@ -145,6 +145,13 @@ class Authenticate:
             context.logger.info("Permission denied", error=msg)
             raise PermissionDeniedError(msg)
 
+        if context.process_context.token_usage:
+            context.process_context.token_usage.record(data.token.key)
+        if context.process_context.auth_history:
+            client = context.request.client
+            context.process_context.auth_history.record(
+                data, ip_address=client.host if client else None
+            )
         return data
 
     def _build_bootstrap_token_data(self) -> TokenData:
@@ -0,0 +1,55 @@
+"""Authentication history recorder dependency for FastAPI."""
+
+from typing import Optional
+
+import structlog
+from fastapi import Depends
+
+from gafaelfawr.config import Config
+from gafaelfawr.dependencies.config import config_dependency
+from gafaelfawr.dependencies.db_session import db_session_dependency
+from gafaelfawr.storage.auth_history import AuthHistoryRecorder
+
+__all__ = ["AuthHistoryDependency", "auth_history_dependency"]
+
+
+class AuthHistoryDependency:
+    """Provides the process-wide authentication history recorder.
+
+    Notes
+    -----
+    The recorder is created and its background writer started the first time
+    the dependency is called.  It uses sessions from the same engine as
+    request handlers.
+    """
+
+    def __init__(self) -> None:
+        self.auth_history: Optional[AuthHistoryRecorder] = None
+
+    async def __call__(
+        self, config: Config = Depends(config_dependency)
+    ) -> AuthHistoryRecorder:
+        """Creates the recorder if necessary and returns it."""
+        if not self.auth_history:
+            logger = structlog.get_logger(config.safir.logger_name)
+            session_factory = db_session_dependency.get_sessionmaker(config)
+            auth_history = AuthHistoryRecorder(
+                config.auth_history, session_factory, logger
+            )
+            await auth_history.start()
+            self.auth_history = auth_history
+        return self.auth_history
+
+    async def close(self) -> None:
+        """Stop the recorder after writing any queued events.
+
+        Should be called from a shutdown hook before the database engine is
+        disposed.
+        """
+        if self.auth_history:
+            await self.auth_history.stop()
+            self.auth_history = None
+
+
+auth_history_dependency = AuthHistoryDependency()
+"""The dependency that will return the authentication history recorder."""
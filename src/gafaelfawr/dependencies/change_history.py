@@ -0,0 +1,55 @@
+"""Token change history recorder dependency for FastAPI."""
+
+from typing import Optional
+
+import structlog
+from fastapi import Depends
+
+from gafaelfawr.config import Config
+from gafaelfawr.dependencies.config import config_dependency
+from gafaelfawr.dependencies.db_session import db_session_dependency
+from gafaelfawr.storage.change_history import TokenChangeRecorder
+
+__all__ = ["ChangeHistoryDependency", "change_history_dependency"]
+
+
+class ChangeHistoryDependency:
+    """Provides the process-wide token change history recorder.
+
+    Notes
+    -----
+    The recorder is created and its background writer started the first time
+    the dependency is called.  It uses sessions from the same engine as
+    request handlers.
+    """
+
+    def __init__(self) -> None:
+        self.change_history: Optional[TokenChangeRecorder] = None
+
+    async def __call__(
+        self, config: Config = Depends(config_dependency)
+    ) -> TokenChangeRecorder:
+        """Creates the recorder if necessary and returns it."""
+        if not self.change_history:
+            logger = structlog.get_logger(config.safir.logger_name)
+            session_factory = db_session_dependency.get_sessionmaker(config)
+            change_history = TokenChangeRecorder(
+                config.change_history, session_factory, logger
+            )
+            await change_history.start()
+            self.change_history = change_history
+        return self.change_history
+
+    async def close(self) -> None:
+        """Stop the recorder after writing any queued changes.
+
+        Should be called from a shutdown hook before the database engine is
+        disposed.
+        """
+        if self.change_history:
+            await self.change_history.stop()
+            self.change_history = None
+
+
+change_history_dependency = ChangeHistoryDependency()
+"""The dependency that will return the token change history recorder."""
@@ -6,21 +6,19 @@ convenience of writing request handlers.  It also provides a place to store a
 including from dependencies.
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 
-from aioredis import Redis
 from fastapi import Depends, Request
-from fastapi_sqlalchemy import db
-from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import async_scoped_session
 from structlog.stdlib import BoundLogger
 
 from gafaelfawr.config import Config
 from gafaelfawr.dependencies.config import config_dependency
-from gafaelfawr.dependencies.http_client import http_client_dependency
+from gafaelfawr.dependencies.db_session import db_session_dependency
 from gafaelfawr.dependencies.logger import logger_dependency
-from gafaelfawr.dependencies.redis import redis_dependency
-from gafaelfawr.factory import ComponentFactory
+from gafaelfawr.dependencies.process_context import process_context_dependency
+from gafaelfawr.factory import ComponentFactory, ProcessContext
 from gafaelfawr.models.state import State
 
 __all__ = ["RequestContext", "context_dependency"]
@@ -45,36 +43,44 @@ class RequestContext:
     logger: BoundLogger
     """The request logger, rebound with discovered context."""
 
-    redis: Redis
-    """Connection pool to use to talk to Redis."""
+    session: async_scoped_session
+    """Database session for this request, created on first use."""
 
-    http_client: AsyncClient
-    """Shared HTTP client."""
+    process_context: ProcessContext
+    """Components shared by all requests."""
+
+    _factory: Optional[ComponentFactory] = field(
+        default=None, init=False, repr=False
+    )
 
     @property
     def factory(self) -> ComponentFactory:
         """A factory for constructing Gafaelfawr components.
 
-        This is constructed on the fly at each reference to ensure that we get
-        the latest logger, which may have additional bound context.
+        The factory is created on first reference and then reused until the
+        logger is rebound, so that components always get the latest logger,
+        which may have additional bound context.
         """
-        return ComponentFactory(
-            config=self.config,
-            redis=self.redis,
-            http_client=self.http_client,
-            logger=self.logger,
-            session=db.session,
-        )
+        if not self._factory:
+            self._factory = ComponentFactory(
+                process_context=self.process_context,
+                session=self.session,
+                logger=self.logger,
+            )
+        return self._factory
 
     @property
     def state(self) -> State:
-        """Convenience property to access the cookie state."""
-        return self.request.state.cookie
+        """Convenience property to access the cookie state.
+
+        The state cookie is decoded on first access.
+        """
+        return self.request.state.cookie.get()
 
     @state.setter
     def state(self, state: State) -> None:
         """Convenience property to set the cookie state."""
-        self.request.state.cookie = state
+        self.request.state.cookie.set(state)
 
     def rebind_logger(self, **values: Optional[str]) -> None:
         """Add the given values to the logging context.
@@ -88,20 +94,21 @@ class RequestContext:
             Additional values that should be added to the logging context.
         """
         self.logger = self.logger.bind(**values)
+        self._factory = None
 
 
 def context_dependency(
     request: Request,
     config: Config = Depends(config_dependency),
     logger: BoundLogger = Depends(logger_dependency),
-    redis: Redis = Depends(redis_dependency),
-    http_client: AsyncClient = Depends(http_client_dependency),
+    session: async_scoped_session = Depends(db_session_dependency),
+    process_context: ProcessContext = Depends(process_context_dependency),
 ) -> RequestContext:
     """Provides a RequestContext as a dependency."""
     return RequestContext(
         request=request,
         config=config,
         logger=logger,
-        redis=redis,
-        http_client=http_client,
+        session=session,
+        process_context=process_context,
     )
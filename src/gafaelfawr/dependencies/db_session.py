@@ -0,0 +1,91 @@
+"""Database session dependency for FastAPI."""
+
+from typing import AsyncIterator, Optional
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_scoped_session,
+)
+from sqlalchemy.orm import sessionmaker
+
+from gafaelfawr.config import Config
+from gafaelfawr.database import create_async_database_engine
+from gafaelfawr.dependencies.config import config_dependency
+
+__all__ = ["DatabaseSessionDependency", "db_session_dependency"]
+
+
+class DatabaseSessionDependency:
+    """Provides a lazily-created asyncio database session as a dependency.
+
+    Notes
+    -----
+    The engine and its connection pool are created the first time the
+    dependency is called and are shared by all requests.
+
+    Many requests, such as ``/auth`` requests that can be answered entirely
+    from Redis, never touch the database.  Rather than a session, each
+    request therefore gets a `~sqlalchemy.ext.asyncio.async_scoped_session`
+    proxy, which creates the underlying session the first time one of its
+    methods is used.  Requests that never use the database neither create a
+    session nor check out a connection from the pool.  If a session was
+    created, it is closed (rolling back any uncommitted changes) when the
+    request is complete.
+    """
+
+    def __init__(self) -> None:
+        self._engine: Optional[AsyncEngine] = None
+        self._sessionmaker: Optional[sessionmaker] = None
+
+    async def __call__(
+        self, config: Config = Depends(config_dependency)
+    ) -> AsyncIterator[async_scoped_session]:
+        """Provides a session proxy for the request and cleans up after."""
+        # The proxy is only used by a single request, so every call is part
+        # of the same scope.
+        session = async_scoped_session(
+            self.get_sessionmaker(config), scopefunc=lambda: None
+        )
+        try:
+            yield session
+        finally:
+            await session.remove()
+
+    def get_sessionmaker(self, config: Config) -> sessionmaker:
+        """Return the factory for sessions using the shared engine.
+
+        This is also used by background tasks that need their own sessions.
+
+        Parameters
+        ----------
+        config : `gafaelfawr.config.Config`
+            Gafaelfawr configuration.
+
+        Returns
+        -------
+        factory : `sqlalchemy.orm.sessionmaker`
+            Factory for `~sqlalchemy.ext.asyncio.AsyncSession` objects.
+        """
+        if not self._sessionmaker:
+            self._engine = create_async_database_engine(config.database_url)
+            self._sessionmaker = sessionmaker(
+                self._engine, class_=AsyncSession, expire_on_commit=False
+            )
+        return self._sessionmaker
+
+    async def close(self) -> None:
+        """Dispose of the engine and its connection pool.
+
+        Should be called from a shutdown hook to ensure that all connections
+        are cleanly closed.
+        """
+        if self._engine:
+            await self._engine.dispose()
+            self._engine = None
+            self._sessionmaker = None
+
+
+db_session_dependency = DatabaseSessionDependency()
+"""The dependency that will return the database session."""
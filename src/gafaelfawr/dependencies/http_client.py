@@ -1,24 +1,43 @@
 """HTTP client dependency for FastAPI."""
 
-from __future__ import annotations
-
-from typing import AsyncIterator
+from typing import Optional
 
 from httpx import AsyncClient
 
-__all__ = ["http_client_dependency"]
+__all__ = ["HTTPClientDependency", "http_client_dependency"]
 
 
-async def http_client_dependency() -> AsyncIterator[AsyncClient]:
+class HTTPClientDependency:
     """Provides an `httpx.AsyncClient` as a dependency.
 
     Notes
     -----
-    This is provided as a function rather than using the class as a callable
-    directly so that the session can be explicitly closed and to avoid
-    exposing the constructor parameters to FastAPI and possibly confusing it.
+    The client is created the first time the dependency is called and then
+    shared by all requests, so that connections to external services such as
+    GitHub are pooled and reused.
 
     This dependency should eventually move into the Safir framework.
     """
-    async with AsyncClient() as client:
-        yield client
+
+    def __init__(self) -> None:
+        self.http_client: Optional[AsyncClient] = None
+
+    async def __call__(self) -> AsyncClient:
+        """Creates the client if necessary and returns it."""
+        if not self.http_client:
+            self.http_client = AsyncClient()
+        return self.http_client
+
+    async def close(self) -> None:
+        """Close the client.
+
+        Should be called from a shutdown hook to ensure that all open
+        connections are cleanly closed.
+        """
+        if self.http_client:
+            await self.http_client.aclose()
+            self.http_client = None
+
+
+http_client_dependency = HTTPClientDependency()
+"""The dependency that will return the HTTP client."""
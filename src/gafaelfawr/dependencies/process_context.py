@@ -0,0 +1,91 @@
+"""Process-wide component dependency for FastAPI."""
+
+from typing import Optional
+
+import structlog
+from aioredis import Redis
+from fastapi import Depends
+from httpx import AsyncClient
+
+from gafaelfawr.config import Config
+from gafaelfawr.dependencies.auth_history import auth_history_dependency
+from gafaelfawr.dependencies.change_history import change_history_dependency
+from gafaelfawr.dependencies.config import config_dependency
+from gafaelfawr.dependencies.http_client import http_client_dependency
+from gafaelfawr.dependencies.redis import redis_dependency
+from gafaelfawr.dependencies.token_cache import token_cache_dependency
+from gafaelfawr.dependencies.token_usage import token_usage_dependency
+from gafaelfawr.factory import ProcessContext
+from gafaelfawr.storage.auth_history import AuthHistoryRecorder
+from gafaelfawr.storage.cache import TokenCache
+from gafaelfawr.storage.change_history import TokenChangeRecorder
+from gafaelfawr.storage.usage import TokenUsageTracker
+
+__all__ = ["ProcessContextDependency", "process_context_dependency"]
+
+
+class ProcessContextDependency:
+    """Provides the components shared by all requests as a dependency.
+
+    Notes
+    -----
+    The `~gafaelfawr.factory.ProcessContext` is created the first time the
+    dependency is called and then reused for every request.  It is rebuilt if
+    any of the objects it is built from change, which allows the test suite
+    to change the configuration between (or during) tests.
+    """
+
+    def __init__(self) -> None:
+        self.process_context: Optional[ProcessContext] = None
+
+    def __call__(
+        self,
+        config: Config = Depends(config_dependency),
+        redis: Redis = Depends(redis_dependency),
+        http_client: AsyncClient = Depends(http_client_dependency),
+        token_cache: Optional[TokenCache] = Depends(token_cache_dependency),
+        token_usage: TokenUsageTracker = Depends(token_usage_dependency),
+        auth_history: AuthHistoryRecorder = Depends(auth_history_dependency),
+        change_history: TokenChangeRecorder = Depends(
+            change_history_dependency
+        ),
+    ) -> ProcessContext:
+        """Creates the shared components if necessary and returns them."""
+        process_context = self.process_context
+        if not (
+            process_context
+            and process_context.config is config
+            and process_context.redis is redis
+            and process_context.http_client is http_client
+            and process_context.token_cache is token_cache
+            and process_context.token_usage is token_usage
+            and process_context.auth_history is auth_history
+            and process_context.change_history is change_history
+        ):
+            process_context = ProcessContext(
+                config=config,
+                redis=redis,
+                http_client=http_client,
+                token_cache=token_cache,
+                token_usage=token_usage,
+                auth_history=auth_history,
+                change_history=change_history,
+            )
+            self.process_context = process_context
+        return process_context
+
+    def close(self) -> None:
+        """Log the statistics of the shared components and discard them.
+
+        Should be called from a shutdown hook, since the Redis pool and HTTP
+        client they refer to are closed on shutdown.
+        """
+        if self.process_context:
+            logger_name = self.process_context.config.safir.logger_name
+            logger = structlog.get_logger(logger_name)
+            self.process_context.log_stats(logger)
+        self.process_context = None
+
+
+process_context_dependency = ProcessContextDependency()
+"""The dependency that will return the shared components."""
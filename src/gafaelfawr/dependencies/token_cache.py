@@ -0,0 +1,60 @@
+"""Token cache dependency for FastAPI."""
+
+from typing import Optional
+
+import structlog
+from aioredis import Redis
+from fastapi import Depends
+
+from gafaelfawr.config import Config
+from gafaelfawr.dependencies.config import config_dependency
+from gafaelfawr.dependencies.redis import redis_dependency
+from gafaelfawr.storage.cache import TokenCache
+
+__all__ = ["TokenCacheDependency", "token_cache_dependency"]
+
+
+class TokenCacheDependency:
+    """Provides the process-wide token cache as a dependency.
+
+    Notes
+    -----
+    The cache is created the first time the dependency is called, which also
+    subscribes to the invalidation channel in Redis.  If the token cache is
+    not enabled in the configuration, the dependency returns `None`.
+
+    The mockaioredis pool used by the test suite does not support pub/sub, so
+    when Redis is mocked, invalidations only apply to the local cache.
+    """
+
+    def __init__(self) -> None:
+        self.token_cache: Optional[TokenCache] = None
+
+    async def __call__(
+        self,
+        config: Config = Depends(config_dependency),
+        redis: Redis = Depends(redis_dependency),
+    ) -> Optional[TokenCache]:
+        """Creates the token cache if necessary and returns it."""
+        if not config.token_cache:
+            return None
+        if not self.token_cache:
+            logger = structlog.get_logger(config.safir.logger_name)
+            pubsub = None if redis_dependency.is_mocked else redis
+            token_cache = TokenCache(config.token_cache, pubsub, logger)
+            await token_cache.start()
+            self.token_cache = token_cache
+        return self.token_cache
+
+    async def close(self) -> None:
+        """Stop listening for invalidations and discard the cache.
+
+        Should be called from a shutdown hook before the Redis pool is closed.
+        """
+        if self.token_cache:
+            await self.token_cache.stop()
+            self.token_cache = None
+
+
+token_cache_dependency = TokenCacheDependency()
+"""The dependency that will return the token cache."""
@@ -0,0 +1,57 @@
+"""Expired token sweeper dependency for FastAPI."""
+
+from typing import Optional
+
+import structlog
+from fastapi import Depends
+
+from gafaelfawr.config import Config
+from gafaelfawr.dependencies.config import config_dependency
+from gafaelfawr.dependencies.db_session import db_session_dependency
+from gafaelfawr.storage.sweeper import TokenSweeper
+
+__all__ = ["TokenSweeperDependency", "token_sweeper_dependency"]
+
+
+class TokenSweeperDependency:
+    """Provides the process-wide expired token sweeper as a dependency.
+
+    Notes
+    -----
+    The sweeper is created the first time the dependency is called, which
+    normally happens in the application startup hook.  Its background task is
+    only started if it is enabled in the configuration.  It uses sessions
+    from the same engine as request handlers.
+    """
+
+    def __init__(self) -> None:
+        self.token_sweeper: Optional[TokenSweeper] = None
+
+    async def __call__(
+        self, config: Config = Depends(config_dependency)
+    ) -> TokenSweeper:
+        """Creates the sweeper if necessary and returns it."""
+        if not self.token_sweeper:
+            logger = structlog.get_logger(config.safir.logger_name)
+            session_factory = db_session_dependency.get_sessionmaker(config)
+            token_sweeper = TokenSweeper(
+                config.token_sweeper, session_factory, logger
+            )
+            if config.token_sweeper.enabled:
+                await token_sweeper.start()
+            self.token_sweeper = token_sweeper
+        return self.token_sweeper
+
+    async def close(self) -> None:
+        """Stop the sweeper.
+
+        Should be called from a shutdown hook before the database engine is
+        disposed.
+        """
+        if self.token_sweeper:
+            await self.token_sweeper.stop()
+            self.token_sweeper = None
+
+
+token_sweeper_dependency = TokenSweeperDependency()
+"""The dependency that will return the expired token sweeper."""
@@ -0,0 +1,55 @@
+"""Token usage tracker dependency for FastAPI."""
+
+from typing import Optional
+
+import structlog
+from fastapi import Depends
+
+from gafaelfawr.config import Config
+from gafaelfawr.dependencies.config import config_dependency
+from gafaelfawr.dependencies.db_session import db_session_dependency
+from gafaelfawr.storage.usage import TokenUsageTracker
+
+__all__ = ["TokenUsageDependency", "token_usage_dependency"]
+
+
+class TokenUsageDependency:
+    """Provides the process-wide token usage tracker as a dependency.
+
+    Notes
+    -----
+    The tracker is created and its background writer started the first time
+    the dependency is called.  It uses sessions from the same engine as
+    request handlers.
+    """
+
+    def __init__(self) -> None:
+        self.token_usage: Optional[TokenUsageTracker] = None
+
+    async def __call__(
+        self, config: Config = Depends(config_dependency)
+    ) -> TokenUsageTracker:
+        """Creates the tracker if necessary and returns it."""
+        if not self.token_usage:
+            logger = structlog.get_logger(config.safir.logger_name)
+            session_factory = db_session_dependency.get_sessionmaker(config)
+            token_usage = TokenUsageTracker(
+                config.token_usage, session_factory, logger
+            )
+            await token_usage.start()
+            self.token_usage = token_usage
+        return self.token_usage
+
+    async def close(self) -> None:
+        """Stop the tracker after writing any pending usage.
+
+        Should be called from a shutdown hook before the database engine is
+        disposed.
+        """
+        if self.token_usage:
+            await self.token_usage.stop()
+            self.token_usage = None
+
+
+token_usage_dependency = TokenUsageDependency()
+"""The dependency that will return the token usage tracker."""
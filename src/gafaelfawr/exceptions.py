@@ -18,6 +18,7 @@ __all__ = [
     "GitHubException",
     "InsufficientScopeError",
     "InvalidClientError",
+    "InvalidCursorError",
     "InvalidGrantError",
     "InvalidRequestError",
     "InvalidTokenClaimsException",
@@ -159,6 +160,10 @@ class BadScopesError(Exception):
     """The provided token scopes are invalid or not available."""
 
 
+class InvalidCursorError(Exception):
+    """The provided pagination cursor was invalid."""
+
+
 class DuplicateTokenNameError(Exception):
     """The user tried to reuse the name of a token."""
 
@@ -2,51 +2,79 @@
 
 from __future__ import annotations
 
+from dataclasses import asdict
 from typing import TYPE_CHECKING
 
 import structlog
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
 
+from gafaelfawr.constants import VERIFIED_TOKEN_CACHE_SIZE
 from gafaelfawr.issuer import TokenIssuer
+from gafaelfawr.models.github import GitHubCachedResponse
 from gafaelfawr.models.token import TokenData
 from gafaelfawr.providers.github import GitHubProvider
 from gafaelfawr.providers.oidc import OIDCProvider
 from gafaelfawr.services.admin import AdminService
 from gafaelfawr.services.oidc import OIDCService
+from gafaelfawr.services.reconcile import ReconcileService
 from gafaelfawr.services.token import TokenService
 from gafaelfawr.storage.admin import AdminStore
 from gafaelfawr.storage.base import RedisStorage
-from gafaelfawr.storage.history import AdminHistoryStore
+from gafaelfawr.storage.github import GitHubResponseCache
+from gafaelfawr.storage.history import (
+    AdminHistoryStore,
+    TokenChangeHistoryStore,
+)
 from gafaelfawr.storage.oidc import OIDCAuthorization, OIDCAuthorizationStore
 from gafaelfawr.storage.token import TokenDatabaseStore, TokenRedisStore
 from gafaelfawr.storage.transaction import TransactionManager
-from gafaelfawr.verify import TokenVerifier
+from gafaelfawr.verify import JWKSCache, TokenVerifier, VerifiedTokenCache
 
 if TYPE_CHECKING:
-    from typing import Optional
+    from typing import Any, Dict, Optional, Union
 
     from aioredis import Redis
     from httpx import AsyncClient
+    from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session
     from structlog.stdlib import BoundLogger
 
     from gafaelfawr.config import Config
     from gafaelfawr.providers.base import Provider
+    from gafaelfawr.storage.auth_history import AuthHistoryRecorder
+    from gafaelfawr.storage.cache import TokenCache
+    from gafaelfawr.storage.change_history import TokenChangeRecorder
+    from gafaelfawr.storage.usage import TokenUsageTracker
 
-__all__ = ["ComponentFactory"]
+__all__ = ["ComponentFactory", "ProcessContext"]
 
 
-class ComponentFactory:
-    """Build Gafaelfawr components.
+class ProcessContext:
+    """Components shared by every request handled by this process.
 
-    Given the application configuration, construct the components of the
-    application on demand.  This is broken into a separate class primarily so
-    that the test suite can override portions of it.
+    Holds the objects that depend only on the configuration and are safe to
+    share between concurrent requests, so that they are built once rather
+    than for every request.  Components that hold per-request state, such as
+    the request logger or database session, are built by
+    `ComponentFactory` and refer to these shared objects.
 
     Parameters
     ----------
     config : `gafaelfawr.config.Config`
         Gafaelfawr configuration.
+    redis : `aioredis.Redis`
+        Redis client.
+    http_client : `httpx.AsyncClient`
+        Shared HTTP client.
+    token_cache : `gafaelfawr.storage.cache.TokenCache`, optional
+        Process-wide cache of verified tokens, if caching is enabled.
+    token_usage : `gafaelfawr.storage.usage.TokenUsageTracker`, optional
+        Process-wide recorder of token usage.  If not given, token usage is
+        not recorded.
+    auth_history : `~gafaelfawr.storage.auth_history.AuthHistoryRecorder`
+        Process-wide recorder of authentication history.  If not given,
+        authentications are not recorded.
+    change_history : `~gafaelfawr.storage.change_history.TokenChangeRecorder`
+        Process-wide background recorder of token changes.  If not given,
+        all token changes are recorded in the transaction making the change.
     """
 
     def __init__(
@@ -55,23 +83,115 @@ class ComponentFactory:
         config: Config,
         redis: Redis,
         http_client: AsyncClient,
+        token_cache: Optional[TokenCache] = None,
+        token_usage: Optional[TokenUsageTracker] = None,
+        auth_history: Optional[AuthHistoryRecorder] = None,
+        change_history: Optional[TokenChangeRecorder] = None,
+    ) -> None:
+        self.config = config
+        self.redis = redis
+        self.http_client = http_client
+        self.token_cache = token_cache
+        self.token_usage = token_usage
+        self.auth_history = auth_history
+        self.change_history = change_history
+
+        key = config.session_secret
+        compact = config.redis_compact_storage
+        self.token_storage = RedisStorage(
+            TokenData, key, redis, compact=compact
+        )
+        """Encrypted Redis storage for token data."""
+
+        self.oidc_storage = RedisStorage(
+            OIDCAuthorization, key, redis, compact=compact
+        )
+        """Encrypted Redis storage for OpenID Connect authorizations."""
+
+        github_storage = RedisStorage(
+            GitHubCachedResponse, key, redis, compact=compact
+        )
+        self.github_cache = GitHubResponseCache(github_storage)
+        """Cache of GitHub API responses, shared via Redis."""
+
+        self.token_issuer = TokenIssuer(config.issuer)
+        """Issuer for OpenID Connect tokens."""
+
+        self.jwks_cache = JWKSCache(
+            http_client,
+            lifetime=config.verifier.oidc_keys_lifetime,
+            refresh_interval=config.verifier.oidc_keys_refresh_interval,
+        )
+        """Cache of the signing keys of upstream OpenID Connect issuers."""
+
+        cache_size = VERIFIED_TOKEN_CACHE_SIZE
+        self.verified_token_cache = VerifiedTokenCache(cache_size)
+        """Cache of internal JWTs that have already been verified."""
+
+    def log_stats(self, logger: BoundLogger) -> None:
+        """Log the counters of the shared caches and background writers.
+
+        Parameters
+        ----------
+        logger : `structlog.BoundLogger`
+            Logger to use.
+        """
+        stats: Dict[str, Any] = {
+            "github_cache": self.github_cache.stats,
+            "verified_token_cache": self.verified_token_cache.stats,
+        }
+        if self.token_cache:
+            stats["token_cache"] = self.token_cache.stats
+        if self.token_usage:
+            stats["token_usage"] = self.token_usage.stats
+        if self.auth_history:
+            stats["auth_history"] = self.auth_history.stats
+        if self.change_history:
+            stats["change_history"] = self.change_history.stats
+        for name, value in sorted(stats.items()):
+            logger.info(
+                "Component statistics", component=name, **asdict(value)
+            )
+
+
+class ComponentFactory:
+    """Build Gafaelfawr components.
+
+    Given the application configuration, construct the components of the
+    application on demand.  This is broken into a separate class primarily so
+    that the test suite can override portions of it.
+
+    Components are built from the shared objects in a `ProcessContext` plus
+    the per-request logger and database session, so building them is cheap.
+
+    Parameters
+    ----------
+    process_context : `ProcessContext`
+        Components shared by all requests.
+    session : `sqlalchemy.ext.asyncio.AsyncSession`
+        Database session.  This may also be an
+        `~sqlalchemy.ext.asyncio.async_scoped_session` proxy that creates the
+        session the first time it is used.
+    logger : `structlog.BoundLogger`, optional
+        Logger to use.  If not given, the default Gafaelfawr logger is used.
+    """
+
+    def __init__(
+        self,
+        *,
+        process_context: ProcessContext,
+        session: Union[AsyncSession, async_scoped_session],
         logger: Optional[BoundLogger] = None,
-        session: Optional[Session] = None,
     ) -> None:
         if not logger:
             structlog.configure(wrapper_class=structlog.stdlib.BoundLogger)
             logger = structlog.get_logger("gafaelfawr")
             assert logger
 
-        if not session:
-            engine = create_engine(config.database_url)
-            session = Session(bind=engine)
-
-        self._config = config
-        self._redis = redis
-        self._http_client = http_client
-        self._logger = logger
+        self._context = process_context
+        self._config = process_context.config
         self._session = session
+        self._logger = logger
 
     def create_admin_service(self) -> AdminService:
         """Create a new manager object for token administrators.
@@ -97,8 +217,7 @@ class ComponentFactory:
             A new OpenID Connect server.
         """
         assert self._config.oidc_server
-        key = self._config.session_secret
-        storage = RedisStorage(OIDCAuthorization, key, self._redis)
+        storage = self._context.oidc_storage
         authorization_store = OIDCAuthorizationStore(storage)
         issuer = self.create_token_issuer()
         token_service = self.create_token_service()
@@ -130,30 +249,48 @@ class ComponentFactory:
         if self._config.github:
             return GitHubProvider(
                 config=self._config.github,
-                http_client=self._http_client,
+                http_client=self._context.http_client,
                 logger=self._logger,
+                cache=self._context.github_cache,
             )
         elif self._config.oidc:
             token_verifier = self.create_token_verifier()
             return OIDCProvider(
                 config=self._config.oidc,
                 verifier=token_verifier,
-                http_client=self._http_client,
+                http_client=self._context.http_client,
                 logger=self._logger,
             )
         else:
             # This should be caught during configuration file parsing.
             raise NotImplementedError("No authentication provider configured")
 
+    def create_reconcile_service(self) -> ReconcileService:
+        """Create a service for reconciling the token stores.
+
+        Returns
+        -------
+        reconcile_service : `gafaelfawr.services.reconcile.ReconcileService`
+            The new reconcile service.
+        """
+        storage = self._context.token_storage
+        return ReconcileService(
+            token_db_store=TokenDatabaseStore(self._session),
+            token_redis_store=TokenRedisStore(storage, self._logger),
+            token_change_store=TokenChangeHistoryStore(self._session),
+            transaction_manager=TransactionManager(self._session),
+            logger=self._logger,
+        )
+
     def create_token_issuer(self) -> TokenIssuer:
-        """Create a TokenIssuer.
+        """Return the TokenIssuer.
 
         Returns
         -------
         issuer : `gafaelfawr.issuer.TokenIssuer`
-            A new TokenIssuer.
+            The process-wide TokenIssuer.
         """
-        return TokenIssuer(self._config.issuer)
+        return self._context.token_issuer
 
     def create_token_service(self) -> TokenService:
         """Create a TokenService.
@@ -164,16 +301,19 @@ class ComponentFactory:
             The new token manager.
         """
         token_db_store = TokenDatabaseStore(self._session)
-        key = self._config.session_secret
-        storage = RedisStorage(TokenData, key, self._redis)
+        token_change_store = TokenChangeHistoryStore(self._session)
+        storage = self._context.token_storage
         token_redis_store = TokenRedisStore(storage, self._logger)
         transaction_manager = TransactionManager(self._session)
         return TokenService(
             config=self._config,
             token_db_store=token_db_store,
             token_redis_store=token_redis_store,
+            token_change_store=token_change_store,
             transaction_manager=transaction_manager,
             logger=self._logger,
+            token_cache=self._context.token_cache,
+            change_history=self._context.change_history,
         )
 
     def create_token_verifier(self) -> TokenVerifier:
@@ -185,5 +325,8 @@ class ComponentFactory:
             A new TokenVerifier.
         """
         return TokenVerifier(
-            self._config.verifier, self._http_client, self._logger
+            self._config.verifier,
+            self._context.jwks_cache,
+            self._logger,
+            self._context.verified_token_cache,
         )
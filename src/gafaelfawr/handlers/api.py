@@ -8,24 +8,36 @@ models.
 
 from __future__ import annotations
 
-from typing import List
-from urllib.parse import quote
+from typing import TYPE_CHECKING, List, Optional
+from urllib.parse import quote, urlencode
 
-from fastapi import APIRouter, Depends, HTTPException, Path, Response, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 
-from gafaelfawr.constants import USERNAME_REGEX
+from gafaelfawr.constants import TOKEN_LIST_MAX_LIMIT, USERNAME_REGEX
 from gafaelfawr.dependencies.auth import Authenticate
 from gafaelfawr.dependencies.context import RequestContext, context_dependency
 from gafaelfawr.exceptions import (
     BadExpiresError,
     BadScopesError,
     DuplicateTokenNameError,
+    InvalidCursorError,
 )
 from gafaelfawr.models.admin import Admin
 from gafaelfawr.models.auth import APIConfig, APILoginResponse, Scope
 from gafaelfawr.models.token import (
     AdminTokenRequest,
     NewToken,
+    TokenCursor,
     TokenData,
     TokenInfo,
     TokenUserInfo,
@@ -34,6 +46,9 @@ from gafaelfawr.models.token import (
 )
 from gafaelfawr.util import random_128_bits
 
+if TYPE_CHECKING:
+    from typing import AsyncIterator
+
 __all__ = ["router"]
 
 router = APIRouter()
@@ -50,11 +65,11 @@ authenticate_session = Authenticate(require_session=True)
     responses={403: {"description": "Permission denied"}},
     dependencies=[Depends(authenticate_admin)],
 )
-def get_admins(
+async def get_admins(
     context: RequestContext = Depends(context_dependency),
 ) -> List[Admin]:
     admin_service = context.factory.create_admin_service()
-    return admin_service.get_admins()
+    return await admin_service.get_admins()
 
 
 @router.post(
@@ -62,13 +77,13 @@ def get_admins(
     responses={403: {"description": "Permission denied"}},
     status_code=204,
 )
-def add_admin(
+async def add_admin(
     admin: Admin,
     auth_data: TokenData = Depends(authenticate_admin),
     context: RequestContext = Depends(context_dependency),
 ) -> None:
     admin_service = context.factory.create_admin_service()
-    admin_service.add_admin(
+    await admin_service.add_admin(
         admin.username,
         actor=auth_data.username,
         ip_address=context.request.client.host,
@@ -80,7 +95,7 @@ def add_admin(
     responses={404: {"description": "Specified user is not an administrator"}},
     status_code=204,
 )
-def delete_admin(
+async def delete_admin(
     username: str = Path(
         ...,
         title="Administrator",
@@ -92,7 +107,7 @@ def delete_admin(
     context: RequestContext = Depends(context_dependency),
 ) -> None:
     admin_service = context.factory.create_admin_service()
-    success = admin_service.delete_admin(
+    success = await admin_service.delete_admin(
         username,
         actor=auth_data.username,
         ip_address=context.request.client.host,
@@ -139,7 +154,7 @@ async def get_token_info(
     context: RequestContext = Depends(context_dependency),
 ) -> TokenInfo:
     token_service = context.factory.create_token_service()
-    info = token_service.get_token_info_unchecked(auth_data.token.key)
+    info = await token_service.get_token_info_unchecked(auth_data.token.key)
     if not info:
         msg = "Token found in Redis but not database"
         context.logger.warning(msg)
@@ -161,7 +176,7 @@ async def post_admin_tokens(
     token_service = context.factory.create_token_service()
     try:
         token = await token_service.create_token_from_admin_request(
-            token_request, auth_data
+            token_request, auth_data, ip_address=context.request.client.host
         )
     except BadExpiresError as e:
         raise HTTPException(
@@ -209,18 +224,87 @@ async def get_user_info(
 
 @router.get(
     "/users/{username}/tokens",
-    response_model=List[TokenInfo],
-    response_model_exclude_none=True,
+    responses={
+        200: {
+            "model": List[TokenInfo],
+            "content": {
+                "application/x-ndjson": {
+                    "schema": {"$ref": "#/components/schemas/TokenInfo"}
+                }
+            },
+            "description": (
+                "Tokens ordered by creation time, as a JSON array or, if"
+                " application/x-ndjson is requested with Accept, as one JSON"
+                " token object per line."
+            ),
+            "headers": {
+                "Link": {
+                    "description": (
+                        "Only sent if limit is given.  Contains the URL of"
+                        ' the first page (rel="first") and, if there are more'
+                        ' tokens, the URL of the next page (rel="next").'
+                    ),
+                    "schema": {"type": "string"},
+                }
+            },
+        }
+    },
 )
 async def get_tokens(
     username: str = Path(
         ..., min_length=1, max_length=64, regex=USERNAME_REGEX
     ),
+    limit: Optional[int] = Query(
+        None,
+        title="Maximum number of tokens to return",
+        description=(
+            "If not given, all tokens are returned.  If given, the Link"
+            " header contains the URL of the next page, if any."
+        ),
+        ge=1,
+        le=TOKEN_LIST_MAX_LIMIT,
+    ),
+    cursor: Optional[str] = Query(
+        None,
+        title="Return tokens after this position",
+        description="Taken from the Link header of the previous page.",
+    ),
     auth_data: TokenData = Depends(authenticate_session),
     context: RequestContext = Depends(context_dependency),
-) -> List[TokenInfo]:
+) -> Response:
     token_service = context.factory.create_token_service()
-    return token_service.list_tokens(auth_data, username)
+    try:
+        start = TokenCursor.from_str(cursor) if cursor else None
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                "loc": ["query", "cursor"],
+                "type": "invalid_cursor",
+                "msg": str(e),
+            },
+        )
+    ndjson = "application/x-ndjson" in context.request.headers.get(
+        "Accept", ""
+    )
+    media_type = "application/x-ndjson" if ndjson else "application/json"
+
+    # Without a limit, stream all of the tokens so that memory use does not
+    # depend on how many tokens the user has.
+    if not limit:
+        tokens = token_service.stream_tokens(auth_data, username, cursor=start)
+        body = _serialize_tokens(tokens, ndjson=ndjson)
+        return StreamingResponse(body, media_type=media_type)
+
+    page, next_cursor = await token_service.list_tokens_page(
+        auth_data, username, limit=limit, cursor=start
+    )
+    if ndjson:
+        content = "".join(t.json(exclude_none=True) + "\n" for t in page)
+    else:
+        content = "[" + ",".join(t.json(exclude_none=True) for t in page) + "]"
+    link = _build_link_header(context.request, limit, next_cursor)
+    return Response(content, media_type=media_type, headers={"Link": link})
 
 
 @router.post(
@@ -239,7 +323,10 @@ async def post_tokens(
     token_params = token_request.dict(exclude_unset=True)
     try:
         token = await token_service.create_user_token(
-            auth_data, username, **token_params
+            auth_data,
+            username,
+            ip_address=context.request.client.host,
+            **token_params,
         )
     except BadExpiresError as e:
         raise HTTPException(
@@ -288,7 +375,7 @@ async def get_token(
     context: RequestContext = Depends(context_dependency),
 ) -> TokenInfo:
     token_service = context.factory.create_token_service()
-    info = token_service.get_token_info(key, auth_data, username)
+    info = await token_service.get_token_info(key, auth_data, username)
     if not info:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -311,7 +398,9 @@ async def delete_token(
     context: RequestContext = Depends(context_dependency),
 ) -> None:
     token_service = context.factory.create_token_service()
-    success = await token_service.delete_token(key, auth_data, username)
+    success = await token_service.delete_token(
+        key, auth_data, username, ip_address=context.request.client.host
+    )
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -344,7 +433,11 @@ async def patch_token(
         update["no_expire"] = True
     try:
         info = await token_service.modify_token(
-            key, auth_data, username, **update
+            key,
+            auth_data,
+            username,
+            ip_address=context.request.client.host,
+            **update,
         )
     except BadExpiresError as e:
         raise HTTPException(
@@ -383,3 +476,30 @@ async def patch_token(
             },
         )
     return info
+
+
+def _build_link_header(
+    request: Request, limit: int, next_cursor: Optional[TokenCursor]
+) -> str:
+    """Build the ``Link`` header for a page of tokens."""
+    path = request.url.path
+    links = [f'<{path}?{urlencode({"limit": limit})}>; rel="first"']
+    if next_cursor:
+        query = urlencode({"limit": limit, "cursor": str(next_cursor)})
+        links.append(f'<{path}?{query}>; rel="next"')
+    return ", ".join(links)
+
+
+async def _serialize_tokens(
+    tokens: AsyncIterator[TokenInfo], *, ndjson: bool
+) -> AsyncIterator[str]:
+    """Serialize a stream of tokens as a JSON array or NDJSON."""
+    if ndjson:
+        async for token in tokens:
+            yield token.json(exclude_none=True) + "\n"
+    else:
+        separator = "["
+        async for token in tokens:
+            yield separator + token.json(exclude_none=True)
+            separator = ","
+        yield "[]" if separator == "[" else "]"
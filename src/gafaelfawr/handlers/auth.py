@@ -4,7 +4,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, List, Optional, Set
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterable, List, Optional
 
 from fastapi import (
     APIRouter,
@@ -27,9 +27,13 @@ from gafaelfawr.dependencies.context import RequestContext, context_dependency
 from gafaelfawr.exceptions import InsufficientScopeError
 from gafaelfawr.models.token import TokenData
 
+if TYPE_CHECKING:
+    from gafaelfawr.config import Config
+    from gafaelfawr.scopes import ScopeIndex, ScopeSet
+
 router = APIRouter()
 
-__all__ = ["get_auth"]
+__all__ = ["AuthConfig", "AuthProfiles", "auth_profiles", "get_auth"]
 
 
 class Satisfy(Enum):
@@ -45,11 +49,11 @@ class Satisfy(Enum):
     ALL = "all"
 
 
-@dataclass
+@dataclass(frozen=True)
 class AuthConfig:
     """Configuration for an authorization request."""
 
-    scopes: Set[str]
+    scopes: FrozenSet[str]
     """The scopes the authentication token must have."""
 
     satisfy: Satisfy
@@ -67,6 +71,130 @@ class AuthConfig:
     delegate_scopes: List[str]
     """List of scopes the delegated token should have."""
 
+    scopes_accepted: str
+    """The required scopes, sorted and space-separated, for headers."""
+
+    required_scopes: ScopeSet
+    """The required scopes, compiled for authorization checks."""
+
+    @classmethod
+    def build(
+        cls,
+        *,
+        scope_index: ScopeIndex,
+        scopes: Iterable[str],
+        satisfy: Satisfy = Satisfy.ALL,
+        auth_type: AuthType = AuthType.Bearer,
+        notebook: bool = False,
+        delegate_to: Optional[str] = None,
+        delegate_scopes: Optional[List[str]] = None,
+    ) -> AuthConfig:
+        """Construct the configuration for an authorization request.
+
+        The scopes of the delegated token are added to the required scopes.
+
+        Parameters
+        ----------
+        scope_index : `gafaelfawr.scopes.ScopeIndex`
+            The index of known scopes with which to compile the scopes.
+        scopes : Iterable[`str`]
+            The scopes the authentication token must have.
+        satisfy : `Satisfy`, optional
+            The authorization strategy.  Defaults to requiring all scopes.
+        auth_type : `gafaelfawr.auth.AuthType`, optional
+            The authentication type to use in challenges.  Defaults to
+            ``Bearer``.
+        notebook : `bool`, optional
+            Whether to generate a notebook token.
+        delegate_to : `str`, optional
+            Internal service for which to create an internal token.
+        delegate_scopes : List[`str`], optional
+            List of scopes the delegated token should have.
+
+        Returns
+        -------
+        auth_config : `AuthConfig`
+            The corresponding configuration.
+        """
+        if delegate_scopes is None:
+            delegate_scopes = []
+        all_scopes = frozenset(scopes) | frozenset(delegate_scopes)
+        required_scopes = scope_index.compile(sorted(all_scopes))
+        return cls(
+            scopes=all_scopes,
+            satisfy=satisfy,
+            auth_type=auth_type,
+            notebook=notebook,
+            delegate_to=delegate_to,
+            delegate_scopes=delegate_scopes,
+            scopes_accepted=required_scopes.header,
+            required_scopes=required_scopes,
+        )
+
+
+class AuthProfiles:
+    """Authorization profiles compiled from the configuration.
+
+    Ingresses can refer to a profile defined in the ``auth_profiles``
+    configuration setting with the ``profile`` query parameter instead of
+    passing all of the authorization parameters on every request.  The
+    profiles are converted to `AuthConfig` objects once and then reused until
+    the configuration changes.
+    """
+
+    def __init__(self) -> None:
+        self._config: Optional[Config] = None
+        self._profiles: Dict[str, AuthConfig] = {}
+
+    def get(self, config: Config, name: str) -> Optional[AuthConfig]:
+        """Return the compiled configuration for a profile.
+
+        Parameters
+        ----------
+        config : `gafaelfawr.config.Config`
+            The Gafaelfawr configuration.
+        name : `str`
+            The name of the profile.
+
+        Returns
+        -------
+        auth_config : `AuthConfig` or `None`
+            The configuration for that profile, or `None` if there is no
+            profile by that name.
+        """
+        if config is not self._config:
+            self.load(config)
+        return self._profiles.get(name)
+
+    def load(self, config: Config) -> None:
+        """Compile the profiles from the configuration.
+
+        This is called from a startup hook so that the profiles are ready
+        before the first request, and again if the configuration changes.
+
+        Parameters
+        ----------
+        config : `gafaelfawr.config.Config`
+            The Gafaelfawr configuration.
+        """
+        self._profiles = {
+            name: AuthConfig.build(
+                scope_index=config.scope_index,
+                scopes=profile.scopes,
+                satisfy=Satisfy(profile.satisfy),
+                auth_type=AuthType(profile.auth_type),
+                notebook=profile.notebook,
+                delegate_to=profile.delegate_to,
+                delegate_scopes=list(profile.delegate_scopes),
+            )
+            for name, profile in config.auth_profiles.items()
+        }
+        self._config = config
+
+
+auth_profiles = AuthProfiles()
+"""The compiled authorization profiles."""
+
 
 def auth_uri(
     x_original_uri: Optional[str] = Header(None),
@@ -82,25 +210,72 @@ def auth_uri(
 
 
 def auth_config(
-    scope: List[str] = Query(...),
-    satisfy: Satisfy = Satisfy.ALL,
-    auth_type: AuthType = AuthType.Bearer,
-    notebook: bool = False,
+    scope: Optional[List[str]] = Query(None),
+    satisfy: Optional[Satisfy] = None,
+    auth_type: Optional[AuthType] = None,
+    notebook: Optional[bool] = None,
     delegate_to: Optional[str] = None,
     delegate_scope: Optional[str] = None,
+    profile: Optional[str] = None,
     auth_uri: str = Depends(auth_uri),
     context: RequestContext = Depends(context_dependency),
 ) -> AuthConfig:
     """Construct the configuration for an authorization request.
 
     A shared dependency that reads various GET parameters and headers and
-    converts them into an `AuthConfig` class.
+    converts them into an `AuthConfig` class.  If ``profile`` is given, the
+    configuration is instead taken from the authorization profile of that
+    name, and no other parameters may be given.
 
     Raises
     ------
     fastapi.HTTPException
-        If ``notebook`` and ``delegate_to`` are both set.
+        If ``notebook`` and ``delegate_to`` are both set, if ``scope`` is not
+        set and ``profile`` is not used, if ``profile`` is used with other
+        parameters, or if ``profile`` does not name a known profile.
     """
+    if profile is not None:
+        params = (scope, satisfy, auth_type, notebook, delegate_to)
+        if delegate_scope is not None or any(p is not None for p in params):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={
+                    "loc": ["query", "profile"],
+                    "type": "invalid_profile",
+                    "msg": "profile cannot be combined with other parameters",
+                },
+            )
+        config = auth_profiles.get(context.config, profile)
+        if not config:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={
+                    "loc": ["query", "profile"],
+                    "type": "invalid_profile",
+                    "msg": f"Unknown authorization profile {profile}",
+                },
+            )
+        context.rebind_logger(
+            auth_uri=auth_uri,
+            auth_profile=profile,
+            required_scope=config.scopes_accepted,
+            satisfy=config.satisfy.value,
+        )
+        return config
+
+    if not scope:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=[
+                {
+                    "loc": ["query", "scope"],
+                    "msg": "field required",
+                    "type": "value_error.missing",
+                }
+            ],
+        )
+    if not satisfy:
+        satisfy = Satisfy.ALL
     context.rebind_logger(
         auth_uri=auth_uri,
         required_scope=" ".join(sorted(scope)),
@@ -119,22 +294,25 @@ def auth_config(
         delegate_scopes = [s.strip() for s in delegate_scope.split(",")]
     else:
         delegate_scopes = []
-    return AuthConfig(
-        scopes=set(scope) | set(delegate_scopes),
+    return AuthConfig.build(
+        scope_index=context.config.scope_index,
+        scopes=scope,
         satisfy=satisfy,
-        auth_type=auth_type,
-        notebook=notebook,
+        auth_type=auth_type or AuthType.Bearer,
+        notebook=bool(notebook),
         delegate_to=delegate_to,
         delegate_scopes=delegate_scopes,
     )
 
 
 async def authenticate_with_type(
-    auth_type: AuthType = AuthType.Bearer,
+    auth_config: AuthConfig = Depends(auth_config),
     context: RequestContext = Depends(context_dependency),
 ) -> TokenData:
-    """Set authentication challenge based on auth_type parameter."""
-    authenticate = Authenticate(auth_type=auth_type, ajax_forbidden=True)
+    """Set authentication challenge based on the authorization config."""
+    authenticate = Authenticate(
+        auth_type=auth_config.auth_type, ajax_forbidden=True
+    )
     return await authenticate(context=context)
 
 
@@ -159,6 +337,10 @@ async def get_auth(
     auth_type (optional)
         The authentication type to use in challenges.  If given, must be
         either ``bearer`` or ``basic``.  Defaults to ``bearer``.
+    profile (optional)
+        The name of an authorization profile from the ``auth_profiles``
+        setting to use instead of the other parameters, which then must not
+        be given.
 
     Expects the following headers to be set in the request:
 
@@ -197,22 +379,7 @@ async def get_auth(
     WWW-Authenticate
         If the request is unauthenticated, this header will be set.
     """
-    # Determine whether the request is authorized.
-    if auth_config.satisfy == Satisfy.ANY:
-        authorized = any([s in token_data.scopes for s in auth_config.scopes])
-    else:
-        authorized = all([s in token_data.scopes for s in auth_config.scopes])
-
-    # If not authorized, log and raise the appropriate error.
-    if not authorized:
-        exc = InsufficientScopeError("Token missing required scope")
-        raise generate_challenge(
-            context, auth_config.auth_type, exc, auth_config.scopes
-        )
-
-    # Log and return the results.
-    context.logger.info("Token authorized")
-    headers = await build_success_headers(context, auth_config, token_data)
+    headers = await authorize(context, auth_config, token_data)
     response.headers.update(headers)
     return {"status": "ok"}
 
@@ -250,7 +417,7 @@ async def get_auth_forbidden(
         realm=context.config.realm,
         error=AuthError.insufficient_scope,
         error_description=error,
-        scope=" ".join(sorted(auth_config.scopes)),
+        scope=auth_config.scopes_accepted,
     )
     headers = {
         "Cache-Control": "no-cache, must-revalidate",
@@ -264,8 +431,57 @@ async def get_auth_forbidden(
     )
 
 
-async def build_success_headers(
+async def authorize(
     context: RequestContext, auth_config: AuthConfig, token_data: TokenData
+) -> Dict[str, str]:
+    """Authorize a request and construct the headers for the response.
+
+    Parameters
+    ----------
+    context : `gafaelfawr.dependencies.context.RequestContext`
+        The context of the incoming request.
+    auth_config : `AuthConfig`
+        Configuration parameters for the authorization.
+    token_data : `gafaelfawr.models.token.TokenData`
+        The data from the authentication token.
+
+    Returns
+    -------
+    headers : Dict[`str`, `str`]
+        Headers to include in the response.
+
+    Raises
+    ------
+    fastapi.HTTPException
+        If the token does not have the required scopes.
+    """
+    # Determine whether the request is authorized.
+    token_scopes = context.config.scope_index.compile(token_data.scopes)
+    required_scopes = auth_config.required_scopes
+    if auth_config.satisfy == Satisfy.ANY:
+        authorized = token_scopes.has_any(required_scopes)
+    else:
+        authorized = token_scopes.has_all(required_scopes)
+
+    # If not authorized, log and raise the appropriate error.
+    if not authorized:
+        exc = InsufficientScopeError("Token missing required scope")
+        raise generate_challenge(
+            context, auth_config.auth_type, exc, auth_config.scopes
+        )
+
+    # Log and return the results.
+    context.logger.info("Token authorized")
+    return await build_success_headers(
+        context, auth_config, token_data, token_scopes
+    )
+
+
+async def build_success_headers(
+    context: RequestContext,
+    auth_config: AuthConfig,
+    token_data: TokenData,
+    token_scopes: ScopeSet,
 ) -> Dict[str, str]:
     """Construct the headers for successful authorization.
 
@@ -277,6 +493,8 @@ async def build_success_headers(
         Configuration parameters for the authorization.
     token_data : `gafaelfawr.models.token.TokenData`
         The data from the authentication token.
+    token_scopes : `gafaelfawr.scopes.ScopeSet`
+        The compiled scopes of the authentication token.
 
     Returns
     -------
@@ -285,9 +503,9 @@ async def build_success_headers(
     """
     headers = {
         "X-Auth-Request-Client-Ip": context.request.client.host,
-        "X-Auth-Request-Scopes-Accepted": " ".join(sorted(auth_config.scopes)),
-        "X-Auth-Request-Scopes-Satisfy": auth_config.satisfy.name.lower(),
-        "X-Auth-Request-Token-Scopes": " ".join(sorted(token_data.scopes)),
+        "X-Auth-Request-Scopes-Accepted": auth_config.scopes_accepted,
+        "X-Auth-Request-Scopes-Satisfy": auth_config.satisfy.value,
+        "X-Auth-Request-Token-Scopes": token_scopes.header,
         "X-Auth-Request-User": token_data.username,
     }
     if token_data.uid:
@@ -298,7 +516,9 @@ async def build_success_headers(
 
     if auth_config.notebook:
         token_service = context.factory.create_token_service()
-        token = await token_service.get_notebook_token(token_data)
+        token = await token_service.get_notebook_token(
+            token_data, ip_address=context.request.client.host
+        )
         headers["X-Auth-Request-Token"] = str(token)
     elif auth_config.delegate_to:
         token_service = context.factory.create_token_service()
@@ -306,6 +526,7 @@ async def build_success_headers(
             token_data,
             service=auth_config.delegate_to,
             scopes=auth_config.delegate_scopes,
+            ip_address=context.request.client.host,
         )
         headers["X-Auth-Request-Token"] = str(token)
 
@@ -0,0 +1,302 @@
+"""Raw ASGI implementation of the ``/auth`` route.
+
+The ``/auth`` route is called by the NGINX ingress for every request to a
+protected application, so it dominates Gafaelfawr's load.  This module
+provides an implementation of it that bypasses FastAPI's dependency
+resolution, pydantic validation of the query parameters, and JSON
+serialization of a response body that NGINX discards.  It is enabled with the
+``fast_auth`` configuration setting and otherwise defers to the FastAPI
+route, and it shares the authentication and authorization logic of
+`gafaelfawr.handlers.auth`, so the two implementations return the same
+status codes, headers, and challenges.
+"""
+
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import TYPE_CHECKING
+from urllib.parse import parse_qsl, unquote_plus
+
+from fastapi import HTTPException, Request, status
+
+from gafaelfawr.auth import AuthType
+from gafaelfawr.dependencies.auth_history import auth_history_dependency
+from gafaelfawr.dependencies.change_history import change_history_dependency
+from gafaelfawr.dependencies.config import config_dependency
+from gafaelfawr.dependencies.context import RequestContext
+from gafaelfawr.dependencies.db_session import db_session_dependency
+from gafaelfawr.dependencies.http_client import http_client_dependency
+from gafaelfawr.dependencies.logger import logger_dependency
+from gafaelfawr.dependencies.process_context import process_context_dependency
+from gafaelfawr.dependencies.redis import redis_dependency
+from gafaelfawr.dependencies.token_cache import token_cache_dependency
+from gafaelfawr.dependencies.token_usage import token_usage_dependency
+from gafaelfawr.handlers.auth import (
+    AuthConfig,
+    Satisfy,
+    auth_config,
+    auth_uri,
+    authenticate_with_type,
+    authorize,
+)
+
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Type, TypeVar
+
+    from sqlalchemy.ext.asyncio import async_scoped_session
+    from starlette.types import ASGIApp, Receive, Scope, Send
+
+    from gafaelfawr.config import Config
+
+    E = TypeVar("E", bound=Enum)
+
+__all__ = ["FastAuthApp"]
+
+_TRUE_VALUES = frozenset(("1", "on", "t", "true", "y", "yes"))
+"""Query parameter values accepted as true, matching pydantic."""
+
+_FALSE_VALUES = frozenset(("0", "off", "f", "false", "n", "no"))
+"""Query parameter values accepted as false, matching pydantic."""
+
+
+class FastAuthApp:
+    """ASGI application for the ``/auth`` route.
+
+    This replaces the application of the FastAPI ``/auth`` route, so routing
+    and the OpenAPI documentation are unchanged.  If the ``fast_auth``
+    configuration setting is not enabled, requests are passed to the original
+    FastAPI route application.
+
+    Errors are reported by raising `fastapi.HTTPException`, which is turned
+    into a response by the same exception handler used for the FastAPI route.
+    Query parameter errors use the same format as FastAPI validation errors.
+    On success, the response is an empty 200 with the ``X-Auth-Request-*``
+    headers.
+
+    Parameters
+    ----------
+    fallback : `starlette.types.ASGIApp`
+        The application of the FastAPI ``/auth`` route.
+    """
+
+    def __init__(self, fallback: ASGIApp) -> None:
+        self.fallback = fallback
+        self._db_session = asynccontextmanager(db_session_dependency)
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        config = config_dependency()
+        if not config.fast_auth:
+            await self.fallback(scope, receive, send)
+            return
+
+        request = Request(scope, receive)
+        async with self._db_session(config) as session:
+            context = await self._build_context(request, config, session)
+            headers = await self._handle(context, scope)
+
+        raw_headers = [
+            (k.lower().encode(), v.encode("latin-1"))
+            for k, v in headers.items()
+        ]
+        raw_headers.append((b"content-length", b"0"))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status.HTTP_200_OK,
+                "headers": raw_headers,
+            }
+        )
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _build_context(
+        self, request: Request, config: Config, session: async_scoped_session
+    ) -> RequestContext:
+        """Construct the request context without FastAPI dependencies."""
+        redis = await redis_dependency(config)
+        http_client = await http_client_dependency()
+        token_cache = await token_cache_dependency(config, redis)
+        token_usage = await token_usage_dependency(config)
+        auth_history = await auth_history_dependency(config)
+        change_history = await change_history_dependency(config)
+        process_context = process_context_dependency(
+            config,
+            redis,
+            http_client,
+            token_cache,
+            token_usage,
+            auth_history,
+            change_history,
+        )
+        return RequestContext(
+            request=request,
+            config=config,
+            logger=logger_dependency(request, config),
+            session=session,
+            process_context=process_context,
+        )
+
+    async def _handle(
+        self, context: RequestContext, scope: Scope
+    ) -> Dict[str, str]:
+        """Authenticate and authorize the request.
+
+        The query parameters are checked in the same order as FastAPI
+        resolves the dependencies of the ``/auth`` route, so that requests
+        with several problems get the same error.
+
+        Returns
+        -------
+        headers : Dict[`str`, `str`]
+            Headers to include in the response.
+
+        Raises
+        ------
+        fastapi.HTTPException
+            If the request is invalid, not authenticated, or not authorized.
+        """
+        uri = auth_uri(
+            self._get_header(scope, b"x-original-uri"),
+            self._get_header(scope, b"x-original-url"),
+        )
+
+        # Ingresses using an authorization profile pass only the profile
+        # name, so avoid parsing the query string in that case.
+        query_string: bytes = scope["query_string"]
+        if query_string.startswith(b"profile=") and b"&" not in query_string:
+            profile = unquote_plus(query_string[8:].decode("latin-1"))
+            config = auth_config(
+                scope=None,
+                satisfy=None,
+                auth_type=None,
+                notebook=None,
+                delegate_to=None,
+                delegate_scope=None,
+                profile=profile,
+                auth_uri=uri,
+                context=context,
+            )
+        else:
+            config = self._build_auth_config(context, query_string, uri)
+
+        token_data = await authenticate_with_type(config, context)
+        return await authorize(context, config, token_data)
+
+    def _build_auth_config(
+        self, context: RequestContext, query_string: bytes, uri: str
+    ) -> AuthConfig:
+        """Build the authorization configuration from the query parameters.
+
+        Raises
+        ------
+        fastapi.HTTPException
+            If the query parameters are invalid.
+        """
+        params = self._parse_query(query_string)
+        errors: List[Dict[str, Any]] = []
+        satisfy = self._parse_enum(params, "satisfy", Satisfy, errors)
+        auth_type = self._parse_enum(params, "auth_type", AuthType, errors)
+        notebook = self._parse_bool(params, "notebook", errors)
+        if errors:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=errors,
+            )
+        return auth_config(
+            scope=params.get("scope"),
+            satisfy=satisfy,
+            auth_type=auth_type,
+            notebook=notebook,
+            delegate_to=self._get_param(params, "delegate_to"),
+            delegate_scope=self._get_param(params, "delegate_scope"),
+            profile=self._get_param(params, "profile"),
+            auth_uri=uri,
+            context=context,
+        )
+
+    @staticmethod
+    def _get_header(scope: Scope, name: bytes) -> Optional[str]:
+        """Return the first value of a header, if present."""
+        for key, value in scope["headers"]:
+            if key == name:
+                return value.decode("latin-1")
+        return None
+
+    @staticmethod
+    def _get_param(params: Dict[str, List[str]], name: str) -> Optional[str]:
+        """Return the last value of a query parameter, if present."""
+        values = params.get(name)
+        return values[-1] if values else None
+
+    @classmethod
+    def _parse_bool(
+        cls,
+        params: Dict[str, List[str]],
+        name: str,
+        errors: List[Dict[str, Any]],
+    ) -> Optional[bool]:
+        """Parse an optional boolean query parameter.
+
+        Returns `None` if the parameter is not set.  Adds to ``errors`` and
+        returns `None` if the value is invalid.
+        """
+        value = cls._get_param(params, name)
+        if value is None:
+            return None
+        if value.lower() in _TRUE_VALUES:
+            return True
+        if value.lower() in _FALSE_VALUES:
+            return False
+        errors.append(
+            {
+                "loc": ["query", name],
+                "msg": "value could not be parsed to a boolean",
+                "type": "type_error.bool",
+            }
+        )
+        return None
+
+    @classmethod
+    def _parse_enum(
+        cls,
+        params: Dict[str, List[str]],
+        name: str,
+        enum: Type[E],
+        errors: List[Dict[str, Any]],
+    ) -> Optional[E]:
+        """Parse an optional enum query parameter.
+
+        Returns `None` if the parameter is not set.  Adds to ``errors`` and
+        returns `None` if the value is invalid.
+        """
+        value = cls._get_param(params, name)
+        if value is None:
+            return None
+        try:
+            return enum(value)
+        except ValueError:
+            values = [e.value for e in enum]
+            permitted = ", ".join(repr(v) for v in values)
+            errors.append(
+                {
+                    "loc": ["query", name],
+                    "msg": (
+                        "value is not a valid enumeration member;"
+                        f" permitted: {permitted}"
+                    ),
+                    "type": "type_error.enum",
+                    "ctx": {"enum_values": values},
+                }
+            )
+            return None
+
+    @staticmethod
+    def _parse_query(query_string: bytes) -> Dict[str, List[str]]:
+        """Parse the query string into lists of values by parameter."""
+        params: Dict[str, List[str]] = {}
+        query = query_string.decode("latin-1")
+        for key, value in parse_qsl(query, keep_blank_values=True):
+            params.setdefault(key, []).append(value)
+        return params
@@ -15,7 +15,7 @@ from gafaelfawr.dependencies.return_url import return_url_with_header
 from gafaelfawr.exceptions import ProviderException
 
 if TYPE_CHECKING:
-    from typing import List, Set
+    from typing import List
 
     from gafaelfawr.config import Config
     from gafaelfawr.models.token import TokenGroup
@@ -209,10 +209,12 @@ async def handle_provider_return(
     # Construct a token.
     scopes = get_scopes_from_groups(context.config, user_info.groups)
     admin_service = context.factory.create_admin_service()
-    if admin_service.is_admin(user_info.username):
+    if await admin_service.is_admin(user_info.username):
         scopes = sorted(scopes + ["admin:token"])
     token_service = context.factory.create_token_service()
-    token = await token_service.create_session_token(user_info, scopes)
+    token = await token_service.create_session_token(
+        user_info, scopes, ip_address=context.request.client.host
+    )
     context.state.token = token
 
     # Successful login, so clear the login state and send the user back to
@@ -251,7 +253,4 @@ def get_scopes_from_groups(
     """
     if not groups:
         return []
-    scopes: Set[str] = set()
-    for group in [g.name for g in groups]:
-        scopes.update(config.issuer.group_mapping.get(group, set()))
-    return sorted(scopes)
+    return config.issuer.group_mapping.get_scopes(g.name for g in groups)
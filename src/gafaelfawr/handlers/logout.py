@@ -23,11 +23,19 @@ async def get_logout(
 ) -> RedirectResponse:
     """Log out and redirect the user.
 
-    The user is redirected to the URL given in the rd parameter, if any, and
-    otherwise to the after_logout_url configuration setting.
+    The session token and all of its child tokens are revoked.  The user is
+    redirected to the URL given in the rd parameter, if any, and otherwise to
+    the after_logout_url configuration setting.
     """
-    if context.state.token:
+    token = context.state.token
+    if token:
         context.logger.info("Successful logout")
+        token_service = context.factory.create_token_service()
+        data = await token_service.get_data(token)
+        if data:
+            await token_service.delete_token(
+                token.key, data, ip_address=context.request.client.host
+            )
     else:
         context.logger.info("Logout of already-logged-out session")
     context.state = State()
@@ -2,19 +2,26 @@
 
 from __future__ import annotations
 
-from typing import Dict, List
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Response
 from pydantic import BaseModel
 
+from gafaelfawr.config import Config
 from gafaelfawr.constants import ALGORITHM
 from gafaelfawr.dependencies.context import RequestContext, context_dependency
 
 router = APIRouter()
 
 __all__ = [
+    "RenderedDocument",
+    "WellKnownDocuments",
     "get_well_known_jwks",
     "get_well_known_openid",
+    "well_known_documents",
 ]
 
 
@@ -58,34 +65,149 @@ class OpenIdConfig(BaseModel):
     """Supported mechanisms to authenticate to the token endpoint."""
 
 
+@dataclass(frozen=True)
+class RenderedDocument:
+    """A ``/.well-known`` response body rendered once and reused."""
+
+    body: bytes
+    """The JSON-encoded body."""
+
+    etag: str
+    """Strong entity tag for the body, including the quotes."""
+
+    @classmethod
+    def from_model(cls, model: BaseModel) -> RenderedDocument:
+        """Render a model the same way FastAPI would render it."""
+        body = json.dumps(
+            model.dict(),
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+        ).encode()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        return cls(body=body, etag=etag)
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an ``If-None-Match`` header matches this document.
+
+        Per :rfc:`7232`, the weak comparison function is used, so an entity
+        tag matches regardless of a ``W/`` prefix.
+        """
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        for etag in if_none_match.split(","):
+            etag = etag.strip()
+            if etag.startswith("W/"):
+                etag = etag[2:]
+            if etag == self.etag:
+                return True
+        return False
+
+
+class WellKnownDocuments:
+    """The ``/.well-known`` responses rendered from the configuration.
+
+    The responses depend only on the configuration, so they are rendered to
+    bytes once, along with their entity tags, and then reused until the
+    configuration changes.
+    """
+
+    def __init__(self) -> None:
+        self._config: Optional[Config] = None
+        self._jwks: Optional[RenderedDocument] = None
+        self._openid: Optional[RenderedDocument] = None
+
+    def jwks(self, config: Config) -> RenderedDocument:
+        """Return the rendered ``/.well-known/jwks.json`` response."""
+        if config is not self._config:
+            self.load(config)
+        assert self._jwks
+        return self._jwks
+
+    def openid(self, config: Config) -> RenderedDocument:
+        """Return the rendered ``/.well-known/openid-configuration``."""
+        if config is not self._config:
+            self.load(config)
+        assert self._openid
+        return self._openid
+
+    def load(self, config: Config) -> None:
+        """Render the responses from the configuration.
+
+        This is called from a startup hook so that the responses are ready
+        before the first request, and again if the configuration changes.
+
+        Parameters
+        ----------
+        config : `gafaelfawr.config.Config`
+            The Gafaelfawr configuration.
+        """
+        keypair = config.issuer.keypair
+        jwks = keypair.public_key_as_jwks(kid=config.issuer.kid)
+        self._jwks = RenderedDocument.from_model(KeySet(keys=[jwks]))
+        base_url = config.issuer.iss
+        openid_config = OpenIdConfig(
+            issuer=config.issuer.iss,
+            authorization_endpoint=base_url + "/auth/openid/login",
+            token_endpoint=base_url + "/auth/openid/token",
+            userinfo_endpoint=base_url + "/auth/userinfo",
+            jwks_uri=base_url + "/.well-known/jwks.json",
+        )
+        self._openid = RenderedDocument.from_model(openid_config)
+        self._config = config
+
+
+well_known_documents = WellKnownDocuments()
+"""The rendered ``/.well-known`` responses."""
+
+
+def _build_response(
+    document: RenderedDocument, if_none_match: Optional[str], max_age: int
+) -> Response:
+    """Build the response for a rendered document.
+
+    Returns a 304 response with no body if the client already has the current
+    version of the document.
+    """
+    headers = {
+        "Cache-Control": f"public, max-age={max_age}",
+        "ETag": document.etag,
+    }
+    if document.matches(if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=document.body, media_type="application/json", headers=headers
+    )
+
+
 @router.get("/.well-known/jwks.json", response_model=KeySet)
 async def get_well_known_jwks(
+    if_none_match: Optional[str] = Header(None),
     context: RequestContext = Depends(context_dependency),
-) -> KeySet:
+) -> Response:
     """Handler for ``/.well-known/jwks.json``.
 
     Serve metadata about our signing key.
     """
-    keypair = context.config.issuer.keypair
-    jwks = keypair.public_key_as_jwks(kid=context.config.issuer.kid)
+    document = well_known_documents.jwks(context.config)
+    max_age = context.config.issuer.metadata_max_age
     context.logger.info("Returned JWKS")
-    return KeySet(keys=[jwks])
+    return _build_response(document, if_none_match, max_age)
 
 
 @router.get("/.well-known/openid-configuration", response_model=OpenIdConfig)
 async def get_well_known_openid(
+    if_none_match: Optional[str] = Header(None),
     context: RequestContext = Depends(context_dependency),
-) -> OpenIdConfig:
+) -> Response:
     """Handler for ``/.well-known/openid-configuration``.
 
     Serve metadata about our OpenID Connect implementation.
     """
-    base_url = context.config.issuer.iss
+    document = well_known_documents.openid(context.config)
+    max_age = context.config.issuer.metadata_max_age
     context.logger.info("Returned OpenID Connect configuration")
-    return OpenIdConfig(
-        issuer=context.config.issuer.iss,
-        authorization_endpoint=base_url + "/auth/openid/login",
-        token_endpoint=base_url + "/auth/openid/token",
-        userinfo_endpoint=base_url + "/auth/userinfo",
-        jwks_uri=base_url + "/.well-known/jwks.json",
-    )
+    return _build_response(document, if_none_match, max_age)
@@ -37,6 +37,12 @@ class TokenIssuer:
     def __init__(self, config: IssuerConfig) -> None:
         self._config = config
 
+        # Sign with the key object so that PyJWT does not have to parse a
+        # PEM-encoded key for every token.  PyJWT accepts key objects at
+        # runtime, but its type annotations only allow str.
+        self._signing_key: Any = config.keypair.private_key
+        self._headers = {"kid": config.kid}
+
     def issue_token(
         self, user_info: TokenUserInfo, **claims: str
     ) -> OIDCVerifiedToken:
@@ -125,9 +131,9 @@ class TokenIssuer:
         """
         encoded_token = jwt.encode(
             payload,
-            self._config.keypair.private_key_as_pem().decode(),
+            self._signing_key,
             algorithm=ALGORITHM,
-            headers={"kid": self._config.kid},
+            headers=self._headers,
         )
         return OIDCVerifiedToken(
             encoded=encoded_token,
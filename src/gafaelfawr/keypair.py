@@ -69,6 +69,11 @@ class RSAKeyPair:
         self, private_key: rsa.RSAPrivateKeyWithSerialization
     ) -> None:
         self.private_key = private_key
+        """The private key, usable directly for signing."""
+
+        self.public_key = private_key.public_key()
+        """The public key, usable directly for verifying signatures."""
+
         self._private_key_as_pem: Optional[bytes] = None
         self._public_key_as_pem: Optional[bytes] = None
 
@@ -121,8 +126,7 @@ class RSAKeyPair:
             The public key in PEM encoding and SubjectPublicKeyInfo format.
         """
         if not self._public_key_as_pem:
-            public_key = self.private_key.public_key()
-            self._public_key_as_pem = public_key.public_bytes(
+            self._public_key_as_pem = self.public_key.public_bytes(
                 Encoding.PEM, PublicFormat.SubjectPublicKeyInfo
             )
         return self._public_key_as_pem
@@ -135,4 +139,4 @@ class RSAKeyPair:
         nums : `cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicNumbers`
             The public numbers.
         """
-        return self.private_key.public_key().public_numbers()
+        return self.public_key.public_numbers()
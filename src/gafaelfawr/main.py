@@ -5,16 +5,23 @@ from __future__ import annotations
 import os
 from pathlib import Path
 from typing import TYPE_CHECKING
-from urllib.parse import urlparse
 
 from fastapi import FastAPI, status
 from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
 from fastapi.staticfiles import StaticFiles
-from fastapi_sqlalchemy import DBSessionMiddleware
 
 from gafaelfawr.constants import COOKIE_NAME
+from gafaelfawr.dependencies.auth_history import auth_history_dependency
+from gafaelfawr.dependencies.change_history import change_history_dependency
 from gafaelfawr.dependencies.config import config_dependency
+from gafaelfawr.dependencies.db_session import db_session_dependency
+from gafaelfawr.dependencies.http_client import http_client_dependency
+from gafaelfawr.dependencies.process_context import process_context_dependency
 from gafaelfawr.dependencies.redis import redis_dependency
+from gafaelfawr.dependencies.token_cache import token_cache_dependency
+from gafaelfawr.dependencies.token_sweeper import token_sweeper_dependency
+from gafaelfawr.dependencies.token_usage import token_usage_dependency
 from gafaelfawr.exceptions import PermissionDeniedError
 from gafaelfawr.handlers import (
     analyze,
@@ -28,6 +35,7 @@ from gafaelfawr.handlers import (
     userinfo,
     well_known,
 )
+from gafaelfawr.handlers.fast_auth import FastAuthApp
 from gafaelfawr.middleware.state import StateMiddleware
 from gafaelfawr.middleware.x_forwarded import XForwardedMiddleware
 from gafaelfawr.models.state import State
@@ -52,6 +60,13 @@ app.include_router(oidc.router)
 app.include_router(userinfo.router)
 app.include_router(well_known.router)
 
+# Serve /auth with the raw ASGI implementation if it is enabled.  This
+# replaces the application of the FastAPI route, so routing and the OpenAPI
+# schema are unchanged.
+for route in app.routes:
+    if isinstance(route, APIRoute) and route.path == "/auth":
+        route.app = FastAuthApp(route.app)
+
 static_path = os.getenv(
     "GAFAELFAWR_UI_PATH", Path(__file__).parent.parent.parent / "ui" / "public"
 )
@@ -64,14 +79,10 @@ app.mount(
 @app.on_event("startup")
 async def startup_event() -> None:
     config = config_dependency()
-    engine_args = {}
-    if urlparse(config.database_url).scheme == "sqlite":
-        engine_args["connect_args"] = {"check_same_thread": False}
-    app.add_middleware(
-        DBSessionMiddleware,
-        db_url=config.database_url,
-        engine_args=engine_args,
-    )
+    auth.auth_profiles.load(config)
+    well_known.well_known_documents.load(config)
+    if config.token_sweeper.enabled:
+        await token_sweeper_dependency(config)
     app.add_middleware(XForwardedMiddleware, proxies=config.proxies)
     app.add_middleware(
         StateMiddleware, cookie_name=COOKIE_NAME, state_class=State
@@ -80,7 +91,15 @@ async def startup_event() -> None:
 
 @app.on_event("shutdown")
 async def shutdown_event() -> None:
+    process_context_dependency.close()
+    await token_cache_dependency.close()
+    await token_usage_dependency.close()
+    await token_sweeper_dependency.close()
+    await auth_history_dependency.close()
+    await change_history_dependency.close()
     await redis_dependency.close()
+    await http_client_dependency.close()
+    await db_session_dependency.close()
 
 
 @app.exception_handler(PermissionDeniedError)
@@ -2,19 +2,20 @@
 
 from __future__ import annotations
 
+import http.cookies
 from abc import ABC, abstractmethod
 from dataclasses import replace
 from typing import TYPE_CHECKING
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Request
+from starlette.datastructures import MutableHeaders
 
 if TYPE_CHECKING:
-    from typing import Awaitable, Callable, Type
+    from typing import Optional, Type
 
-    from fastapi import FastAPI
+    from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-__all__ = ["BaseState", "StateMiddleware"]
+__all__ = ["BaseState", "LazyState", "StateMiddleware"]
 
 
 class BaseState(ABC):
@@ -55,14 +56,87 @@ class BaseState(ABC):
         """
 
 
-class StateMiddleware(BaseHTTPMiddleware):
+class LazyState:
+    """Cookie state for a single request, decoded on first access.
+
+    Decoding the state cookie requires decryption, which is wasted work for
+    the many requests whose handlers never look at the state.  This class
+    holds the raw cookie and only decodes it when the state is first
+    requested or replaced.
+
+    Parameters
+    ----------
+    cookie : `str` or `None`
+        The encrypted cookie value, or `None` if the request had no state
+        cookie.
+    state_class : `BaseState`
+        The class to use to parse the cookie.
+    request : `fastapi.Request`
+        The incoming request, used for logging.
+    """
+
+    def __init__(
+        self,
+        cookie: Optional[str],
+        state_class: Type[BaseState],
+        request: Request,
+    ) -> None:
+        self._cookie = cookie
+        self._state_class = state_class
+        self._request = request
+        self._original: Optional[BaseState] = None
+        self._state: Optional[BaseState] = None
+
+    @property
+    def changed(self) -> bool:
+        """Whether the state was modified during the request."""
+        return self._state is not None and self._state != self._original
+
+    def get(self) -> BaseState:
+        """Return the state, decoding the cookie if needed.
+
+        Returns
+        -------
+        state : `BaseState`
+            The state for this request.  Changes to it will be written back
+            to the cookie when the response is sent.
+        """
+        if self._state is None:
+            if self._cookie is None:
+                self._original = self._state_class()
+            else:
+                self._original = self._state_class.from_cookie(
+                    self._cookie, self._request
+                )
+
+            # Hand out a copy rather than the original so that we can
+            # determine if the state has changed and therefore whether to
+            # replace the cookie after the request handler runs.  replace()
+            # with no additional parameters makes a copy of a dataclass.
+            self._state = replace(self._original)
+        return self._state
+
+    def set(self, state: BaseState) -> None:
+        """Replace the state for this request.
+
+        Parameters
+        ----------
+        state : `BaseState`
+            The new state.
+        """
+        self.get()
+        self._state = state
+
+
+class StateMiddleware:
     """Middleware to read and update an encrypted state cookie.
 
-    If a cookie by the given name exists, it will be parsed by the given class
-    and stored as ``request.state.cookie``.  If anything in that object is
-    changed as determined by an equality comparison, the state will be
-    converted back to a cookie and set in the response after the request is
-    complete.
+    The value of the cookie by the given name, if any, is wrapped in a
+    `LazyState` object and stored as ``request.state.cookie``.  The cookie is
+    only parsed by the given class when the state is first retrieved from
+    that object.  If anything in the state is changed as determined by an
+    equality comparison, the state will be converted back to a cookie and set
+    in the response.
 
     The cookie will be marked as ``HttpOnly`` and will be marked as ``Secure``
     unless the application is running on localhost and not using TLS.
@@ -74,7 +148,7 @@ class StateMiddleware(BaseHTTPMiddleware):
 
     Parameters
     ----------
-    app : `fastapi.FastAPI`
+    app : `starlette.types.ASGIApp`
         The ASGI application.
     cookie_name : `str`
         The name of the state cookie.
@@ -84,40 +158,60 @@ class StateMiddleware(BaseHTTPMiddleware):
     """
 
     def __init__(
-        self, app: FastAPI, *, cookie_name: str, state_class: Type[BaseState]
+        self, app: ASGIApp, *, cookie_name: str, state_class: Type[BaseState]
     ) -> None:
-        super().__init__(app)
+        self.app = app
         self.cookie_name = cookie_name
         self.state_class = state_class
 
-    async def dispatch(
-        self,
-        request: Request,
-        call_next: Callable[[Request], Awaitable[Response]],
-    ) -> Response:
-        if self.cookie_name in request.cookies:
-            cookie = request.cookies[self.cookie_name]
-            state = self.state_class.from_cookie(cookie, request)
-        else:
-            state = self.state_class()
-
-        # Put a copy of the state into the request object.  replace() with no
-        # additional parameters makes a copy of a dataclass.  We need to store
-        # a copy rather than the original so that we can determine if the
-        # state has changed and therefore whether to replace the cookie after
-        # the request handler runs.
-        request.state.cookie = replace(state)
-        response = await call_next(request)
-
-        # If the state has changed, write out the new state.
-        if request.state.cookie != state:
-            cookie = request.state.cookie.as_cookie()
-            secure = self.is_cookie_secure(request)
-            response.set_cookie(
-                self.cookie_name, cookie, secure=secure, httponly=True
-            )
-
-        return response
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        cookie = request.cookies.get(self.cookie_name)
+        state = LazyState(cookie, self.state_class, request)
+        request.state.cookie = state
+
+        async def send_with_state(message: Message) -> None:
+            if message["type"] == "http.response.start" and state.changed:
+                value = state.get().as_cookie()
+                secure = self.is_cookie_secure(request)
+                headers = MutableHeaders(scope=message)
+                headers.append("set-cookie", self._build_cookie(value, secure))
+            await send(message)
+
+        await self.app(scope, receive, send_with_state)
+
+    def _build_cookie(self, value: str, secure: bool) -> str:
+        """Construct the ``Set-Cookie`` header value for the state cookie.
+
+        This matches what `starlette.responses.Response.set_cookie` generates
+        with the default path and ``SameSite`` settings.
+
+        Parameters
+        ----------
+        value : `str`
+            The encrypted cookie value.
+        secure : `bool`
+            Whether to mark the cookie as secure.
+
+        Returns
+        -------
+        header : `str`
+            The value of the ``Set-Cookie`` header.
+        """
+        cookie: http.cookies.BaseCookie = http.cookies.SimpleCookie()
+        cookie[self.cookie_name] = value
+        cookie[self.cookie_name]["path"] = "/"
+        if secure:
+            cookie[self.cookie_name]["secure"] = True
+        cookie[self.cookie_name]["httponly"] = True
+        cookie[self.cookie_name]["samesite"] = "lax"
+        return cookie.output(header="").strip()
 
     @staticmethod
     def is_cookie_secure(request: Request) -> bool:
@@ -2,71 +2,106 @@
 
 from __future__ import annotations
 
+from bisect import bisect_right
 from ipaddress import ip_address
 from typing import TYPE_CHECKING
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Request
 
 if TYPE_CHECKING:
     from ipaddress import _BaseAddress, _BaseNetwork
-    from typing import Awaitable, Callable, List, Optional
+    from typing import Dict, Iterable, List, Optional, Tuple
 
-    from fastapi import FastAPI
+    from starlette.types import ASGIApp, Receive, Scope, Send
 
 __all__ = ["XForwardedMiddleware"]
 
 
-class XForwardedMiddleware(BaseHTTPMiddleware):
+class _NetworkSet:
+    """A set of IP networks compiled for fast membership tests.
+
+    The networks are converted to sorted, non-overlapping ranges of integers
+    per address family, so checking whether an address is in any of the
+    networks is a binary search.
+
+    Parameters
+    ----------
+    networks : Iterable[`ipaddress._BaseNetwork`]
+        The networks in the set.
+    """
+
+    def __init__(self, networks: Iterable[_BaseNetwork]) -> None:
+        ranges: Dict[int, List[Tuple[int, int]]] = {4: [], 6: []}
+        for network in networks:
+            start = int(network.network_address)
+            end = int(network.broadcast_address)
+            ranges[network.version].append((start, end))
+
+        self._starts: Dict[int, List[int]] = {}
+        self._ends: Dict[int, List[int]] = {}
+        for version, spans in ranges.items():
+            merged: List[Tuple[int, int]] = []
+            for start, end in sorted(spans):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                else:
+                    merged.append((start, end))
+            self._starts[version] = [s for s, _ in merged]
+            self._ends[version] = [e for _, e in merged]
+
+    def __contains__(self, address: _BaseAddress) -> bool:
+        value = int(address)
+        index = bisect_right(self._starts[address.version], value) - 1
+        return index >= 0 and value <= self._ends[address.version][index]
+
+
+class XForwardedMiddleware:
     """Middleware to update the request based on ``X-Forwarded-For``.
 
+    The remote IP address will be replaced with the right-most IP address in
+    ``X-Forwarded-For`` that is not contained within one of the trusted
+    networks.  The last entry of ``X-Forwarded-Proto`` and the contents of
+    ``X-Forwarded-Host`` will be stored as ``forwarded_proto`` and
+    ``forwarded_host`` in the request state if they are present and
+    ``X-Forwarded-For`` is also present.
+
     Parameters
     ----------
+    app : `starlette.types.ASGIApp`
+        The ASGI application.
     proxies : List[`ipaddress._BaseNetwork`]
         The networks of the trusted proxies.
     """
 
-    def __init__(self, app: FastAPI, *, proxies: List[_BaseNetwork]) -> None:
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, *, proxies: List[_BaseNetwork]) -> None:
+        self.app = app
         self.proxies = proxies
+        self._trusted = _NetworkSet(proxies)
 
-    async def dispatch(
-        self,
-        request: Request,
-        call_next: Callable[[Request], Awaitable[Response]],
-    ) -> Response:
-        """Middleware to update the request based on ``X-Forwarded-For``.
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] == "http":
+            self._update_scope(Request(scope))
+        await self.app(scope, receive, send)
+
+    def _update_scope(self, request: Request) -> None:
+        """Update the request based on the proxy headers.
 
         Parameters
         ----------
         request : `fastapi.Request`
-            The incoming request.
-        call_next : `typing.Callable`
-            The next step in the processing stack.
-
-        Returns
-        -------
-        response : `fastapi.Response`
-            The response with additional information about proxy headers.
-
-        Notes
-        -----
-        The remote IP address will be replaced with the right-most IP address
-        in ``X-Forwarded-For`` that is not contained within one of the trusted
-        networks.  The last entry of ``X-Forwarded-Proto`` and the contents of
-        ``X-Forwarded-Host`` will be stored as ``forwarded_proto`` and
-        ``forwarded_host`` in the request state if they are present and
-        ``X-Forwarded-For`` is also present.
+            The incoming request, whose scope and state will be updated.
         """
         forwarded_for = list(reversed(self._get_forwarded_for(request)))
         if not forwarded_for:
             request.state.forwarded_host = None
             request.state.forwarded_proto = None
-            return await call_next(request)
+            return
 
         client = None
         for n, ip in enumerate(forwarded_for):
-            if any((ip in network for network in self.proxies)):
+            if ip in self._trusted:
                 continue
             client = str(ip)
             index = n
@@ -78,9 +113,9 @@ class XForwardedMiddleware(BaseHTTPMiddleware):
             client = str(forwarded_for[-1])
             index = -1
 
-        # Update the request's understanding of the client IP.  This uses an
-        # undocumented interface; hopefully it will keep working.
-        request.scope["client"] = (client, request.client.port)
+        # Update the request's understanding of the client IP.
+        port = request.client.port if request.client else 0
+        request.scope["client"] = (client, port)
 
         # Ideally this should take the scheme corresponding to the entry in
         # X-Forwarded-For that was chosen, but some proxies (the Kubernetes
@@ -98,8 +133,6 @@ class XForwardedMiddleware(BaseHTTPMiddleware):
         # X-Forwarded-Host header with the original hostname.
         request.state.forwarded_host = self._get_forwarded_host(request)
 
-        return await call_next(request)
-
     def _get_forwarded_for(self, request: Request) -> List[_BaseAddress]:
         """Retrieve the ``X-Forwarded-For`` entries from the request.
 
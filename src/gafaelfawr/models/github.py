@@ -0,0 +1,26 @@
+"""Representation of cached GitHub API responses."""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, Field
+
+__all__ = ["GitHubCachedResponse"]
+
+
+class GitHubCachedResponse(BaseModel):
+    """A response from the GitHub API cached for conditional requests.
+
+    GitHub does not count a request that returns 304 Not Modified against the
+    rate limit, so responses are cached with their entity tag and revalidated
+    with ``If-None-Match`` on later logins.
+    """
+
+    etag: str = Field(..., title="The ETag header of the response")
+
+    data: List[Dict[str, Any]] = Field(..., title="The decoded response body")
+
+    last_page: int = Field(
+        1, title="The last page of results, from the Link header"
+    )
@@ -2,10 +2,18 @@
 
 from datetime import datetime
 from enum import Enum
+from typing import Optional
 
 from pydantic import BaseModel
 
-__all__ = ["AdminChange", "TokenChange"]
+from gafaelfawr.models.token import TokenType
+
+__all__ = [
+    "AdminChange",
+    "TokenAuthHistoryEntry",
+    "TokenChange",
+    "TokenChangeHistoryEntry",
+]
 
 
 class AdminChange(Enum):
@@ -44,3 +52,89 @@ class TokenChange(Enum):
     revoke = "revoke"
     expire = "expire"
     edit = "edit"
+
+
+class TokenChangeHistoryEntry(BaseModel):
+    """A record of a change to a token."""
+
+    token: str
+    """The key of the token that was changed."""
+
+    username: str
+    """The user who owns the token."""
+
+    token_type: TokenType
+    """The type of the token."""
+
+    token_name: Optional[str] = None
+    """The name of the token, for user tokens."""
+
+    parent: Optional[str] = None
+    """The key of the parent of the token, if any."""
+
+    scopes: Optional[str] = None
+    """The scopes of the token after the change, comma-separated and sorted."""
+
+    service: Optional[str] = None
+    """The service to which the token was delegated, for internal tokens."""
+
+    expires: Optional[datetime] = None
+    """The expiration of the token after the change."""
+
+    actor: Optional[str] = None
+    """The username of the person making the change."""
+
+    action: TokenChange
+    """The change that was made."""
+
+    old_token_name: Optional[str] = None
+    """The previous name of the token, if it was changed."""
+
+    old_scopes: Optional[str] = None
+    """The previous scopes of the token, if they were changed."""
+
+    old_expires: Optional[datetime] = None
+    """The previous expiration of the token, if it was changed."""
+
+    ip_address: Optional[str] = None
+    """The IP address from which the change was made."""
+
+    event_time: datetime
+    """When the change was made."""
+
+    class Config:
+        orm_mode = True
+
+
+class TokenAuthHistoryEntry(BaseModel):
+    """A record of an authentication with a token."""
+
+    token: str
+    """The key of the token used for authentication."""
+
+    username: str
+    """The user who owns the token."""
+
+    token_type: TokenType
+    """The type of the token."""
+
+    token_name: Optional[str] = None
+    """The name of the token, for user tokens."""
+
+    parent: Optional[str] = None
+    """The key of the parent of the token, if known."""
+
+    scopes: Optional[str] = None
+    """The scopes of the token, comma-separated and sorted."""
+
+    service: Optional[str] = None
+    """The service for which the token was issued, if known."""
+
+    ip_address: Optional[str] = None
+    """The IP address from which the token was used."""
+
+    event_time: datetime
+    """When the token was used."""
+
+    class Config:
+        orm_mode = True
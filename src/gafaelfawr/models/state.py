@@ -8,11 +8,13 @@ holds the data that Gafaelfawr stores in a session cookie.
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, replace
 from typing import TYPE_CHECKING
 
 from cryptography.fernet import Fernet
 
+from gafaelfawr.constants import STATE_CACHE_SIZE
 from gafaelfawr.dependencies.config import config_dependency
 from gafaelfawr.dependencies.logger import get_logger
 from gafaelfawr.middleware.state import BaseState
@@ -26,6 +28,57 @@ if TYPE_CHECKING:
 __all__ = ["State"]
 
 
+class _StateCodec:
+    """Encryption and decoded-cookie cache for a session secret.
+
+    Browsers send the same state cookie with every request, so decoded
+    cookies are kept in a small LRU cache keyed by the encrypted cookie
+    value.  Decryption does not enforce a TTL, so a given encrypted value
+    always decodes to the same state and cache entries never go stale.
+
+    Parameters
+    ----------
+    secret : `str`
+        The `~cryptography.fernet.Fernet` key used to encrypt cookies.
+    """
+
+    def __init__(self, secret: str) -> None:
+        self.secret = secret
+        self.fernet = Fernet(secret.encode())
+        self.cache: OrderedDict[str, State] = OrderedDict()
+
+    def get(self, cookie: str) -> Optional[State]:
+        """Return a copy of the cached state for a cookie, if any."""
+        state = self.cache.get(cookie)
+        if state is None:
+            return None
+        self.cache.move_to_end(cookie)
+        return replace(state)
+
+    def store(self, cookie: str, state: State) -> None:
+        """Cache the decoded state for a cookie."""
+        self.cache[cookie] = replace(state)
+        if len(self.cache) > STATE_CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+
+_codec: Optional[_StateCodec] = None
+"""Codec for the current session secret, created on first use."""
+
+
+def _get_codec() -> _StateCodec:
+    """Return the codec for the configured session secret.
+
+    The codec is replaced if the session secret changes, which normally only
+    happens in the test suite.
+    """
+    global _codec
+    secret = config_dependency().session_secret
+    if not _codec or _codec.secret != secret:
+        _codec = _StateCodec(secret)
+    return _codec
+
+
 @dataclass
 class State(BaseState):
     """State information stored in a cookie."""
@@ -50,8 +103,6 @@ class State(BaseState):
         ----------
         cookie : `str`
             The encrypted cookie value.
-        key : `bytes`
-            The `~cryptography.fernet.Fernet` key used to decrypt it.
         request : `fastapi.Request` or `None`
             The request, used for logging.  If not provided (primarily for the
             test suite), invalid state cookies will not be logged.
@@ -61,10 +112,12 @@ class State(BaseState):
         state : `State`
             The state represented by the cookie.
         """
-        key = config_dependency().session_secret.encode()
-        fernet = Fernet(key)
+        codec = _get_codec()
+        state = codec.get(cookie)
+        if state is not None:
+            return state
         try:
-            data = json.loads(fernet.decrypt(cookie.encode()).decode())
+            data = json.loads(codec.fernet.decrypt(cookie.encode()).decode())
             token = None
             if "token" in data:
                 token = Token.from_str(data["token"])
@@ -74,12 +127,14 @@ class State(BaseState):
                 logger.warning("Discarding invalid state cookie", error=str(e))
             return cls()
 
-        return cls(
+        state = cls(
             csrf=data.get("csrf"),
             token=token,
             return_url=data.get("return_url"),
             state=data.get("state"),
         )
+        codec.store(cookie, state)
+        return state
 
     def as_cookie(self) -> str:
         """Build an encrypted cookie representation of the state.
@@ -99,6 +154,5 @@ class State(BaseState):
         if self.state:
             data["state"] = self.state
 
-        key = config_dependency().session_secret.encode()
-        fernet = Fernet(key)
+        fernet = _get_codec().fernet
         return fernet.encrypt(json.dumps(data).encode()).decode()
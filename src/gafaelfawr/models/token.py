@@ -2,14 +2,14 @@
 
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from enum import Enum
 from typing import Any, Dict, List, Optional, Union
 
 from pydantic import BaseModel, Field, validator
 
 from gafaelfawr.constants import USERNAME_REGEX
-from gafaelfawr.exceptions import InvalidTokenError
+from gafaelfawr.exceptions import InvalidCursorError, InvalidTokenError
 from gafaelfawr.util import normalize_datetime, random_128_bits
 
 __all__ = [
@@ -17,6 +17,7 @@ __all__ = [
     "NewToken",
     "Token",
     "TokenBase",
+    "TokenCursor",
     "TokenData",
     "TokenGroup",
     "TokenInfo",
@@ -26,6 +27,9 @@ __all__ = [
     "UserTokenModifyRequest",
 ]
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+"""Start of the epoch, used to serialize `TokenCursor`."""
+
 
 class Token(BaseModel):
     """An opaque token.
@@ -212,6 +216,62 @@ class TokenInfo(TokenBase):
             return v
 
 
+class TokenCursor(BaseModel):
+    """A position in a list of tokens.
+
+    Token lists are ordered by creation time and then by key, and a cursor
+    is the creation time and key of the last token returned.  The next page
+    starts with the first token after that position.
+
+    Notes
+    -----
+    The serialized form is the creation time in microseconds since epoch and
+    the token key separated by an underscore.  The creation time is encoded
+    as an integer so that it round-trips exactly.
+    """
+
+    created: datetime
+    token: str
+
+    @classmethod
+    def from_info(cls, info: TokenInfo) -> TokenCursor:
+        """Create a cursor pointing at the given token."""
+        return cls(created=info.created, token=info.token)
+
+    @classmethod
+    def from_str(cls, cursor: str) -> TokenCursor:
+        """Parse a serialized cursor.
+
+        Parameters
+        ----------
+        cursor : `str`
+            The serialized cursor.
+
+        Returns
+        -------
+        decoded_cursor : `TokenCursor`
+            The decoded cursor.
+
+        Raises
+        ------
+        gafaelfawr.exceptions.InvalidCursorError
+            The provided string is not a valid cursor.
+        """
+        micros, _, token = cursor.partition("_")
+        if not micros.isdigit() or len(token) != 22:
+            raise InvalidCursorError(f"Invalid cursor: {cursor}")
+        created = _EPOCH + timedelta(microseconds=int(micros))
+        return cls(created=created, token=token)
+
+    def __str__(self) -> str:
+        """Return the serialized cursor."""
+        created = self.created
+        if not created.tzinfo:
+            created = created.replace(tzinfo=timezone.utc)
+        micros = (created - _EPOCH) // timedelta(microseconds=1)
+        return f"{micros}_{self.token}"
+
+
 class TokenUserInfo(BaseModel):
     """The information about a user stored with their token.
 
@@ -2,23 +2,30 @@
 
 from __future__ import annotations
 
+import asyncio
 import base64
 import hashlib
 from dataclasses import dataclass
 from typing import TYPE_CHECKING
-from urllib.parse import urlencode
+from urllib.parse import parse_qs, urlencode, urlparse
 
+from gafaelfawr.constants import (
+    GITHUB_TEAMS_PER_PAGE,
+    GITHUB_USER_INFO_TIMEOUT,
+)
 from gafaelfawr.exceptions import GitHubException
+from gafaelfawr.models.github import GitHubCachedResponse
 from gafaelfawr.models.token import TokenGroup, TokenUserInfo
 from gafaelfawr.providers.base import Provider
 
 if TYPE_CHECKING:
-    from typing import List
+    from typing import Any, Dict, List, Optional, Tuple
 
-    from httpx import AsyncClient
+    from httpx import AsyncClient, Response
     from structlog.stdlib import BoundLogger
 
     from gafaelfawr.config import GitHubConfig
+    from gafaelfawr.storage.github import GitHubResponseCache
 
 __all__ = ["GitHubProvider"]
 
@@ -91,6 +98,10 @@ class GitHubProvider(Provider):
         Session to use to make HTTP requests.
     logger : `structlog.BoundLogger`
         Logger for any log messages.
+    cache : `gafaelfawr.storage.github.GitHubResponseCache`, optional
+        Cache of GitHub API responses.  If given, teams and email addresses
+        are retrieved with conditional requests, which are not counted
+        against the GitHub rate limit if the data has not changed.
     """
 
     _LOGIN_URL = "https://github.com/login/oauth/authorize"
@@ -117,10 +128,12 @@ class GitHubProvider(Provider):
         config: GitHubConfig,
         http_client: AsyncClient,
         logger: BoundLogger,
+        cache: Optional[GitHubResponseCache] = None,
     ) -> None:
         self._config = config
         self._http_client = http_client
         self._logger = logger
+        self._cache = cache
 
     def get_redirect_url(self, state: str) -> str:
         """Get the login URL to which to redirect the user.
@@ -169,6 +182,13 @@ class GitHubProvider(Provider):
         self._logger.info("Getting user information from GitHub")
         github_token = await self._get_access_token(code, state)
         user_info = await self._get_user_info(github_token)
+        if self._cache:
+            stats = self._cache.stats
+            self._logger.info(
+                "GitHub API cache statistics",
+                cache_hit_ratio=round(stats.hit_ratio, 3),
+                rate_limit_remaining=stats.rate_limit_remaining,
+            )
 
         groups = [
             TokenGroup(name=t.group_name, id=t.gid) for t in user_info.teams
@@ -222,9 +242,191 @@ class GitHubProvider(Provider):
             raise GitHubException(msg)
         return result["access_token"]
 
+    async def _get(
+        self,
+        url: str,
+        token: str,
+        params: Optional[Dict[str, Any]] = None,
+        etag: Optional[str] = None,
+    ) -> Response:
+        """Make an authenticated GET request to the GitHub API.
+
+        Parameters
+        ----------
+        url : `str`
+            The URL to retrieve.
+        token : `str`
+            The token for the user.
+        params : Dict[`str`, Any], optional
+            Query parameters for the request.
+        etag : `str`, optional
+            Entity tag of a cached response, sent in ``If-None-Match``.
+
+        Returns
+        -------
+        response : `httpx.Response`
+            The successful response, which may be a 304 if ``etag`` was
+            given.
+
+        Raises
+        ------
+        httpx.HTTPError
+            An error occurred trying to talk to GitHub.
+        """
+        headers = {"Authorization": f"token {token}"}
+        if etag:
+            headers["If-None-Match"] = etag
+        self._logger.debug("Fetching user data from %s", url)
+        r = await self._http_client.get(url, params=params, headers=headers)
+        remaining = r.headers.get("X-RateLimit-Remaining")
+        if self._cache and remaining is not None:
+            self._cache.record_rate_limit(int(remaining))
+        if r.status_code != 304:
+            r.raise_for_status()
+        return r
+
+    async def _get_cached(
+        self,
+        uid: int,
+        name: str,
+        url: str,
+        token: str,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> GitHubCachedResponse:
+        """Retrieve a list from the GitHub API, using the response cache.
+
+        If there is a cached response, the request is made conditional on its
+        entity tag, and the cached response is used if GitHub returns 304.
+
+        Parameters
+        ----------
+        uid : `int`
+            The GitHub ID of the user.
+        name : `str`
+            The name under which to cache the response.
+        url : `str`
+            The URL to retrieve.
+        token : `str`
+            The token for the user.
+        params : Dict[`str`, Any], optional
+            Query parameters for the request.
+
+        Returns
+        -------
+        response : `gafaelfawr.models.github.GitHubCachedResponse`
+            The response data, its entity tag, and the last page of results.
+
+        Raises
+        ------
+        httpx.HTTPError
+            An error occurred trying to talk to GitHub.
+        """
+        cached = None
+        if self._cache:
+            cached = await self._cache.get(uid, name)
+        etag = cached.etag if cached else None
+        r = await self._get(url, token, params, etag)
+        if cached and r.status_code == 304:
+            assert self._cache
+            self._cache.record_hit()
+            return cached
+
+        last_page = 1
+        last_url = r.links.get("last", {}).get("url")
+        if last_url:
+            query = parse_qs(urlparse(last_url).query)
+            last_page = int(query.get("page", ["1"])[0])
+        response = GitHubCachedResponse(
+            etag=r.headers.get("ETag", ""), data=r.json(), last_page=last_page
+        )
+        if self._cache:
+            self._cache.record_miss()
+            if response.etag:
+                await self._cache.store(uid, name, response)
+        return response
+
+    async def _get_teams(self, uid: int, token: str) -> List[Dict[str, Any]]:
+        """Retrieve all of the teams of a user.
+
+        The first page of teams is retrieved on its own.  If it shows that
+        there are more pages, all the remaining pages are then retrieved
+        concurrently.
+
+        Parameters
+        ----------
+        uid : `int`
+            The GitHub ID of the user.
+        token : `str`
+            The token for that user.
+
+        Returns
+        -------
+        teams : List[Dict[`str`, Any]]
+            The team data from all pages, in order.
+
+        Raises
+        ------
+        httpx.HTTPError
+            An error occurred trying to talk to GitHub.
+        """
+        params = {"per_page": GITHUB_TEAMS_PER_PAGE}
+        url = self._TEAMS_URL
+        first = await self._get_cached(uid, "teams:1", url, token, params)
+        teams = list(first.data)
+        requests = [
+            self._get_cached(
+                uid, f"teams:{page}", url, token, {**params, "page": page}
+            )
+            for page in range(2, first.last_page + 1)
+        ]
+        for response in await asyncio.gather(*requests):
+            teams.extend(response.data)
+        return teams
+
+    async def _get_user_data(
+        self, token: str
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Retrieve the user metadata, teams, and email addresses.
+
+        The user metadata is retrieved first, since the cache of teams and
+        email addresses is keyed by the GitHub ID of the user, which stays
+        the same across logins while the access token does not.  As soon as
+        it is available, the email addresses and all pages of teams are
+        retrieved concurrently.
+
+        Parameters
+        ----------
+        token : `str`
+            The token for that user.
+
+        Returns
+        -------
+        user_data : Dict[`str`, Any]
+            The user metadata.
+        teams_data : List[Dict[`str`, Any]]
+            The teams of the user.
+        emails_data : List[Dict[`str`, Any]]
+            The email addresses of the user.
+
+        Raises
+        ------
+        httpx.HTTPError
+            An error occurred trying to talk to GitHub.
+        """
+        r = await self._get(self._USER_URL, token)
+        user_data = r.json()
+        uid = user_data["id"]
+        teams_data, emails = await asyncio.gather(
+            self._get_teams(uid, token),
+            self._get_cached(uid, "emails", self._EMAILS_URL, token),
+        )
+        return user_data, teams_data, emails.data
+
     async def _get_user_info(self, token: str) -> GitHubUserInfo:
         """Retrieve metadata about a user from GitHub.
 
+        All of the requests are subject to a single overall deadline.
+
         Parameters
         ----------
         token : `str`
@@ -238,31 +440,18 @@ class GitHubProvider(Provider):
         Raises
         ------
         gafaelfawr.exceptions.GitHubException
-            User has no primary email address.
+            User has no primary email address, or GitHub did not answer
+            before the deadline.
         httpx.HTTPError
             An error occurred trying to talk to GitHub.
         """
-        self._logger.debug("Fetching user data from %s", self._USER_URL)
-        r = await self._http_client.get(
-            self._USER_URL,
-            headers={"Authorization": f"token {token}"},
-        )
-        r.raise_for_status()
-        user_data = r.json()
-        self._logger.debug("Fetching user data from %s", self._TEAMS_URL)
-        r = await self._http_client.get(
-            self._TEAMS_URL,
-            headers={"Authorization": f"token {token}"},
-        )
-        r.raise_for_status()
-        teams_data = r.json()
-        self._logger.debug("Fetching user data from %s", self._EMAILS_URL)
-        r = await self._http_client.get(
-            self._EMAILS_URL,
-            headers={"Authorization": f"token {token}"},
-        )
-        r.raise_for_status()
-        emails_data = r.json()
+        try:
+            user_data, teams_data, emails_data = await asyncio.wait_for(
+                self._get_user_data(token), GITHUB_USER_INFO_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            msg = "Timed out retrieving user information from GitHub"
+            raise GitHubException(msg)
 
         teams = []
         for team in teams_data:
@@ -6,11 +6,11 @@ group system and a group-based authorization system up and running.
 
 from __future__ import annotations
 
-from sqlalchemy import Column, DateTime, Enum, Index, Integer, String
+from sqlalchemy import Column, Enum, Index, Integer, String
 from sqlalchemy.dialects import postgresql
 
 from gafaelfawr.models.history import AdminChange
-from gafaelfawr.schema.base import Base
+from gafaelfawr.schema.base import Base, UTCDateTime
 
 __all__ = ["AdminHistory"]
 
@@ -25,6 +25,6 @@ class AdminHistory(Base):
     ip_address = Column(
         String(64).with_variant(postgresql.INET, "postgresql"), nullable=False
     )
-    event_time = Column(DateTime, nullable=False)
+    event_time = Column(UTCDateTime, nullable=False)
 
     __table_args__ = (Index("admin_history_by_time", "event_time", "id"),)
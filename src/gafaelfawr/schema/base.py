@@ -2,8 +2,40 @@
 
 from __future__ import annotations
 
+from datetime import timezone
+from typing import TYPE_CHECKING
+
+from sqlalchemy import DateTime
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.types import TypeDecorator
+
+if TYPE_CHECKING:
+    from datetime import datetime
+    from typing import Optional
 
-__all__ = ["Base"]
+    from sqlalchemy.engine import Dialect
+
+__all__ = ["Base", "UTCDateTime"]
 
 Base = declarative_base()
+
+
+class UTCDateTime(TypeDecorator):
+    """A date and time stored in UTC without a time zone.
+
+    Gafaelfawr uses timezone-aware datetimes throughout, but the database
+    columns are timezone-naive and hold UTC.  psycopg2 accepted aware values
+    for those columns, but asyncpg rejects them, so aware values are converted
+    to naive UTC before they are sent to the database.  Values read from the
+    database are naive and are converted to aware datetimes by the models.
+    """
+
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(
+        self, value: Optional[datetime], dialect: Dialect
+    ) -> Optional[datetime]:
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
@@ -2,10 +2,10 @@
 
 from __future__ import annotations
 
-from sqlalchemy import Column, DateTime, Enum, Index, String, UniqueConstraint
+from sqlalchemy import Column, Enum, Index, String, UniqueConstraint
 
 from gafaelfawr.models.token import TokenType
-from gafaelfawr.schema.base import Base
+from gafaelfawr.schema.base import Base, UTCDateTime
 
 __all__ = ["Token"]
 
@@ -19,11 +19,14 @@ class Token(Base):
     token_name = Column(String(64))
     scopes = Column(String(256))
     service = Column(String(64))
-    created = Column(DateTime, nullable=False)
-    last_used = Column(DateTime)
-    expires = Column(DateTime)
+    created = Column(UTCDateTime, nullable=False)
+    last_used = Column(UTCDateTime)
+    expires = Column(UTCDateTime)
 
     __table_args__ = (
         UniqueConstraint("username", "token_name"),
         Index("token_by_username", "username", "token_type", "service"),
+        Index("token_by_username_created", "username", "created", "token"),
+        Index("token_by_created", "created", "token"),
+        Index("token_by_expires", "expires"),
     )
@@ -2,11 +2,11 @@
 
 from __future__ import annotations
 
-from sqlalchemy import Column, DateTime, Enum, Index, Integer, String
+from sqlalchemy import Column, Enum, Index, Integer, String
 from sqlalchemy.dialects import postgresql
 
 from gafaelfawr.models.token import TokenType
-from gafaelfawr.schema.base import Base
+from gafaelfawr.schema.base import Base, UTCDateTime
 
 __all__ = ["TokenAuthHistory"]
 
@@ -23,7 +23,7 @@ class TokenAuthHistory(Base):
     scopes = Column(String(256))
     service = Column(String(64))
     ip_address = Column(String(64).with_variant(postgresql.INET, "postgresql"))
-    event_time = Column(DateTime, nullable=False)
+    event_time = Column(UTCDateTime, nullable=False)
 
     __table_args__ = (
         Index("token_auth_history_by_time", "event_time", "id"),
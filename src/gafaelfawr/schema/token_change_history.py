@@ -2,12 +2,12 @@
 
 from __future__ import annotations
 
-from sqlalchemy import Column, DateTime, Enum, Index, Integer, String
+from sqlalchemy import Column, Enum, Index, Integer, String
 from sqlalchemy.dialects import postgresql
 
 from gafaelfawr.models.history import TokenChange
 from gafaelfawr.models.token import TokenType
-from gafaelfawr.schema.base import Base
+from gafaelfawr.schema.base import Base, UTCDateTime
 
 __all__ = ["TokenChangeHistory"]
 
@@ -23,14 +23,14 @@ class TokenChangeHistory(Base):
     parent = Column(String(64))
     scopes = Column(String(256))
     service = Column(String(64))
-    expires = Column(DateTime)
+    expires = Column(UTCDateTime)
     actor = Column(String(64))
     action = Column(Enum(TokenChange), nullable=False)
     old_token_name = Column(String(64))
     old_scopes = Column(String(256))
-    old_expires = Column(DateTime)
+    old_expires = Column(UTCDateTime)
     ip_address = Column(String(64).with_variant(postgresql.INET, "postgresql"))
-    event_time = Column(DateTime, nullable=False)
+    event_time = Column(UTCDateTime, nullable=False)
 
     __table_args__ = (
         Index("token_change_history_by_time", "event_time", "id"),
@@ -0,0 +1,180 @@
+"""Compiled representations of scopes."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, FrozenSet, Mapping
+
+from gafaelfawr.constants import GROUP_MAPPING_CACHE_SIZE, SCOPE_CACHE_SIZE
+
+if TYPE_CHECKING:
+    from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+__all__ = ["GroupMapping", "ScopeIndex", "ScopeSet"]
+
+
+class GroupMapping(Mapping[str, FrozenSet[str]]):
+    """Mapping of group names to the scopes they grant, compiled for lookup.
+
+    This is a read-only mapping of group names to the set of scopes each
+    group grants.  Each group is also compiled to a bitmask of the scopes it
+    grants, so the scopes for a set of groups are the union of their
+    bitmasks.  Users often belong to many groups but share a small number of
+    distinct sets of groups, so the results are also kept in a bounded LRU
+    cache keyed by the set of group names.
+
+    Parameters
+    ----------
+    mapping : Mapping[`str`, FrozenSet[`str`]]
+        Mapping of group names to the scopes they grant.
+    cache_size : `int`, optional
+        Maximum number of sets of groups whose scopes to remember.
+    """
+
+    def __init__(
+        self,
+        mapping: Mapping[str, FrozenSet[str]],
+        cache_size: int = GROUP_MAPPING_CACHE_SIZE,
+    ) -> None:
+        self._mapping = dict(mapping)
+        self._cache_size = cache_size
+        self._cache: OrderedDict[FrozenSet[str], Tuple[str, ...]]
+        self._cache = OrderedDict()
+
+        # Scopes are numbered in sorted order, so converting a bitmask back
+        # to scopes in bit order produces a sorted list.
+        all_scopes: Set[str] = set()
+        for scopes in mapping.values():
+            all_scopes.update(scopes)
+        self._scopes = sorted(all_scopes)
+        index = {s: i for i, s in enumerate(self._scopes)}
+        self._masks: Dict[str, int] = {
+            group: sum(1 << index[s] for s in scopes)
+            for group, scopes in mapping.items()
+        }
+
+    def __getitem__(self, group: str) -> FrozenSet[str]:
+        return self._mapping[group]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._mapping)
+
+    def __len__(self) -> int:
+        return len(self._mapping)
+
+    def get_scopes(self, groups: Iterable[str]) -> List[str]:
+        """Determine the scopes granted by membership in a set of groups.
+
+        Parameters
+        ----------
+        groups : Iterable[`str`]
+            The names of the groups.
+
+        Returns
+        -------
+        scopes : List[`str`]
+            The sorted scopes granted by any of those groups.
+        """
+        key = frozenset(groups)
+        scopes = self._cache.get(key)
+        if scopes is not None:
+            self._cache.move_to_end(key)
+            return list(scopes)
+
+        mask = 0
+        for group in key:
+            mask |= self._masks.get(group, 0)
+        scopes = tuple(
+            s for i, s in enumerate(self._scopes) if mask & (1 << i)
+        )
+        self._cache[key] = scopes
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return list(scopes)
+
+
+@dataclass(frozen=True)
+class ScopeSet:
+    """A set of scopes compiled by a `ScopeIndex`."""
+
+    mask: int
+    """Bitmask of the scopes known to the index."""
+
+    unknown: FrozenSet[str]
+    """Any scopes not known to the index, which have no bit position."""
+
+    header: str
+    """The scopes, sorted and space-separated, for headers."""
+
+    def has_all(self, other: ScopeSet) -> bool:
+        """Whether this set contains all of the scopes of another set."""
+        if self.mask & other.mask != other.mask:
+            return False
+        return other.unknown <= self.unknown
+
+    def has_any(self, other: ScopeSet) -> bool:
+        """Whether this set contains any of the scopes of another set."""
+        return bool(self.mask & other.mask or self.unknown & other.unknown)
+
+
+class ScopeIndex:
+    """Assigns a bit position to each known scope.
+
+    Sets of scopes are compiled to a `ScopeSet`, which holds a bitmask of the
+    known scopes so that checking whether one set of scopes satisfies another
+    is a few integer operations.  Scopes not known to the index are kept
+    separately as strings, so they are still compared correctly.
+
+    Tokens with the same scopes are very common, so compiled sets are kept
+    in a bounded LRU cache keyed by the list of scopes.
+
+    Parameters
+    ----------
+    scopes : Iterable[`str`]
+        The known scopes.
+    cache_size : `int`, optional
+        Maximum number of compiled sets of scopes to remember.
+    """
+
+    def __init__(
+        self, scopes: Iterable[str], cache_size: int = SCOPE_CACHE_SIZE
+    ) -> None:
+        self._bits = {s: 1 << i for i, s in enumerate(sorted(set(scopes)))}
+        self._cache_size = cache_size
+        self._cache: OrderedDict[Tuple[str, ...], ScopeSet] = OrderedDict()
+
+    def compile(self, scopes: Iterable[str]) -> ScopeSet:
+        """Compile a set of scopes.
+
+        Parameters
+        ----------
+        scopes : Iterable[`str`]
+            The scopes.
+
+        Returns
+        -------
+        scope_set : `ScopeSet`
+            The compiled scopes.
+        """
+        key = tuple(scopes)
+        scope_set = self._cache.get(key)
+        if scope_set:
+            self._cache.move_to_end(key)
+            return scope_set
+
+        mask = 0
+        unknown = set()
+        for scope in key:
+            bit = self._bits.get(scope)
+            if bit:
+                mask |= bit
+            else:
+                unknown.add(scope)
+        scope_set = ScopeSet(
+            mask=mask, unknown=frozenset(unknown), header=" ".join(sorted(key))
+        )
+        self._cache[key] = scope_set
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return scope_set
@@ -42,7 +42,9 @@ class AdminService:
         self._admin_history_store = admin_history_store
         self._transaction_manager = transaction_manager
 
-    def add_admin(self, username: str, *, actor: str, ip_address: str) -> None:
+    async def add_admin(
+        self, username: str, *, actor: str, ip_address: str
+    ) -> None:
         """Add a new administrator.
 
         Parameters
@@ -59,7 +61,7 @@ class AdminService:
         gafaelfawr.exceptions.PermissionDeniedError
             If the actor is not an admin.
         """
-        if not self.is_admin(actor) and actor != "<bootstrap>":
+        if not await self.is_admin(actor) and actor != "<bootstrap>":
             raise PermissionDeniedError(f"{actor} is not an admin")
         admin = Admin(username=username)
         history_entry = AdminHistoryEntry(
@@ -69,11 +71,11 @@ class AdminService:
             ip_address=ip_address,
             event_time=datetime.now(timezone.utc),
         )
-        with self._transaction_manager.transaction():
+        async with self._transaction_manager.transaction():
             self._admin_store.add(admin)
             self._admin_history_store.add(history_entry)
 
-    def delete_admin(
+    async def delete_admin(
         self, username: str, *, actor: str, ip_address: str
     ) -> bool:
         """Delete an administrator.
@@ -98,7 +100,7 @@ class AdminService:
         gafaelfawr.exceptions.PermissionDeniedError
             If the actor is not an admin.
         """
-        if not self.is_admin(actor) and actor != "<bootstrap>":
+        if not await self.is_admin(actor) and actor != "<bootstrap>":
             raise PermissionDeniedError(f"{actor} is not an admin")
         admin = Admin(username=username)
         history_entry = AdminHistoryEntry(
@@ -108,18 +110,18 @@ class AdminService:
             ip_address=ip_address,
             event_time=datetime.now(timezone.utc),
         )
-        with self._transaction_manager.transaction():
-            if self.get_admins() == [admin]:
+        async with self._transaction_manager.transaction():
+            if await self.get_admins() == [admin]:
                 raise PermissionDeniedError("Cannot delete the last admin")
-            result = self._admin_store.delete(admin)
+            result = await self._admin_store.delete(admin)
             if result:
                 self._admin_history_store.add(history_entry)
         return result
 
-    def get_admins(self) -> List[Admin]:
+    async def get_admins(self) -> List[Admin]:
         """Get the current administrators."""
-        return self._admin_store.list()
+        return await self._admin_store.list()
 
-    def is_admin(self, username: str) -> bool:
+    async def is_admin(self, username: str) -> bool:
         """Returns whether the given user is a token administrator."""
-        return any((username == a.username for a in self.get_admins()))
+        return any((username == a.username for a in await self.get_admins()))
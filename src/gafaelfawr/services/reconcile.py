@@ -0,0 +1,284 @@
+"""Find and repair inconsistencies between token stores."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import TYPE_CHECKING
+
+from gafaelfawr.constants import RECONCILE_MIN_AGE
+from gafaelfawr.models.history import TokenChange, TokenChangeHistoryEntry
+from gafaelfawr.models.token import TokenCursor, TokenType
+
+if TYPE_CHECKING:
+    from typing import AsyncIterator, Dict, List, Optional
+
+    from structlog.stdlib import BoundLogger
+
+    from gafaelfawr.models.token import TokenData, TokenInfo
+    from gafaelfawr.storage.history import TokenChangeHistoryStore
+    from gafaelfawr.storage.token import TokenDatabaseStore, TokenRedisStore
+    from gafaelfawr.storage.transaction import TransactionManager
+
+__all__ = ["Inconsistency", "InconsistencyType", "ReconcileService"]
+
+
+class InconsistencyType(Enum):
+    """Types of inconsistency between Redis and the database."""
+
+    missing_row = "missing_row"
+    """The token is in Redis but has no database row."""
+
+    orphaned_row = "orphaned_row"
+    """The unexpired token has a database row but is not in Redis."""
+
+    invalid_data = "invalid_data"
+    """The token data in Redis cannot be decrypted or parsed."""
+
+
+@dataclass(frozen=True)
+class Inconsistency:
+    """An inconsistency found for a single token."""
+
+    type: InconsistencyType
+    """The type of inconsistency."""
+
+    key: str
+    """The key of the token."""
+
+    fixed: bool
+    """Whether the inconsistency was repaired."""
+
+
+class ReconcileService:
+    """Find and repair inconsistencies between Redis and the database.
+
+    Tokens are written to both Redis and the database, so a crash between
+    the two writes can leave a token in only one of them.  This service walks
+    both stores a batch at a time, so it runs in constant memory regardless
+    of the number of tokens, and reports each token found in only one store.
+
+    Redis is the source of truth for whether a token is valid.  When asked to
+    repair inconsistencies, tokens missing from the database are therefore
+    added to it with the data stored in Redis, unexpired database rows for
+    tokens not in Redis are deleted and recorded as revoked in the token
+    change history, and Redis data that cannot be read is deleted.  Expired
+    rows are left for `~gafaelfawr.storage.sweeper.TokenSweeper`.
+
+    The parent and service of a missing notebook or internal token are
+    recovered from the entry recording its parent in Redis.  If the row for
+    the parent is also missing, it is added first, even if the parent is in
+    a later batch.  Redis does not store token names, so rows added for user
+    tokens have no name, and rows for child tokens whose parent entry is gone
+    have no parent or service.
+
+    Parameters
+    ----------
+    token_db_store : `gafaelfawr.storage.token.TokenDatabaseStore`
+        The database backing store for tokens.
+    token_redis_store : `gafaelfawr.storage.token.TokenRedisStore`
+        The Redis backing store for tokens.
+    token_change_store : `gafaelfawr.storage.history.TokenChangeHistoryStore`
+        The backing store for history of changes to tokens.
+    transaction_manager : `gafaelfawr.storage.transaction.TransactionManager`
+        Database transaction manager.
+    logger : `structlog.BoundLogger`
+        Logger to use.
+    """
+
+    def __init__(
+        self,
+        *,
+        token_db_store: TokenDatabaseStore,
+        token_redis_store: TokenRedisStore,
+        token_change_store: TokenChangeHistoryStore,
+        transaction_manager: TransactionManager,
+        logger: BoundLogger,
+    ) -> None:
+        self._token_db_store = token_db_store
+        self._token_redis_store = token_redis_store
+        self._token_change_store = token_change_store
+        self._transaction_manager = transaction_manager
+        self._logger = logger
+
+    async def reconcile(
+        self, *, batch_size: int, fix: bool = False
+    ) -> AsyncIterator[Inconsistency]:
+        """Check every token in both stores.
+
+        Tokens created in the last `~gafaelfawr.constants.RECONCILE_MIN_AGE`
+        seconds are skipped, since they may be in the middle of being written
+        to both stores.  Each batch is checked in its own short transaction.
+
+        Parameters
+        ----------
+        batch_size : `int`
+            Number of tokens to check at a time.
+        fix : `bool`, optional
+            Whether to repair the inconsistencies found.
+
+        Yields
+        ------
+        inconsistency : `Inconsistency`
+            Each inconsistency found.
+        """
+        now = datetime.now(tz=timezone.utc)
+        cutoff = now - timedelta(seconds=RECONCILE_MIN_AGE)
+        async for tokens in self._token_redis_store.scan(batch_size):
+            async for problem in self._check_redis(tokens, cutoff, fix):
+                yield problem
+        database_check = self._check_database(now, cutoff, batch_size, fix)
+        async for problem in database_check:
+            yield problem
+
+    async def _add_rows(self, missing: Dict[str, TokenData]) -> List[str]:
+        """Add database rows for tokens found only in Redis.
+
+        Must be called inside a transaction.  The parents of notebook and
+        internal tokens are retrieved from Redis.  Rows for parents that are
+        missing from the database are added before those for their children,
+        including parents that are not in ``missing``.
+
+        Parameters
+        ----------
+        missing : Dict[`str`, `gafaelfawr.models.token.TokenData`]
+            Mapping of keys to data of the tokens to add.
+
+        Returns
+        -------
+        added : List[`str`]
+            The keys of the tokens added, including any parents that were not
+            in ``missing``.
+        """
+        children = [
+            k
+            for k, d in missing.items()
+            if d.token_type in (TokenType.notebook, TokenType.internal)
+        ]
+        parents = await self._token_redis_store.get_parents(children)
+        keys = list({p for p, _ in parents.values()})
+        existing = await self._token_db_store.get_existing_keys(keys)
+
+        # Add any missing parents that are not in this batch first.
+        ancestors = {}
+        for key in keys:
+            if key not in existing and key not in missing:
+                data = await self._token_redis_store.get_data_by_key(key)
+                if data:
+                    ancestors[key] = data
+        added = await self._add_rows(ancestors) if ancestors else []
+        existing.update(added)
+
+        # Add the rows for this batch, parents before their children.  If
+        # there is a cycle, which should be impossible, add the rest anyway.
+        pending = dict(missing)
+        while pending:
+            ready = [
+                k
+                for k in pending
+                if parents.get(k, (None, None))[0] not in pending
+            ]
+            for key in ready or list(pending):
+                data = pending.pop(key)
+                parent, service = parents.get(key, (None, None))
+                if parent not in existing:
+                    parent = None
+                await self._token_db_store.add(
+                    data, service=service, parent=parent
+                )
+                existing.add(key)
+                added.append(key)
+        return added
+
+    async def _check_redis(
+        self,
+        tokens: Dict[str, Optional[TokenData]],
+        cutoff: datetime,
+        fix: bool,
+    ) -> AsyncIterator[Inconsistency]:
+        """Check a batch of tokens from Redis against the database."""
+        keys = [k for k, d in tokens.items() if not d or d.created < cutoff]
+        invalid = [k for k in keys if not tokens[k]]
+        missing = {}
+        async with self._transaction_manager.transaction():
+            existing = await self._token_db_store.get_existing_keys(keys)
+            for key in keys:
+                data = tokens[key]
+                if data and key not in existing:
+                    missing[key] = data
+            added = list(missing)
+            if fix and missing:
+                added = await self._add_rows(missing)
+        if fix and added:
+            self._logger.info("Added missing token rows", count=len(added))
+        if fix and invalid:
+            await self._token_redis_store.delete_keys(invalid)
+            self._logger.info("Deleted invalid token data", count=len(invalid))
+        for key in invalid:
+            yield Inconsistency(InconsistencyType.invalid_data, key, fix)
+        for key in added:
+            yield Inconsistency(InconsistencyType.missing_row, key, fix)
+
+    async def _check_database(
+        self, now: datetime, cutoff: datetime, batch_size: int, fix: bool
+    ) -> AsyncIterator[Inconsistency]:
+        """Check all unexpired tokens in the database against Redis."""
+        cursor = None
+        while True:
+            async with self._transaction_manager.transaction():
+                tokens = await self._token_db_store.list(
+                    limit=batch_size, cursor=cursor
+                )
+            if not tokens:
+                break
+            cursor = TokenCursor.from_info(tokens[-1])
+            keys = [
+                t.token
+                for t in tokens
+                if t.created < cutoff and not (t.expires and t.expires <= now)
+            ]
+            existing = await self._token_redis_store.get_existing_keys(keys)
+            orphaned = [k for k in keys if k not in existing]
+            if fix and orphaned:
+                await self._delete_orphaned(orphaned)
+                count = len(orphaned)
+                self._logger.info("Deleted orphaned token rows", count=count)
+            for key in orphaned:
+                yield Inconsistency(InconsistencyType.orphaned_row, key, fix)
+            if len(tokens) < batch_size:
+                break
+
+    async def _delete_orphaned(self, keys: List[str]) -> None:
+        """Delete database rows and record them as revoked."""
+        now = datetime.now(tz=timezone.utc)
+        async with self._transaction_manager.transaction():
+            history = []
+            for key in keys:
+                info = await self._token_db_store.get_info(key)
+                if info:
+                    history.append(self._build_revoke_entry(info, now))
+            await self._token_db_store.delete_many(keys)
+            await self._token_change_store.add_many(history)
+
+    @staticmethod
+    def _build_revoke_entry(
+        info: TokenInfo, now: datetime
+    ) -> TokenChangeHistoryEntry:
+        """Build the history entry for the deletion of an orphaned row.
+
+        There is no user or IP address responsible for the change, so the
+        actor and IP address are left empty.
+        """
+        return TokenChangeHistoryEntry(
+            token=info.token,
+            username=info.username,
+            token_type=info.token_type,
+            token_name=info.token_name,
+            parent=info.parent,
+            scopes=",".join(sorted(info.scopes)) if info.scopes else None,
+            service=info.service,
+            expires=info.expires,
+            action=TokenChange.revoke,
+            event_time=now,
+        )
@@ -7,27 +7,37 @@ import time
 from datetime import datetime, timedelta, timezone
 from typing import TYPE_CHECKING
 
-from gafaelfawr.constants import MINIMUM_LIFETIME, USERNAME_REGEX
+from gafaelfawr.constants import (
+    MINIMUM_LIFETIME,
+    TOKEN_LIST_BATCH_SIZE,
+    TOKEN_REVOKE_BATCH_SIZE,
+    USERNAME_REGEX,
+)
 from gafaelfawr.exceptions import (
     BadExpiresError,
     BadScopesError,
     PermissionDeniedError,
 )
+from gafaelfawr.models.history import TokenChange, TokenChangeHistoryEntry
 from gafaelfawr.models.token import (
     AdminTokenRequest,
     Token,
+    TokenCursor,
     TokenData,
     TokenType,
     TokenUserInfo,
 )
 
 if TYPE_CHECKING:
-    from typing import List, Optional
+    from typing import AsyncIterator, List, Optional, Tuple
 
     from structlog.stdlib import BoundLogger
 
     from gafaelfawr.config import Config
     from gafaelfawr.models.token import TokenInfo
+    from gafaelfawr.storage.cache import TokenCache
+    from gafaelfawr.storage.change_history import TokenChangeRecorder
+    from gafaelfawr.storage.history import TokenChangeHistoryStore
     from gafaelfawr.storage.token import TokenDatabaseStore, TokenRedisStore
     from gafaelfawr.storage.transaction import TransactionManager
 
@@ -45,10 +55,18 @@ class TokenService:
         The database backing store for tokens.
     token_redis_store : `gafaelfawr.storage.token.TokenRedisStore`
         The Redis backing store for tokens.
+    token_change_store : `gafaelfawr.storage.history.TokenChangeHistoryStore`
+        The database store for the history of token changes.
     transaction_manager : `gafaelfawr.storage.transaction.TransactionManager`
         Database transaction manager.
     logger : `structlog.BoundLogger`
         Logger to use.
+    token_cache : `gafaelfawr.storage.cache.TokenCache`, optional
+        Process-wide cache of verified token data, if caching is enabled.
+    change_history : `gafaelfawr.storage.change_history.TokenChangeRecorder`
+        Background recorder for the creation of internal and notebook tokens.
+        If not given, those changes are recorded in the same transaction as
+        the new token, like all other changes.
     """
 
     def __init__(
@@ -57,17 +75,27 @@ class TokenService:
         config: Config,
         token_db_store: TokenDatabaseStore,
         token_redis_store: TokenRedisStore,
+        token_change_store: TokenChangeHistoryStore,
         transaction_manager: TransactionManager,
         logger: BoundLogger,
+        token_cache: Optional[TokenCache] = None,
+        change_history: Optional[TokenChangeRecorder] = None,
     ) -> None:
         self._config = config
         self._token_db_store = token_db_store
         self._token_redis_store = token_redis_store
+        self._token_change_store = token_change_store
         self._transaction_manager = transaction_manager
         self._logger = logger
+        self._token_cache = token_cache
+        self._change_history = change_history
 
     async def create_session_token(
-        self, user_info: TokenUserInfo, scopes: List[str]
+        self,
+        user_info: TokenUserInfo,
+        scopes: List[str],
+        *,
+        ip_address: Optional[str] = None,
     ) -> Token:
         """Create a new session token.
 
@@ -77,6 +105,8 @@ class TokenService:
             The user information to associate with the token.
         scopes : List[`str`]
             The scopes of the token.
+        ip_address : `str`, optional
+            The IP address from which the request came.
 
         Returns
         -------
@@ -100,9 +130,13 @@ class TokenService:
             expires=expires,
             **user_info.dict(),
         )
+        history_entry = self._build_create_entry(
+            data, actor=data.username, ip_address=ip_address
+        )
         await self._token_redis_store.store_data(data)
-        with self._transaction_manager.transaction():
-            self._token_db_store.add(data)
+        async with self._transaction_manager.transaction():
+            await self._token_db_store.add(data)
+            self._token_change_store.add(history_entry)
         return token
 
     async def create_user_token(
@@ -113,6 +147,7 @@ class TokenService:
         token_name: str,
         scopes: Optional[List[str]] = None,
         expires: Optional[datetime] = None,
+        ip_address: Optional[str] = None,
     ) -> Token:
         """Add a new user token.
 
@@ -133,6 +168,8 @@ class TokenService:
         no_expire : `bool`
             If set, the token should not expire.  This is a separate parameter
             because passing `None` to ``expires`` is ambiguous.
+        ip_address : `str`, optional
+            The IP address from which the request came.
 
         Returns
         -------
@@ -169,8 +206,15 @@ class TokenService:
             uid=auth_data.uid,
             groups=auth_data.groups,
         )
-        with self._transaction_manager.transaction():
-            self._token_db_store.add(data, token_name=token_name)
+        history_entry = self._build_create_entry(
+            data,
+            actor=auth_data.username,
+            ip_address=ip_address,
+            token_name=token_name,
+        )
+        async with self._transaction_manager.transaction():
+            await self._token_db_store.add(data, token_name=token_name)
+            self._token_change_store.add(history_entry)
         await self._token_redis_store.store_data(data)
         self._logger.info(
             "Created new user token",
@@ -181,7 +225,11 @@ class TokenService:
         return token
 
     async def create_token_from_admin_request(
-        self, request: AdminTokenRequest, auth_data: TokenData
+        self,
+        request: AdminTokenRequest,
+        auth_data: TokenData,
+        *,
+        ip_address: Optional[str] = None,
     ) -> Token:
         """Create a new service or user token from an admin request.
 
@@ -191,6 +239,8 @@ class TokenService:
             The incoming request.
         auth_data : `gafaelfawr.models.token.TokenData`
             The data for the authenticated user making the request.
+        ip_address : `str`, optional
+            The IP address from which the request came.
 
         Returns
         -------
@@ -222,15 +272,30 @@ class TokenService:
             groups=request.groups,
         )
 
+        history_entry = self._build_create_entry(
+            data,
+            actor=auth_data.username,
+            ip_address=ip_address,
+            token_name=request.token_name,
+        )
         await self._token_redis_store.store_data(data)
-        with self._transaction_manager.transaction():
-            self._token_db_store.add(data, token_name=request.token_name)
+        async with self._transaction_manager.transaction():
+            await self._token_db_store.add(data, token_name=request.token_name)
+            self._token_change_store.add(history_entry)
         return token
 
     async def delete_token(
-        self, key: str, auth_data: TokenData, username: Optional[str] = None
+        self,
+        key: str,
+        auth_data: TokenData,
+        username: Optional[str] = None,
+        *,
+        ip_address: Optional[str] = None,
     ) -> bool:
-        """Delete a token.
+        """Delete a token and all of its child tokens.
+
+        Notebook and internal tokens created from the token, and any tokens
+        created from those, are revoked along with it.
 
         Parameters
         ----------
@@ -241,29 +306,48 @@ class TokenService:
             the token.
         username : `str`, optional
             If given, constrain deletions to tokens owned by the given user.
+        ip_address : `str`, optional
+            The IP address from which the request came.
 
         Returns
         -------
         success : `bool`
             Whether the token was found and deleted.
         """
-        info = self.get_token_info_unchecked(key, username)
+        info = await self.get_token_info_unchecked(key, username)
         if not info:
             return False
         if info.username != auth_data.username:
             msg = f"Token owned by {info.username}, not {auth_data.username}"
             self._logger.warning("Permission denied", error=msg)
             raise PermissionDeniedError(msg)
-        await self._token_redis_store.delete(key)
-        with self._transaction_manager.transaction():
-            success = self._token_db_store.delete(key)
-        self._logger.info("Deleted token", key=key)
+        children = await self._token_db_store.get_descendants(key)
+        tokens = [info, *children]
+        await self._token_redis_store.delete_many(tokens)
+        if self._token_cache:
+            await self._token_cache.invalidate_many([t.token for t in tokens])
+        now = datetime.now(tz=timezone.utc)
+        history = [
+            self._build_revoke_entry(
+                t, actor=auth_data.username, ip_address=ip_address, now=now
+            )
+            for t in tokens
+        ]
+        async with self._transaction_manager.transaction():
+            success = await self._token_db_store.delete_tree(key)
+            if success:
+                for i in range(0, len(history), TOKEN_REVOKE_BATCH_SIZE):
+                    batch = history[i : i + TOKEN_REVOKE_BATCH_SIZE]
+                    await self._token_change_store.add_many(batch)
+        self._logger.info("Deleted token", key=key, children=len(children))
         return success
 
     async def get_data(self, token: Token) -> Optional[TokenData]:
         """Retrieve the data for a token from Redis.
 
-        Doubles as a way to check the validity of the token.
+        Doubles as a way to check the validity of the token.  If the token
+        cache is enabled, recently-verified tokens are returned from the cache
+        without contacting Redis.
 
         Parameters
         ----------
@@ -276,10 +360,22 @@ class TokenService:
             The data underlying the token, or `None` if the token is not
             valid.
         """
-        return await self._token_redis_store.get_data(token)
+        if self._token_cache:
+            data = self._token_cache.get(token)
+            if data:
+                return data
+        data = await self._token_redis_store.get_data(token)
+        if data and self._token_cache:
+            self._token_cache.store(data)
+        return data
 
     async def get_internal_token(
-        self, token_data: TokenData, service: str, scopes: List[str]
+        self,
+        token_data: TokenData,
+        service: str,
+        scopes: List[str],
+        *,
+        ip_address: Optional[str] = None,
     ) -> Token:
         """Get or create a new internal token.
 
@@ -296,6 +392,8 @@ class TokenService:
             The internal service to which the token is delegated.
         scopes : List[`str`]
             The scopes the new token should have.
+        ip_address : `str`, optional
+            The IP address from which the request came.
 
         Returns
         -------
@@ -311,14 +409,27 @@ class TokenService:
             raise PermissionDeniedError("Token does not have required scopes")
         self._validate_username(token_data.username)
 
-        # See if there's already a matching internal token.
-        key = self._token_db_store.get_internal_token_key(
+        # See if there's already a matching internal token.  Look first in
+        # the Redis index and fall back on the database for tokens created
+        # before the index existed, repairing the index if one is found.
+        key = await self._token_redis_store.get_internal_token_key(
             token_data, service, scopes
         )
         if key:
             data = await self._token_redis_store.get_data_by_key(key)
             if data:
                 return data.token
+        else:
+            key = await self._token_db_store.get_internal_token_key(
+                token_data, service, scopes
+            )
+            if key:
+                data = await self._token_redis_store.get_data_by_key(key)
+                if data:
+                    await self._token_redis_store.store_data(
+                        data, parent=token_data.token.key, service=service
+                    )
+                    return data.token
 
         # There is not, so we need to create a new one.
         token = Token()
@@ -337,11 +448,24 @@ class TokenService:
             uid=token_data.uid,
             groups=token_data.groups,
         )
-        with self._transaction_manager.transaction():
-            self._token_db_store.add(
+        history_entry = self._build_create_entry(
+            data,
+            actor=token_data.username,
+            ip_address=ip_address,
+            parent=token_data.token.key,
+            service=service,
+        )
+        async with self._transaction_manager.transaction():
+            await self._token_db_store.add(
                 data, service=service, parent=token_data.token.key
             )
-        await self._token_redis_store.store_data(data)
+            if not self._change_history:
+                self._token_change_store.add(history_entry)
+        if self._change_history:
+            self._change_history.add(history_entry)
+        await self._token_redis_store.store_data(
+            data, parent=token_data.token.key, service=service
+        )
         self._logger.info(
             "Created new internal token",
             key=token.key,
@@ -350,7 +474,9 @@ class TokenService:
         )
         return token
 
-    async def get_notebook_token(self, token_data: TokenData) -> Token:
+    async def get_notebook_token(
+        self, token_data: TokenData, *, ip_address: Optional[str] = None
+    ) -> Token:
         """Get or create a new notebook token.
 
         The new token will have the same expiration time as the existing token
@@ -362,6 +488,8 @@ class TokenService:
         ----------
         token_data : `gafaelfawr.models.token.TokenData`
             The authentication data on which to base the new token.
+        ip_address : `str`, optional
+            The IP address from which the request came.
 
         Returns
         -------
@@ -375,12 +503,22 @@ class TokenService:
         """
         self._validate_username(token_data.username)
 
-        # See if there's already a matching notebook token.
-        key = self._token_db_store.get_notebook_token_key(token_data)
+        # See if there's already a matching notebook token, using the same
+        # approach as get_internal_token.
+        key = await self._token_redis_store.get_notebook_token_key(token_data)
         if key:
             data = await self._token_redis_store.get_data_by_key(key)
             if data:
                 return data.token
+        else:
+            key = await self._token_db_store.get_notebook_token_key(token_data)
+            if key:
+                data = await self._token_redis_store.get_data_by_key(key)
+                if data:
+                    await self._token_redis_store.store_data(
+                        data, parent=token_data.token.key
+                    )
+                    return data.token
 
         # There is not, so we need to create a new one.
         token = Token()
@@ -399,13 +537,25 @@ class TokenService:
             uid=token_data.uid,
             groups=token_data.groups,
         )
-        with self._transaction_manager.transaction():
-            self._token_db_store.add(data, parent=token_data.token.key)
-        await self._token_redis_store.store_data(data)
+        history_entry = self._build_create_entry(
+            data,
+            actor=token_data.username,
+            ip_address=ip_address,
+            parent=token_data.token.key,
+        )
+        async with self._transaction_manager.transaction():
+            await self._token_db_store.add(data, parent=token_data.token.key)
+            if not self._change_history:
+                self._token_change_store.add(history_entry)
+        if self._change_history:
+            self._change_history.add(history_entry)
+        await self._token_redis_store.store_data(
+            data, parent=token_data.token.key
+        )
         self._logger.info("Created new notebook token", key=token.key)
         return token
 
-    def get_token_info(
+    async def get_token_info(
         self, key: str, auth_data: TokenData, username: Optional[str]
     ) -> Optional[TokenInfo]:
         """Get information about a token.
@@ -421,7 +571,7 @@ class TokenService:
             If set, constrain the result to tokens from that user and return
             `None` if the token exists but is for a different user.
         """
-        info = self.get_token_info_unchecked(key, username)
+        info = await self.get_token_info_unchecked(key, username)
         if not info:
             return None
         if info.username != auth_data.username:
@@ -433,7 +583,7 @@ class TokenService:
         else:
             return info
 
-    def get_token_info_unchecked(
+    async def get_token_info_unchecked(
         self, key: str, username: Optional[str] = None
     ) -> Optional[TokenInfo]:
         """Get information about a token without checking authorization.
@@ -446,7 +596,7 @@ class TokenService:
             If set, constrain the result to tokens from that user and return
             `None` if the token exists but is for a different user.
         """
-        info = self._token_db_store.get_info(key)
+        info = await self._token_db_store.get_info(key)
         if not info:
             return None
         if username and info.username != username:
@@ -465,7 +615,7 @@ class TokenService:
             groups=data.groups,
         )
 
-    def list_tokens(
+    async def list_tokens(
         self, auth_data: TokenData, username: Optional[str] = None
     ) -> List[TokenInfo]:
         """List tokens.
@@ -481,7 +631,8 @@ class TokenService:
         Returns
         -------
         info : List[`gafaelfawr.models.token.TokenInfo`]
-            Information for all matching tokens.
+            Information for all matching tokens, ordered by creation time and
+            then by key.
 
         Raises
         ------
@@ -489,11 +640,96 @@ class TokenService:
             The user whose tokens are being listed does not match the
             authentication information.
         """
-        if username and username != auth_data.username:
-            msg = f"{auth_data.username} cannot list tokens for {username}"
-            self._logger.warning("Permission denied", error=msg)
-            raise PermissionDeniedError(msg)
-        return self._token_db_store.list(username=username)
+        self._check_list_permission(auth_data, username)
+        return await self._token_db_store.list(username=username)
+
+    async def list_tokens_page(
+        self,
+        auth_data: TokenData,
+        username: Optional[str] = None,
+        *,
+        limit: int,
+        cursor: Optional[TokenCursor] = None,
+    ) -> Tuple[List[TokenInfo], Optional[TokenCursor]]:
+        """List one page of tokens.
+
+        Parameters
+        ----------
+        auth_data : `gafaelfawr.models.token.TokenData`
+            The token data for the authentication token of the user making
+            this modification.
+        username : `str`, optional
+            Limit results to the given username.
+        limit : `int`
+            Return at most this many tokens.
+        cursor : `gafaelfawr.models.token.TokenCursor`, optional
+            Return tokens after this position.
+
+        Returns
+        -------
+        info : List[`gafaelfawr.models.token.TokenInfo`]
+            Information for the tokens in this page, ordered by creation time
+            and then by key.
+        next_cursor : `gafaelfawr.models.token.TokenCursor` or `None`
+            The cursor for the next page, or `None` if this is the last page.
+
+        Raises
+        ------
+        gafaelfawr.exceptions.PermissionDeniedError
+            The user whose tokens are being listed does not match the
+            authentication information.
+        """
+        self._check_list_permission(auth_data, username)
+
+        # Ask for one more token than requested to see if there is another
+        # page.
+        tokens = await self._token_db_store.list(
+            username=username, limit=limit + 1, cursor=cursor
+        )
+        if len(tokens) <= limit:
+            return tokens, None
+        tokens = tokens[:limit]
+        return tokens, TokenCursor.from_info(tokens[-1])
+
+    def stream_tokens(
+        self,
+        auth_data: TokenData,
+        username: Optional[str] = None,
+        *,
+        cursor: Optional[TokenCursor] = None,
+    ) -> AsyncIterator[TokenInfo]:
+        """Iterate over tokens without loading them all into memory.
+
+        The permission check is done when this method is called, before the
+        iteration starts, so that errors can be reported before a streaming
+        response has been started.
+
+        Parameters
+        ----------
+        auth_data : `gafaelfawr.models.token.TokenData`
+            The token data for the authentication token of the user making
+            this modification.
+        username : `str`, optional
+            Limit results to the given username.
+        cursor : `gafaelfawr.models.token.TokenCursor`, optional
+            Return tokens after this position.
+
+        Returns
+        -------
+        tokens : AsyncIterator[`gafaelfawr.models.token.TokenInfo`]
+            Information for the matching tokens, ordered by creation time and
+            then by key.
+
+        Raises
+        ------
+        gafaelfawr.exceptions.PermissionDeniedError
+            The user whose tokens are being listed does not match the
+            authentication information.
+        """
+        self._check_list_permission(auth_data, username)
+        return self._token_db_store.stream(
+            username=username, cursor=cursor, batch_size=TOKEN_LIST_BATCH_SIZE
+        )
 
     async def modify_token(
         self,
@@ -505,6 +741,7 @@ class TokenService:
         scopes: Optional[List[str]] = None,
         expires: Optional[datetime] = None,
         no_expire: bool = False,
+        ip_address: Optional[str] = None,
     ) -> Optional[TokenInfo]:
         """Modify a token.
 
@@ -527,6 +764,8 @@ class TokenService:
         no_expire : `bool`
             If set, the token should not expire.  This is a separate parameter
             because passing `None` to ``expires`` is ambiguous.
+        ip_address : `str`, optional
+            The IP address from which the request came.
 
         Returns
         -------
@@ -544,7 +783,7 @@ class TokenService:
             ``auth_data`` or the user attempted to modify a token type other
             than user.
         """
-        info = self.get_token_info_unchecked(key, username)
+        info = await self.get_token_info_unchecked(key, username)
         if not info:
             return None
         if info.username != auth_data.username:
@@ -558,14 +797,23 @@ class TokenService:
         self._validate_scopes(scopes, auth_data)
         self._validate_expires(expires)
 
-        with self._transaction_manager.transaction():
-            info = self._token_db_store.modify(
+        async with self._transaction_manager.transaction():
+            old_info = info
+            info = await self._token_db_store.modify(
                 key,
                 token_name=token_name,
                 scopes=scopes,
                 expires=expires,
                 no_expire=no_expire,
             )
+            if info:
+                history_entry = self._build_edit_entry(
+                    old_info,
+                    info,
+                    actor=auth_data.username,
+                    ip_address=ip_address,
+                )
+                self._token_change_store.add(history_entry)
 
             # Update the expiration in Redis if needed.
             if info and (no_expire or expires):
@@ -575,6 +823,8 @@ class TokenService:
                     await self._token_redis_store.store_data(data)
                 else:
                     info = None
+        if self._token_cache:
+            await self._token_cache.invalidate(key)
 
         if info:
             self._logger.info(
@@ -585,6 +835,112 @@ class TokenService:
             )
         return info
 
+    def _build_create_entry(
+        self,
+        data: TokenData,
+        *,
+        actor: str,
+        ip_address: Optional[str],
+        token_name: Optional[str] = None,
+        parent: Optional[str] = None,
+        service: Optional[str] = None,
+    ) -> TokenChangeHistoryEntry:
+        """Build the history entry for the creation of a token."""
+        return TokenChangeHistoryEntry(
+            token=data.token.key,
+            username=data.username,
+            token_type=data.token_type,
+            token_name=token_name,
+            parent=parent,
+            scopes=self._format_scopes(data.scopes),
+            service=service,
+            expires=data.expires,
+            actor=actor,
+            action=TokenChange.create,
+            ip_address=ip_address,
+            event_time=data.created,
+        )
+
+    def _build_revoke_entry(
+        self,
+        info: TokenInfo,
+        *,
+        actor: str,
+        ip_address: Optional[str],
+        now: datetime,
+    ) -> TokenChangeHistoryEntry:
+        """Build the history entry for the revocation of a token."""
+        return TokenChangeHistoryEntry(
+            token=info.token,
+            username=info.username,
+            token_type=info.token_type,
+            token_name=info.token_name,
+            parent=info.parent,
+            scopes=self._format_scopes(info.scopes),
+            service=info.service,
+            expires=info.expires,
+            actor=actor,
+            action=TokenChange.revoke,
+            ip_address=ip_address,
+            event_time=now,
+        )
+
+    def _build_edit_entry(
+        self,
+        old_info: TokenInfo,
+        info: TokenInfo,
+        *,
+        actor: str,
+        ip_address: Optional[str],
+    ) -> TokenChangeHistoryEntry:
+        """Build the history entry for a modification of a token.
+
+        The old values of the name, scopes, and expiration are only included
+        if they changed.
+        """
+        entry = TokenChangeHistoryEntry(
+            token=info.token,
+            username=info.username,
+            token_type=info.token_type,
+            token_name=info.token_name,
+            parent=old_info.parent,
+            scopes=self._format_scopes(info.scopes),
+            service=info.service,
+            expires=info.expires,
+            actor=actor,
+            action=TokenChange.edit,
+            ip_address=ip_address,
+            event_time=datetime.now(tz=timezone.utc),
+        )
+        if old_info.token_name != info.token_name:
+            entry.old_token_name = old_info.token_name
+        if sorted(old_info.scopes) != sorted(info.scopes):
+            entry.old_scopes = self._format_scopes(old_info.scopes)
+        if old_info.expires != info.expires:
+            entry.old_expires = old_info.expires
+        return entry
+
+    @staticmethod
+    def _format_scopes(scopes: List[str]) -> Optional[str]:
+        """Convert scopes to their database representation."""
+        return ",".join(sorted(scopes)) if scopes else None
+
+    def _check_list_permission(
+        self, auth_data: TokenData, username: Optional[str]
+    ) -> None:
+        """Check that the user may list the requested tokens.
+
+        Raises
+        ------
+        gafaelfawr.exceptions.PermissionDeniedError
+            The user whose tokens are being listed does not match the
+            authentication information.
+        """
+        if username and username != auth_data.username:
+            msg = f"{auth_data.username} cannot list tokens for {username}"
+            self._logger.warning("Permission denied", error=msg)
+            raise PermissionDeniedError(msg)
+
     def _validate_expires(self, expires: Optional[datetime]) -> None:
         """Check that a provided token expiration is valid.
 
@@ -4,13 +4,16 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
+from sqlalchemy import delete
+from sqlalchemy.future import select
+
 from gafaelfawr.models.admin import Admin
 from gafaelfawr.schema import Admin as SQLAdmin
 
 if TYPE_CHECKING:
     from typing import List
 
-    from sqlalchemy.orm import Session
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 __all__ = ["AdminStore"]
 
@@ -20,11 +23,11 @@ class AdminStore:
 
     Parameters
     ----------
-    session : `sqlalchemy.orm.Session`
+    session : `sqlalchemy.ext.asyncio.AsyncSession`
         The underlying database session.
     """
 
-    def __init__(self, session: Session) -> None:
+    def __init__(self, session: AsyncSession) -> None:
         self._session = session
 
     def add(self, admin: Admin) -> None:
@@ -32,7 +35,7 @@ class AdminStore:
         new = SQLAdmin(username=admin.username)
         self._session.add(new)
 
-    def delete(self, admin: Admin) -> bool:
+    async def delete(self, admin: Admin) -> bool:
         """Delete an administrator.
 
         Parameters
@@ -46,18 +49,16 @@ class AdminStore:
             `True` if the administrator was found and deleted, `False`
             otherwise.
         """
-        result = (
-            self._session.query(SQLAdmin)
-            .filter_by(username=admin.username)
-            .delete(synchronize_session=False)
+        stmt = (
+            delete(SQLAdmin)
+            .where(SQLAdmin.username == admin.username)
+            .execution_options(synchronize_session=False)
         )
-        return result > 0
+        result = await self._session.execute(stmt)
+        return result.rowcount > 0
 
-    def list(self) -> List[Admin]:
+    async def list(self) -> List[Admin]:
         """Return a list of current administrators."""
-        return [
-            Admin.from_orm(a)
-            for a in self._session.query(SQLAdmin)
-            .order_by(SQLAdmin.username)
-            .all()
-        ]
+        stmt = select(SQLAdmin).order_by(SQLAdmin.username)
+        result = await self._session.execute(stmt)
+        return [Admin.from_orm(a) for a in result.scalars().all()]
@@ -0,0 +1,117 @@
+"""Background recording of token authentication history."""
+
+from __future__ import annotations
+
+import random
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+
+from gafaelfawr.models.history import TokenAuthHistoryEntry
+from gafaelfawr.storage.batch import BatchWriter, BatchWriterStats
+from gafaelfawr.storage.history import TokenAuthHistoryStore
+
+if TYPE_CHECKING:
+    from typing import Callable, List, Optional
+
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from structlog.stdlib import BoundLogger
+
+    from gafaelfawr.config import AuthHistoryConfig
+    from gafaelfawr.models.token import TokenData
+
+__all__ = ["AuthHistoryRecorder", "AuthHistoryStats"]
+
+
+@dataclass(frozen=True)
+class AuthHistoryStats(BatchWriterStats):
+    """Counters for the behavior of an `AuthHistoryRecorder`."""
+
+    sampled_out: int
+    """Number of events skipped because of sampling."""
+
+
+class AuthHistoryRecorder(BatchWriter[TokenAuthHistoryEntry]):
+    """Queues token authentications and writes them to the database.
+
+    Authentications are written to the ``token_auth_history`` table in the
+    background with multi-row inserts, so recording an authentication never
+    waits for the database.  If the database falls behind and the queue
+    fills, new events are dropped and counted rather than slowing down
+    authentication.
+
+    Parameters
+    ----------
+    config : `gafaelfawr.config.AuthHistoryConfig`
+        Configuration for authentication history.
+    session_factory : `typing.Callable`
+        Factory for database sessions used for writes.
+    logger : `structlog.stdlib.BoundLogger`
+        Logger for dropped events and write failures.
+    """
+
+    description = "authentication history"
+
+    def __init__(
+        self,
+        config: AuthHistoryConfig,
+        session_factory: Callable[[], AsyncSession],
+        logger: BoundLogger,
+    ) -> None:
+        super().__init__(
+            queue_size=config.queue_size,
+            batch_size=config.batch_size,
+            flush_interval=config.flush_interval,
+            session_factory=session_factory,
+            logger=logger,
+        )
+        self._sample_rates = config.sample_rates
+        self._sampled_out = 0
+
+    @property
+    def stats(self) -> AuthHistoryStats:
+        """Current counters for the recorder."""
+        return AuthHistoryStats(
+            sampled_out=self._sampled_out, **asdict(super().stats)
+        )
+
+    def record(
+        self,
+        token_data: TokenData,
+        *,
+        ip_address: Optional[str] = None,
+        service: Optional[str] = None,
+        when: Optional[datetime] = None,
+    ) -> None:
+        """Record an authentication with a token.
+
+        Parameters
+        ----------
+        token_data : `gafaelfawr.models.token.TokenData`
+            The data for the token used for authentication.
+        ip_address : `str`, optional
+            The IP address of the client.
+        service : `str`, optional
+            The service for which the token was issued, if known.
+        when : `datetime.datetime`, optional
+            When the authentication happened.  Defaults to now.
+        """
+        rate = self._sample_rates.get(token_data.token_type)
+        if rate is not None and random.random() >= rate:
+            self._sampled_out += 1
+            return
+        entry = TokenAuthHistoryEntry(
+            token=token_data.token.key,
+            username=token_data.username,
+            token_type=token_data.token_type,
+            scopes=",".join(sorted(token_data.scopes)) or None,
+            service=service,
+            ip_address=ip_address,
+            event_time=when or datetime.now(tz=timezone.utc),
+        )
+        self.add(entry)
+
+    async def _write(
+        self, session: AsyncSession, batch: List[TokenAuthHistoryEntry]
+    ) -> None:
+        await TokenAuthHistoryStore(session).add_many(batch)
@@ -13,9 +13,10 @@ from typing import TYPE_CHECKING, Generic, TypeVar
 from cryptography.fernet import Fernet, InvalidToken
 
 from gafaelfawr.exceptions import DeserializeException
+from gafaelfawr.storage.codec import ModelCodec
 
 if TYPE_CHECKING:
-    from typing import Optional, Type
+    from typing import AsyncIterator, Dict, List, Optional, Type
 
     from aioredis import Redis
     from pydantic import BaseModel  # noqa: F401
@@ -26,7 +27,12 @@ __all__ = ["RedisStorage"]
 
 
 class RedisStorage(Generic[S]):
-    """JSON-serialized encrypted storage in Redis.
+    """Serialized encrypted storage in Redis.
+
+    Objects are stored as JSON or, if requested and the class supports it,
+    in the compact form written by `~gafaelfawr.storage.codec.ModelCodec`.
+    Objects stored in either form can always be read, so that processes
+    writing different forms can run side by side.
 
     Parameters
     ----------
@@ -36,12 +42,26 @@ class RedisStorage(Generic[S]):
         Encryption key.  Must be a `~cryptography.fernet.Fernet` key.
     redis : `aioredis.Redis`
         A Redis client configured to talk to the backend store.
+    compact : `bool`, optional
+        Whether to store objects in the compact form if the class supports
+        it.  Earlier versions of Gafaelfawr cannot read the compact form.
     """
 
-    def __init__(self, content: Type[S], key: str, redis: Redis) -> None:
+    def __init__(
+        self,
+        content: Type[S],
+        key: str,
+        redis: Redis,
+        *,
+        compact: bool = False,
+    ) -> None:
         self._content = content
         self._fernet = Fernet(key.encode())
         self._redis = redis
+        self._codec: Optional[ModelCodec[S]] = None
+        if ModelCodec.supports(content):
+            self._codec = ModelCodec(content)
+        self._compact = compact and self._codec is not None
 
     async def delete(self, key: str) -> None:
         """Delete a stored object.
@@ -53,6 +73,19 @@ class RedisStorage(Generic[S]):
         """
         await self._redis.delete(key)
 
+    async def delete_many(self, keys: List[str]) -> None:
+        """Delete several stored objects or index entries at once.
+
+        All of the keys are deleted with a single Redis command.
+
+        Parameters
+        ----------
+        keys : List[`str`]
+            The keys to delete.
+        """
+        if keys:
+            await self._redis.delete(*keys)
+
     async def get(self, key: str) -> Optional[S]:
         """Retrieve a stored object.
 
@@ -75,22 +108,130 @@ class RedisStorage(Generic[S]):
         encrypted_data = await self._redis.get(key)
         if not encrypted_data:
             return None
+        return self._decode(key, encrypted_data)
 
-        # Decrypt the data.
-        try:
-            data = self._fernet.decrypt(encrypted_data)
-        except InvalidToken as e:
-            msg = f"Cannot decrypt data for {key}: {str(e)}"
-            raise DeserializeException(msg)
+    async def get_many(self, keys: List[str]) -> Dict[str, Optional[S]]:
+        """Retrieve several stored objects with a single Redis command.
 
-        # Deserialize the data.
-        try:
-            return self._content.parse_raw(data.decode())
-        except Exception as e:
-            msg = f"Cannot deserialize data for {key}: {str(e)}"
-            raise DeserializeException(msg)
+        Parameters
+        ----------
+        keys : List[`str`]
+            The keys for the objects.
+
+        Returns
+        -------
+        objs : Dict[`str`, `Serializable` or `None`]
+            Mapping of keys to the deserialized objects.  Keys that do not
+            exist are omitted.  Keys whose objects could not be decrypted or
+            deserialized map to `None`.
+        """
+        if not keys:
+            return {}
+        values = await self._redis.mget(*keys)
+        objs: Dict[str, Optional[S]] = {}
+        for key, encrypted_data in zip(keys, values):
+            if not encrypted_data:
+                continue
+            try:
+                objs[key] = self._decode(key, encrypted_data)
+            except DeserializeException:
+                objs[key] = None
+        return objs
+
+    async def get_index(self, key: str) -> Optional[str]:
+        """Retrieve the value of an index entry.
+
+        Parameters
+        ----------
+        key : `str`
+            The key of the index entry.
+
+        Returns
+        -------
+        value : `str` or `None`
+            The value stored with the index entry, or `None` if it does not
+            exist.
+        """
+        value = await self._redis.get(key)
+        return value.decode() if value else None
+
+    async def get_index_many(self, keys: List[str]) -> List[Optional[str]]:
+        """Retrieve several index entries, using a single Redis command.
+
+        Parameters
+        ----------
+        keys : List[`str`]
+            The keys of the index entries.
+
+        Returns
+        -------
+        values : List[`str` or `None`]
+            The value stored with each index entry, or `None` if it does not
+            exist, in the same order as ``keys``.
+        """
+        if not keys:
+            return []
+        values = await self._redis.mget(*keys)
+        return [v.decode() if v else None for v in values]
+
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        """Check whether several keys exist, using a single Redis pipeline.
+
+        Parameters
+        ----------
+        keys : List[`str`]
+            The keys to check.
+
+        Returns
+        -------
+        exists : List[`bool`]
+            Whether each key exists, in the same order as ``keys``.
+        """
+        if not keys:
+            return []
+        pipeline = self._redis.pipeline()
+        for key in keys:
+            pipeline.exists(key)
+        return [bool(r) for r in await pipeline.execute()]
+
+    async def scan(self, pattern: str, count: int) -> AsyncIterator[List[str]]:
+        """Iterate over the keys matching a pattern.
+
+        Keys are retrieved with ``SCAN``, so only one batch of keys is held in
+        memory at a time and Redis is never blocked for long.  A key may be
+        returned more than once.
+
+        Parameters
+        ----------
+        pattern : `str`
+            Glob-style pattern for the keys.
+        count : `int`
+            Number of keys to ask Redis for at a time.  This is only a hint
+            and batches may be larger or smaller.
+
+        Yields
+        ------
+        keys : List[`str`]
+            A batch of matching keys.
+        """
+        cursor = 0
+        while True:
+            cursor, keys = await self._redis.scan(
+                cursor, match=pattern, count=count
+            )
+            if keys:
+                yield [k.decode() for k in keys]
+            if not cursor:
+                break
 
-    async def store(self, key: str, obj: S, lifetime: Optional[int]) -> None:
+    async def store(
+        self,
+        key: str,
+        obj: S,
+        lifetime: Optional[int],
+        *,
+        indexes: Optional[Dict[str, str]] = None,
+    ) -> None:
         """Store an object.
 
         Parameters
@@ -103,6 +244,47 @@ class RedisStorage(Generic[S]):
             The object lifetime in seconds.  The object should expire from the
             data store after that many seconds after the current time.
             Returns `None` if the object should not expire.
+        indexes : Dict[`str`, `str`], optional
+            Index entries to store alongside the object, as a mapping of keys
+            to unencrypted string values.  They are written in the same
+            pipeline as the object and have the same lifetime.
         """
-        encrypted_data = self._fernet.encrypt(obj.json().encode())
-        await self._redis.set(key, encrypted_data, expire=lifetime)
+        if self._compact:
+            assert self._codec
+            data = self._codec.encode(obj)
+        else:
+            data = obj.json().encode()
+        encrypted_data = self._fernet.encrypt(data)
+        if not indexes:
+            await self._redis.set(key, encrypted_data, expire=lifetime)
+            return
+        pipeline = self._redis.pipeline()
+        pipeline.set(key, encrypted_data, expire=lifetime)
+        for index_key, value in indexes.items():
+            pipeline.set(index_key, value, expire=lifetime)
+        await pipeline.execute()
+
+    def _decode(self, key: str, encrypted_data: bytes) -> S:
+        """Decrypt and deserialize a stored object.
+
+        Raises
+        ------
+        gafaelfawr.exceptions.DeserializeException
+            The stored object could not be decrypted or deserialized.
+        """
+        try:
+            data = self._fernet.decrypt(encrypted_data)
+        except InvalidToken as e:
+            msg = f"Cannot decrypt data for {key}: {str(e)}"
+            raise DeserializeException(msg)
+
+        try:
+            if data.startswith(b"{"):
+                return self._content.parse_raw(data.decode())
+            elif self._codec:
+                return self._codec.decode(data)
+            else:
+                raise ValueError("Unknown serialization format")
+        except Exception as e:
+            msg = f"Cannot deserialize data for {key}: {str(e)}"
+            raise DeserializeException(msg)
@@ -0,0 +1,256 @@
+"""Background writing of database records in batches."""
+
+from __future__ import annotations
+
+import asyncio
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import count
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+if TYPE_CHECKING:
+    from typing import Callable, Hashable, List, Optional, Tuple
+
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from structlog.stdlib import BoundLogger
+
+E = TypeVar("E")
+"""Type of the records written by a `BatchWriter`."""
+
+__all__ = ["BatchWriter", "BatchWriterStats"]
+
+
+@dataclass(frozen=True)
+class BatchWriterStats:
+    """Counters for the behavior of a `BatchWriter`."""
+
+    queued: int
+    """Number of records currently waiting to be written."""
+
+    max_queued: int
+    """Largest number of records that have been waiting at once."""
+
+    recorded: int
+    """Number of records added to the queue, including coalesced ones."""
+
+    dropped: int
+    """Number of records discarded because the queue was full."""
+
+    written: int
+    """Number of records written to the database."""
+
+    failed: int
+    """Number of database writes that failed."""
+
+
+class BatchWriter(ABC, Generic[E]):
+    """Queues records and writes them to the database in the background.
+
+    Records are added to a bounded in-memory queue, which a background task
+    drains in batches, so adding a record never waits for the database.  If
+    the database falls behind and the queue fills, new records are dropped
+    and counted rather than slowing down the caller.
+
+    Subclasses must implement `_write`.  Subclasses may also override `_key`
+    so that a new record replaces a queued record with the same key rather
+    than taking up another place in the queue.
+
+    Parameters
+    ----------
+    queue_size : `int`
+        Maximum number of records waiting to be written.
+    batch_size : `int`
+        Maximum number of records to write at once.  Reaching this many
+        queued records also triggers an early write.
+    flush_interval : `float`
+        How often, in seconds, to write queued records.
+    session_factory : `typing.Callable`
+        Factory for database sessions used for writes.
+    logger : `structlog.stdlib.BoundLogger`
+        Logger for dropped records and write failures.
+    """
+
+    description = "records"
+    """Description of the records for log messages."""
+
+    def __init__(
+        self,
+        *,
+        queue_size: int,
+        batch_size: int,
+        flush_interval: float,
+        session_factory: Callable[[], AsyncSession],
+        logger: BoundLogger,
+    ) -> None:
+        self._queue_size = queue_size
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._session_factory = session_factory
+        self._logger = logger
+        self._queue: OrderedDict[Hashable, E] = OrderedDict()
+        self._counter = count()
+        self._flusher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._overflowing = False
+        self._max_queued = 0
+        self._recorded = 0
+        self._dropped = 0
+        self._written = 0
+        self._failed = 0
+
+    @property
+    def stats(self) -> BatchWriterStats:
+        """Current counters for the writer."""
+        return BatchWriterStats(
+            queued=len(self._queue),
+            max_queued=self._max_queued,
+            recorded=self._recorded,
+            dropped=self._dropped,
+            written=self._written,
+            failed=self._failed,
+        )
+
+    def add(self, record: E) -> None:
+        """Queue a record to be written.
+
+        Parameters
+        ----------
+        record : `typing.Any`
+            The record to write.  It replaces any queued record with the
+            same key, and is otherwise dropped if the queue is full.
+        """
+        key = self._key(record)
+        if key in self._queue:
+            self._queue[key] = record
+            self._recorded += 1
+            return
+        if len(self._queue) >= self._queue_size:
+            self._dropped += 1
+            if not self._overflowing:
+                self._overflowing = True
+                self._logger.warning(
+                    f"Queue of {self.description} full, dropping new ones",
+                    queue_size=self._queue_size,
+                )
+            return
+        self._queue[key] = record
+        self._recorded += 1
+        queued = len(self._queue)
+        if queued > self._max_queued:
+            self._max_queued = queued
+        if self._wakeup and queued >= self._batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Write all queued records to the database.
+
+        Errors are logged rather than raised.  Records that could not be
+        written are returned to the front of the queue, as far as there is
+        room, to retry on the next flush.
+        """
+        while self._queue:
+            batch_size = min(self._batch_size, len(self._queue))
+            batch = [
+                self._queue.popitem(last=False) for _ in range(batch_size)
+            ]
+            try:
+                async with self._session_factory() as session:
+                    async with session.begin():
+                        await self._write(session, [r for _, r in batch])
+            except Exception as e:
+                self._failed += 1
+                self._logger.error(
+                    f"Cannot write {self.description}", error=str(e)
+                )
+                self._requeue(batch)
+                return
+            self._written += len(batch)
+
+        if self._overflowing:
+            self._overflowing = False
+            self._logger.info(
+                f"Queue of {self.description} drained", dropped=self._dropped
+            )
+
+    async def start(self) -> None:
+        """Start the background task that writes queued records."""
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write any queued records."""
+        if self._flusher and self._wakeup:
+            self._stopping = True
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+            self._wakeup = None
+        await self.flush()
+
+    def _key(self, record: E) -> Hashable:
+        """Return the key under which to queue a record.
+
+        By default every record gets a unique key, so records are never
+        coalesced.
+
+        Parameters
+        ----------
+        record : `typing.Any`
+            The record to queue.
+
+        Returns
+        -------
+        key : `typing.Hashable`
+            The key for the record.
+        """
+        return next(self._counter)
+
+    @abstractmethod
+    async def _write(self, session: AsyncSession, batch: List[E]) -> None:
+        """Write a batch of records inside a transaction.
+
+        Parameters
+        ----------
+        session : `sqlalchemy.ext.asyncio.AsyncSession`
+            Database session with an open transaction.
+        batch : List[`typing.Any`]
+            The records to write.
+        """
+
+    def _requeue(self, batch: List[Tuple[Hashable, E]]) -> None:
+        """Return a batch that could not be written to the queue.
+
+        Records added while the write was in progress take up room in the
+        queue and replace records in the batch with the same key, so the
+        newest records in the batch are dropped if necessary.
+        """
+        batch = [(k, r) for k, r in batch if k not in self._queue]
+        room = max(self._queue_size - len(self._queue), 0)
+        if room < len(batch):
+            self._dropped += len(batch) - room
+            batch = batch[:room]
+        for key, record in reversed(batch):
+            self._queue[key] = record
+            self._queue.move_to_end(key, last=False)
+
+    async def _run(self) -> None:
+        """Write queued records until stopped.
+
+        Records are written every flush interval, or sooner if a full batch
+        is queued.  The task is stopped by setting a flag rather than by
+        cancellation so that a write is never interrupted.
+        """
+        assert self._wakeup
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), self._flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self._stopping:
+                await self.flush()
@@ -0,0 +1,293 @@
+"""In-memory cache of verified token data."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, NamedTuple
+
+from gafaelfawr.constants import (
+    TOKEN_CACHE_CHANNEL,
+    TOKEN_CACHE_RESUBSCRIBE_DELAY,
+    TOKEN_CACHE_RESUBSCRIBE_MAX_DELAY,
+)
+
+if TYPE_CHECKING:
+    from typing import List, Optional
+
+    from aioredis import Channel, Redis
+    from structlog.stdlib import BoundLogger
+
+    from gafaelfawr.config import TokenCacheConfig
+    from gafaelfawr.models.token import Token, TokenData
+
+__all__ = ["TokenCache", "TokenCacheStats"]
+
+
+@dataclass(frozen=True)
+class TokenCacheStats:
+    """Counters for the behavior of a `TokenCache`."""
+
+    hits: int
+    """Number of lookups satisfied from the cache."""
+
+    misses: int
+    """Number of lookups that had to go to Redis."""
+
+    evictions: int
+    """Number of entries dropped to stay within the size limit."""
+
+    invalidations: int
+    """Number of entries dropped because the token was changed or deleted."""
+
+    size: int
+    """Number of entries currently in the cache."""
+
+
+class _CacheEntry(NamedTuple):
+    """An entry in the token cache."""
+
+    secret_hash: bytes
+    """SHA-256 hash of the token secret."""
+
+    data: TokenData
+    """The cached token data."""
+
+    expires: float
+    """When the entry expires, in seconds since epoch."""
+
+
+class TokenCache:
+    """Per-process cache of verified token data.
+
+    Each worker keeps a bounded LRU cache of the token data it has recently
+    retrieved from Redis so that repeated authentication with the same token
+    does not need a Redis round trip, a decryption, and a model parse.
+    Entries are keyed by the token key and store a hash of the token secret,
+    so the secret check done by
+    `~gafaelfawr.storage.token.TokenRedisStore.get_data` is preserved.
+
+    Changes to a token are propagated to the caches of every worker via Redis
+    pub/sub.  Since delivery of pub/sub messages is not guaranteed, entries
+    are also bounded by a maximum lifetime, and never live past the expiration
+    of the underlying token.  If the subscription is lost, the cache is
+    dropped and nothing is cached until the worker has resubscribed.
+
+    The size of the cache is bounded by the number of entries rather than by
+    memory use, since measuring the size of token data would cost more than
+    the cache saves.  The memory used by a full cache therefore depends on
+    the size of the cached token data, mostly the scopes and groups.
+
+    Parameters
+    ----------
+    config : `gafaelfawr.config.TokenCacheConfig`
+        Configuration for the cache.
+    redis : `aioredis.Redis` or `None`
+        Redis client used to send and receive invalidation messages.  If
+        `None`, invalidations will only affect the cache of this process.
+    logger : `structlog.BoundLogger`
+        Logger for diagnostics.
+    """
+
+    def __init__(
+        self,
+        config: TokenCacheConfig,
+        redis: Optional[Redis],
+        logger: BoundLogger,
+    ) -> None:
+        self._config = config
+        self._redis = redis
+        self._logger = logger
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._listener: Optional[asyncio.Task] = None
+        self._disconnected = False
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def stats(self) -> TokenCacheStats:
+        """Current counters for the cache."""
+        return TokenCacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            invalidations=self._invalidations,
+            size=len(self._entries),
+        )
+
+    def clear(self) -> None:
+        """Drop all entries from the cache."""
+        self._entries.clear()
+
+    def discard(self, key: str) -> None:
+        """Drop a token from the cache of this process only.
+
+        Parameters
+        ----------
+        key : `str`
+            The key of the token.
+        """
+        if self._entries.pop(key, None):
+            self._invalidations += 1
+
+    def get(self, token: Token) -> Optional[TokenData]:
+        """Retrieve the cached data for a token.
+
+        Parameters
+        ----------
+        token : `gafaelfawr.models.token.Token`
+            The token.
+
+        Returns
+        -------
+        data : `gafaelfawr.models.token.TokenData` or `None`
+            A copy of the cached data, or `None` if the token is not cached,
+            the entry has expired, or the secret does not match.
+        """
+        entry = self._entries.get(token.key)
+        if not entry:
+            self._misses += 1
+            return None
+        if entry.expires <= time.time():
+            del self._entries[token.key]
+            self._misses += 1
+            return None
+        secret_hash = hashlib.sha256(token.secret.encode()).digest()
+        if not hmac.compare_digest(secret_hash, entry.secret_hash):
+            self._misses += 1
+            return None
+        self._entries.move_to_end(token.key)
+        self._hits += 1
+        return entry.data.copy()
+
+    async def invalidate(self, key: str) -> None:
+        """Drop a token from the caches of all workers.
+
+        Parameters
+        ----------
+        key : `str`
+            The key of the token.
+        """
+        self.discard(key)
+        if self._redis:
+            await self._redis.publish(TOKEN_CACHE_CHANNEL, key)
+
+    async def invalidate_many(self, keys: List[str]) -> None:
+        """Drop several tokens from the caches of all workers.
+
+        The invalidation messages are sent in a single Redis pipeline.
+
+        Parameters
+        ----------
+        keys : List[`str`]
+            The keys of the tokens.
+        """
+        for key in keys:
+            self.discard(key)
+        if self._redis and keys:
+            pipeline = self._redis.pipeline()
+            for key in keys:
+                pipeline.publish(TOKEN_CACHE_CHANNEL, key)
+            await pipeline.execute()
+
+    def store(self, data: TokenData) -> None:
+        """Add token data to the cache.
+
+        Parameters
+        ----------
+        data : `gafaelfawr.models.token.TokenData`
+            The data for a token that has been verified against Redis.
+        """
+        if self._disconnected:
+            return
+        expires = time.time() + self._config.lifetime
+        if data.expires:
+            expires = min(expires, data.expires.timestamp())
+            if expires <= time.time():
+                return
+        secret_hash = hashlib.sha256(data.token.secret.encode()).digest()
+        key = data.token.key
+        self._entries[key] = _CacheEntry(secret_hash, data.copy(), expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._config.size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    async def start(self) -> None:
+        """Start listening for invalidations from other workers.
+
+        Does nothing if the cache was created without a Redis client.
+        """
+        if not self._redis or self._listener:
+            return
+        channels = await self._redis.subscribe(TOKEN_CACHE_CHANNEL)
+        self._listener = asyncio.create_task(self._run(channels[0]))
+
+    async def stop(self) -> None:
+        """Stop listening for invalidations and drop all cached entries."""
+        if self._redis and self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+            if not self._disconnected:
+                await self._redis.unsubscribe(TOKEN_CACHE_CHANNEL)
+        self._disconnected = False
+        self.clear()
+
+    async def listen(self, channel: Channel) -> None:
+        """Process invalidation messages until the channel is closed.
+
+        Parameters
+        ----------
+        channel : `aioredis.Channel`
+            The subscribed invalidation channel.
+        """
+        try:
+            async for key in channel.iter(encoding="utf-8"):
+                self.discard(key)
+        except Exception as e:
+            self._logger.error("Token cache invalidation failed", error=str(e))
+
+    async def _run(self, channel: Channel) -> None:
+        """Listen for invalidations, resubscribing whenever the channel closes.
+
+        Once the channel has closed, messages may have been missed, so the
+        whole cache is dropped and no new entries are cached until the
+        subscription has been restored.  Attempts to resubscribe back off
+        exponentially up to a maximum delay.
+
+        Parameters
+        ----------
+        channel : `aioredis.Channel`
+            The initial subscribed invalidation channel.
+        """
+        assert self._redis
+        while True:
+            await self.listen(channel)
+            self._disconnected = True
+            self.clear()
+            self._logger.warning("Lost token cache invalidation channel")
+            delay = TOKEN_CACHE_RESUBSCRIBE_DELAY
+            while self._disconnected:
+                await asyncio.sleep(delay)
+                try:
+                    channels = await self._redis.subscribe(TOKEN_CACHE_CHANNEL)
+                except Exception as e:
+                    msg = "Cannot resubscribe to token cache invalidations"
+                    self._logger.warning(msg, error=str(e), delay=delay)
+                    delay = min(delay * 2, TOKEN_CACHE_RESUBSCRIBE_MAX_DELAY)
+                else:
+                    channel = channels[0]
+                    self._disconnected = False
+                    self._logger.info(
+                        "Resubscribed to token cache invalidations"
+                    )
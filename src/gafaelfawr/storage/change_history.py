@@ -0,0 +1,59 @@
+"""Background recording of token change history."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from gafaelfawr.models.history import TokenChangeHistoryEntry
+from gafaelfawr.storage.batch import BatchWriter
+from gafaelfawr.storage.history import TokenChangeHistoryStore
+
+if TYPE_CHECKING:
+    from typing import Callable, List
+
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from structlog.stdlib import BoundLogger
+
+    from gafaelfawr.config import ChangeHistoryConfig
+
+__all__ = ["TokenChangeRecorder"]
+
+
+class TokenChangeRecorder(BatchWriter[TokenChangeHistoryEntry]):
+    """Queues token changes and writes them to the database.
+
+    Used for changes made while authenticating requests, such as creating
+    internal and notebook tokens, so that they do not add another database
+    write to the request.  Changes are written to the
+    ``token_change_history`` table in the background with multi-row inserts.
+
+    Parameters
+    ----------
+    config : `gafaelfawr.config.ChangeHistoryConfig`
+        Configuration for background change history.
+    session_factory : `typing.Callable`
+        Factory for database sessions used for writes.
+    logger : `structlog.stdlib.BoundLogger`
+        Logger for dropped changes and write failures.
+    """
+
+    description = "token change history"
+
+    def __init__(
+        self,
+        config: ChangeHistoryConfig,
+        session_factory: Callable[[], AsyncSession],
+        logger: BoundLogger,
+    ) -> None:
+        super().__init__(
+            queue_size=config.queue_size,
+            batch_size=config.batch_size,
+            flush_interval=config.flush_interval,
+            session_factory=session_factory,
+            logger=logger,
+        )
+
+    async def _write(
+        self, session: AsyncSession, batch: List[TokenChangeHistoryEntry]
+    ) -> None:
+        await TokenChangeHistoryStore(session).add_many(batch)
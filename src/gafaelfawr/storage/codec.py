@@ -0,0 +1,199 @@
+"""Compact serialization of stored models."""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+from enum import Enum
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+    from pydantic.fields import ModelField
+
+    Converter = Callable[[Any], Any]
+    FieldCodec = Tuple[str, Optional[Converter], Optional[Converter]]
+
+M = TypeVar("M", bound=BaseModel)
+
+__all__ = ["COMPACT_VERSION", "ModelCodec"]
+
+COMPACT_VERSION = 1
+"""Version byte that starts the compact serialization."""
+
+
+def _encode_datetime(value: datetime) -> int:
+    return int(value.timestamp())
+
+
+def _decode_datetime(value: int) -> datetime:
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+def _encode_enum(value: Enum) -> Any:
+    return value.value
+
+
+class ModelCodec(Generic[M]):
+    """Serializes a pydantic model in a compact, versioned form.
+
+    The serialization is a version byte followed by a JSON array of the field
+    values in field order, without the field names.  Datetimes are stored as
+    seconds since epoch, enums by value, and nested models as nested arrays.
+    Decoding builds the model with ``construct`` rather than validating it,
+    so the data must come from `encode` and must be authenticated, as it is
+    by the encryption used by `~gafaelfawr.storage.base.RedisStorage`.
+
+    Fields added to the end of a model are filled in with their defaults when
+    decoding older data.  Removing or reordering fields requires a new
+    version.
+
+    Parameters
+    ----------
+    model : `typing.Type`
+        The class of the model.
+
+    Raises
+    ------
+    TypeError
+        The model, or a model nested in it, has a field that is neither a
+        single value nor a list.  Use `supports` to check first.
+    """
+
+    @classmethod
+    def supports(cls, model: Type[BaseModel]) -> bool:
+        """Whether a model can be serialized in the compact form.
+
+        Parameters
+        ----------
+        model : `typing.Type`
+            The class of the model.
+
+        Returns
+        -------
+        supported : `bool`
+            Whether all of the fields of the model, and of any nested models,
+            are single values or lists.
+        """
+        for field in model.__fields__.values():
+            if field.shape not in (SHAPE_SINGLETON, SHAPE_LIST):
+                return False
+            field_type = field.type_
+            if isinstance(field_type, type) and issubclass(
+                field_type, BaseModel
+            ):
+                if not cls.supports(field_type):
+                    return False
+        return True
+
+    def __init__(self, model: Type[M]) -> None:
+        self._model = model
+        self._fields: List[FieldCodec] = []
+        for name, field in model.__fields__.items():
+            encode, decode = self._build_converters(field)
+            self._fields.append((name, encode, decode))
+
+    def decode(self, data: bytes) -> M:
+        """Deserialize a model.
+
+        Parameters
+        ----------
+        data : `bytes`
+            The compact serialization, including the version byte.
+
+        Returns
+        -------
+        model : `pydantic.BaseModel`
+            The deserialized model.
+
+        Raises
+        ------
+        ValueError
+            The data is not in a supported version of the compact form or
+            does not match the model.
+        """
+        if not data or data[0] != COMPACT_VERSION:
+            raise ValueError("Unknown serialization version")
+        values = json.loads(data[1:])
+        if not isinstance(values, list):
+            raise ValueError("Serialized data is not a list")
+        return self._decode_values(values)
+
+    def encode(self, model: M) -> bytes:
+        """Serialize a model.
+
+        Parameters
+        ----------
+        model : `pydantic.BaseModel`
+            The model to serialize.
+
+        Returns
+        -------
+        data : `bytes`
+            The compact serialization, including the version byte.
+        """
+        values = self._encode_values(model)
+        encoded = json.dumps(values, separators=(",", ":")).encode()
+        return bytes([COMPACT_VERSION]) + encoded
+
+    def _build_converters(
+        self, field: ModelField
+    ) -> Tuple[Optional[Converter], Optional[Converter]]:
+        """Build the functions to encode and decode the value of a field.
+
+        Returns `None` for both functions if the value is stored as-is.
+        """
+        if field.shape not in (SHAPE_SINGLETON, SHAPE_LIST):
+            msg = f"Unsupported type for {field.name}: {field.outer_type_}"
+            raise TypeError(msg)
+        field_type = field.type_
+        if not isinstance(field_type, type):
+            return None, None
+        encode: Converter
+        decode: Converter
+        if issubclass(field_type, datetime):
+            encode, decode = _encode_datetime, _decode_datetime
+        elif issubclass(field_type, Enum):
+            encode, decode = _encode_enum, field_type
+        elif issubclass(field_type, BaseModel):
+            codec = ModelCodec(field_type)
+            encode, decode = codec._encode_values, codec._decode_values
+        else:
+            return None, None
+        if field.shape == SHAPE_LIST:
+            return self._map_list(encode), self._map_list(decode)
+        return encode, decode
+
+    @staticmethod
+    def _map_list(convert: Converter) -> Converter:
+        """Wrap a converter so that it converts each element of a list."""
+
+        def wrapper(values: List[Any]) -> List[Any]:
+            return [convert(v) for v in values]
+
+        return wrapper
+
+    def _decode_values(self, values: List[Any]) -> M:
+        """Build a model from its encoded field values."""
+        if len(values) > len(self._fields):
+            raise ValueError("Serialized data does not match model")
+        data: Dict[str, Any] = {}
+        for (name, _, decode), value in zip(self._fields, values):
+            if decode and value is not None:
+                value = decode(value)
+            data[name] = value
+        return self._model.construct(**data)
+
+    def _encode_values(self, model: M) -> List[Any]:
+        """Convert the fields of a model to a JSON-compatible list."""
+        values = []
+        for name, encode, _ in self._fields:
+            value = getattr(model, name)
+            if encode and value is not None:
+                value = encode(value)
+            values.append(value)
+        return values
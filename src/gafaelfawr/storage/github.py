@@ -0,0 +1,123 @@
+"""Storage for cached GitHub API responses."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from gafaelfawr.constants import GITHUB_CACHE_LIFETIME
+from gafaelfawr.exceptions import DeserializeException
+from gafaelfawr.models.github import GitHubCachedResponse
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+    from gafaelfawr.storage.base import RedisStorage
+
+__all__ = ["GitHubCacheStats", "GitHubResponseCache"]
+
+
+@dataclass(frozen=True)
+class GitHubCacheStats:
+    """Counters for the behavior of a `GitHubResponseCache`."""
+
+    hits: int
+    """Number of requests answered with 304 and served from the cache."""
+
+    misses: int
+    """Number of requests that returned a new response."""
+
+    rate_limit_remaining: Optional[int]
+    """Remaining GitHub API rate limit as of the most recent response."""
+
+    @property
+    def hit_ratio(self) -> float:
+        """Fraction of requests served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class GitHubResponseCache:
+    """Caches GitHub API responses per user for conditional requests.
+
+    Responses are stored in Redis, encrypted, so that the cache is shared by
+    all Gafaelfawr processes.  Each process keeps its own counters of cache
+    hits and misses and of the most recently reported remaining rate limit.
+
+    Parameters
+    ----------
+    storage : `gafaelfawr.storage.base.RedisStorage`
+        The underlying storage for
+        `~gafaelfawr.models.github.GitHubCachedResponse`.
+    """
+
+    def __init__(self, storage: RedisStorage[GitHubCachedResponse]) -> None:
+        self._storage = storage
+        self._hits = 0
+        self._misses = 0
+        self._rate_limit_remaining: Optional[int] = None
+
+    @property
+    def stats(self) -> GitHubCacheStats:
+        """Current counters for the cache."""
+        return GitHubCacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            rate_limit_remaining=self._rate_limit_remaining,
+        )
+
+    async def get(self, uid: int, name: str) -> Optional[GitHubCachedResponse]:
+        """Retrieve a cached response.
+
+        Parameters
+        ----------
+        uid : `int`
+            The GitHub ID of the user.
+        name : `str`
+            The name of the cached response.
+
+        Returns
+        -------
+        response : `gafaelfawr.models.github.GitHubCachedResponse` or `None`
+            The cached response, or `None` if there is no cached response or
+            it could not be read.
+        """
+        try:
+            return await self._storage.get(f"github:{uid}:{name}")
+        except DeserializeException:
+            return None
+
+    def record_hit(self) -> None:
+        """Record that a cached response was still valid."""
+        self._hits += 1
+
+    def record_miss(self) -> None:
+        """Record that a new response had to be retrieved."""
+        self._misses += 1
+
+    def record_rate_limit(self, remaining: int) -> None:
+        """Record the remaining rate limit reported by GitHub.
+
+        Parameters
+        ----------
+        remaining : `int`
+            The value of the ``X-RateLimit-Remaining`` response header.
+        """
+        self._rate_limit_remaining = remaining
+
+    async def store(
+        self, uid: int, name: str, response: GitHubCachedResponse
+    ) -> None:
+        """Cache a response.
+
+        Parameters
+        ----------
+        uid : `int`
+            The GitHub ID of the user.
+        name : `str`
+            The name of the cached response.
+        response : `gafaelfawr.models.github.GitHubCachedResponse`
+            The response to cache.
+        """
+        key = f"github:{uid}:{name}"
+        await self._storage.store(key, response, GITHUB_CACHE_LIFETIME)
@@ -4,14 +4,51 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-from gafaelfawr.schema import AdminHistory
+from sqlalchemy import insert
+
+from gafaelfawr.constants import DATABASE_MAX_PARAMETERS
+from gafaelfawr.schema import (
+    AdminHistory,
+    TokenAuthHistory,
+    TokenChangeHistory,
+)
 
 if TYPE_CHECKING:
-    from sqlalchemy.orm import Session
+    from typing import Sequence, Type
+
+    from pydantic import BaseModel
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from gafaelfawr.models.history import (
+        AdminHistoryEntry,
+        TokenAuthHistoryEntry,
+        TokenChangeHistoryEntry,
+    )
+    from gafaelfawr.schema.base import Base
+
+__all__ = [
+    "AdminHistoryStore",
+    "TokenAuthHistoryStore",
+    "TokenChangeHistoryStore",
+]
 
-    from gafaelfawr.models.history import AdminHistoryEntry
 
-__all__ = ["AdminHistoryStore"]
+async def _insert_many(
+    session: AsyncSession, table: Type[Base], entries: Sequence[BaseModel]
+) -> None:
+    """Insert rows with as few multi-row statements as possible.
+
+    Each statement binds a parameter for every column of every row, so the
+    rows are split into chunks that stay under the database limit on the
+    number of parameters in one statement.
+    """
+    if not entries:
+        return
+    rows = [e.dict() for e in entries]
+    chunk_size = DATABASE_MAX_PARAMETERS // len(rows[0])
+    for i in range(0, len(rows), chunk_size):
+        stmt = insert(table).values(rows[i : i + chunk_size])
+        await session.execute(stmt)
 
 
 class AdminHistoryStore:
@@ -19,14 +56,67 @@ class AdminHistoryStore:
 
     Parameters
     ----------
-    session : `sqlalchemy.orm.Session`
+    session : `sqlalchemy.ext.asyncio.AsyncSession`
         The underlying database session.
     """
 
-    def __init__(self, session: Session) -> None:
+    def __init__(self, session: AsyncSession) -> None:
         self._session = session
 
     def add(self, entry: AdminHistoryEntry) -> None:
         """Record a change to the token administrators."""
         new = AdminHistory(**entry.dict())
         self._session.add(new)
+
+
+class TokenAuthHistoryStore:
+    """Stores and retrieves the history of token authentications.
+
+    Parameters
+    ----------
+    session : `sqlalchemy.ext.asyncio.AsyncSession`
+        The underlying database session.
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self._session = session
+
+    async def add_many(self, entries: Sequence[TokenAuthHistoryEntry]) -> None:
+        """Record several authentications with multi-row inserts.
+
+        Parameters
+        ----------
+        entries : Sequence[`gafaelfawr.models.history.TokenAuthHistoryEntry`]
+            The authentications to record.
+        """
+        await _insert_many(self._session, TokenAuthHistory, entries)
+
+
+class TokenChangeHistoryStore:
+    """Stores and retrieves the history of changes to tokens.
+
+    Parameters
+    ----------
+    session : `sqlalchemy.ext.asyncio.AsyncSession`
+        The underlying database session.
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self._session = session
+
+    def add(self, entry: TokenChangeHistoryEntry) -> None:
+        """Record a change to a token."""
+        new = TokenChangeHistory(**entry.dict())
+        self._session.add(new)
+
+    async def add_many(
+        self, entries: Sequence[TokenChangeHistoryEntry]
+    ) -> None:
+        """Record several changes to tokens with multi-row inserts.
+
+        Parameters
+        ----------
+        entries : Sequence[`gafaelfawr.models.history.TokenChangeHistoryEntry`]
+            The changes to record.
+        """
+        await _insert_many(self._session, TokenChangeHistory, entries)
@@ -0,0 +1,144 @@
+"""Deletion of expired tokens from the database."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+
+from gafaelfawr.models.history import TokenChange, TokenChangeHistoryEntry
+from gafaelfawr.storage.history import TokenChangeHistoryStore
+from gafaelfawr.storage.token import TokenDatabaseStore
+
+if TYPE_CHECKING:
+    from typing import Callable, Optional
+
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from structlog.stdlib import BoundLogger
+
+    from gafaelfawr.config import TokenSweeperConfig
+    from gafaelfawr.models.token import TokenInfo
+
+__all__ = ["TokenSweeper"]
+
+
+class TokenSweeper:
+    """Deletes expired tokens from the database in bounded batches.
+
+    Redis expires token data on its own, but the rows in the token and
+    subtoken tables are otherwise kept forever.  The sweeper deletes expired
+    rows a batch at a time, each in its own short transaction and with a
+    pause between batches, so that it never holds locks for long or competes
+    with logins and token creation.  Each deleted token is recorded in the
+    token change history in the same transaction.  It can be run once, as by
+    the ``gafaelfawr sweep`` command, or periodically in the background.
+
+    Parameters
+    ----------
+    config : `gafaelfawr.config.TokenSweeperConfig`
+        Configuration for the sweeper.
+    session_factory : `typing.Callable`
+        Factory for database sessions used for deletes.
+    logger : `structlog.stdlib.BoundLogger`
+        Logger for results and failures.
+    """
+
+    def __init__(
+        self,
+        config: TokenSweeperConfig,
+        session_factory: Callable[[], AsyncSession],
+        logger: BoundLogger,
+    ) -> None:
+        self._config = config
+        self._session_factory = session_factory
+        self._logger = logger
+        self._sweeper: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    async def sweep(self) -> int:
+        """Delete all tokens that have expired.
+
+        Returns
+        -------
+        count : `int`
+            The number of tokens deleted.
+        """
+        now = datetime.now(tz=timezone.utc)
+        count = 0
+        while not self._stopping:
+            async with self._session_factory() as session:
+                async with session.begin():
+                    store = TokenDatabaseStore(session)
+                    deleted = await store.delete_expired(
+                        now, self._config.batch_size
+                    )
+                    history = [self._build_expire_entry(i) for i in deleted]
+                    history_store = TokenChangeHistoryStore(session)
+                    await history_store.add_many(history)
+            count += len(deleted)
+            if len(deleted) < self._config.batch_size:
+                break
+            await asyncio.sleep(self._config.delay)
+        self._logger.info("Deleted expired tokens", count=count)
+        return count
+
+    @staticmethod
+    def _build_expire_entry(info: TokenInfo) -> TokenChangeHistoryEntry:
+        """Build the history entry for the deletion of an expired token.
+
+        The change is recorded as happening when the token expired.  There
+        is no user or IP address responsible for it.
+        """
+        assert info.expires
+        return TokenChangeHistoryEntry(
+            token=info.token,
+            username=info.username,
+            token_type=info.token_type,
+            token_name=info.token_name,
+            parent=info.parent,
+            scopes=",".join(sorted(info.scopes)) if info.scopes else None,
+            service=info.service,
+            expires=info.expires,
+            action=TokenChange.expire,
+            event_time=info.expires,
+        )
+
+    async def start(self) -> None:
+        """Start the background task that periodically deletes tokens."""
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._sweeper = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task.
+
+        A sweep in progress is stopped after the current batch.
+        """
+        if self._sweeper and self._wakeup:
+            self._stopping = True
+            self._wakeup.set()
+            await self._sweeper
+            self._sweeper = None
+            self._wakeup = None
+
+    async def _run(self) -> None:
+        """Delete expired tokens every interval until stopped.
+
+        The task is stopped by setting a flag rather than by cancellation so
+        that a delete is never interrupted.  Errors are logged and the sweep
+        is retried at the next interval.
+        """
+        assert self._wakeup
+        while not self._stopping:
+            try:
+                await self.sweep()
+            except Exception as e:
+                msg = "Cannot delete expired tokens"
+                self._logger.error(msg, error=str(e))
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), self._config.interval
+                )
+            except asyncio.TimeoutError:
+                pass
@@ -5,15 +5,29 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from typing import TYPE_CHECKING
 
+from sqlalchemy import (
+    String,
+    and_,
+    bindparam,
+    column,
+    delete,
+    or_,
+    update,
+    values,
+)
+from sqlalchemy.future import select
+
 from gafaelfawr.exceptions import DeserializeException, DuplicateTokenNameError
-from gafaelfawr.models.token import TokenInfo, TokenType
+from gafaelfawr.models.token import TokenCursor, TokenInfo, TokenType
+from gafaelfawr.schema.base import UTCDateTime
 from gafaelfawr.schema.subtoken import Subtoken
 from gafaelfawr.schema.token import Token as SQLToken
 
 if TYPE_CHECKING:
-    from typing import List, Optional
+    from typing import AsyncIterator, Dict, List, Mapping, Optional, Set, Tuple
 
-    from sqlalchemy.orm import Session
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.sql.expression import CTE, ColumnElement
     from structlog.stdlib import BoundLogger
 
     from gafaelfawr.models.token import Token, TokenData
@@ -33,14 +47,14 @@ class TokenDatabaseStore:
 
     Parameters
     ----------
-    session : `sqlalchemy.orm.Session`
+    session : `sqlalchemy.ext.asyncio.AsyncSession`
         The underlying database session.
     """
 
-    def __init__(self, session: Session) -> None:
+    def __init__(self, session: AsyncSession) -> None:
         self._session = session
 
-    def add(
+    async def add(
         self,
         data: TokenData,
         *,
@@ -67,14 +81,7 @@ class TokenDatabaseStore:
             The user already has a token by that name.
         """
         if token_name:
-            name_conflict = (
-                self._session.query(SQLToken.token)
-                .filter_by(username=data.username, token_name=token_name)
-                .scalar()
-            )
-            if name_conflict:
-                msg = f"Token name {token_name} already used"
-                raise DuplicateTokenNameError(msg)
+            await self._check_name_conflict(data.username, token_name)
         new = SQLToken(
             token=data.token.key,
             username=data.username,
@@ -90,12 +97,36 @@ class TokenDatabaseStore:
             subtoken = Subtoken(parent=parent, child=data.token.key)
             self._session.add(subtoken)
 
-    def delete(self, key: str) -> bool:
-        """Delete a token.
+    async def delete_many(self, keys: List[str]) -> int:
+        """Delete several tokens with a single statement.
+
+        Unlike `delete_tree`, children of the deleted tokens are kept.  As
+        with `delete_expired`, the subtoken entries are updated directly.
 
         Parameters
         ----------
-        token : `str`
+        keys : List[`str`]
+            The keys of the tokens to delete.
+
+        Returns
+        -------
+        count : `int`
+            The number of tokens deleted.
+        """
+        if not keys:
+            return 0
+        return await self._delete_keys(keys)
+
+    async def delete_tree(self, key: str) -> bool:
+        """Delete a token and all of its descendants.
+
+        The descendants are found with a recursive query over the subtoken
+        table, and the token and all of its descendants are deleted with a
+        single statement.
+
+        Parameters
+        ----------
+        key : `str`
             The key of the token to delete.
 
         Returns
@@ -103,9 +134,107 @@ class TokenDatabaseStore:
         success : `bool`
             Whether the token was found to be deleted.
         """
-        return self._session.query(SQLToken).filter_by(token=key).delete() >= 1
+        tree = self._descendants(key)
+        stmt = (
+            delete(SQLToken)
+            .where(
+                or_(
+                    SQLToken.token == key,
+                    SQLToken.token.in_(select(tree.c.child)),
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await self._session.execute(stmt)
+        return result.rowcount >= 1
+
+    async def delete_expired(
+        self, now: datetime, limit: int
+    ) -> List[TokenInfo]:
+        """Delete a batch of expired tokens.
+
+        Rows that another transaction has locked are skipped rather than
+        waited for, so that this never blocks changes to active tokens.  The
+        subtoken entries for the deleted tokens are deleted as well, and
+        entries naming a deleted token as their parent are cleared.
+
+        Parameters
+        ----------
+        now : `datetime.datetime`
+            Delete tokens that expired at or before this time.
+        limit : `int`
+            Delete at most this many tokens.
+
+        Returns
+        -------
+        deleted : List[`gafaelfawr.models.token.TokenInfo`]
+            Information about each deleted token, including its parent.
+        """
+        expired = (
+            select(SQLToken, Subtoken.parent)
+            .where(SQLToken.expires <= now)
+            .join(Subtoken, Subtoken.child == SQLToken.token, isouter=True)
+            .limit(limit)
+            .with_for_update(skip_locked=True, of=SQLToken)
+        )
+        result = await self._session.execute(expired)
+        deleted = []
+        for token, parent in result.all():
+            info = TokenInfo.from_orm(token)
+            info.parent = parent
+            deleted.append(info)
+        if deleted:
+            await self._delete_keys([i.token for i in deleted])
+        return deleted
+
+    async def get_descendants(self, key: str) -> List[TokenInfo]:
+        """Return information about all descendants of a token.
+
+        This includes the children of the token, their children, and so on,
+        found with a single recursive query over the subtoken table.
+
+        Parameters
+        ----------
+        key : `str`
+            The key of the token.
 
-    def get_info(self, key: str) -> Optional[TokenInfo]:
+        Returns
+        -------
+        descendants : List[`gafaelfawr.models.token.TokenInfo`]
+            Information about each descendant, including its parent.
+        """
+        tree = self._descendants(key)
+        stmt = select(SQLToken, tree.c.parent).join(
+            tree, tree.c.child == SQLToken.token
+        )
+        result = await self._session.execute(stmt)
+        descendants = []
+        for token, parent in result.all():
+            info = TokenInfo.from_orm(token)
+            info.parent = parent
+            descendants.append(info)
+        return descendants
+
+    async def get_existing_keys(self, keys: List[str]) -> Set[str]:
+        """Determine which of several tokens are in the database.
+
+        Parameters
+        ----------
+        keys : List[`str`]
+            The keys of the tokens.
+
+        Returns
+        -------
+        existing : Set[`str`]
+            The subset of ``keys`` that have a database row.
+        """
+        if not keys:
+            return set()
+        stmt = select(SQLToken.token).where(SQLToken.token.in_(keys))
+        result = await self._session.execute(stmt)
+        return set(result.scalars().all())
+
+    async def get_info(self, key: str) -> Optional[TokenInfo]:
         """Return information about a token.
 
         Parameters
@@ -127,12 +256,12 @@ class TokenDatabaseStore:
         only one database query without fancy ORM mappings at the cost of some
         irritating mangling of the return value.
         """
-        result = (
-            self._session.query(SQLToken, Subtoken.parent)
-            .filter_by(token=key)
+        stmt = (
+            select(SQLToken, Subtoken.parent)
+            .where(SQLToken.token == key)
             .join(Subtoken, Subtoken.child == SQLToken.token, isouter=True)
-            .one_or_none()
         )
+        result = (await self._session.execute(stmt)).one_or_none()
         if result:
             info = TokenInfo.from_orm(result[0])
             info.parent = result[1]
@@ -140,7 +269,7 @@ class TokenDatabaseStore:
         else:
             return None
 
-    def get_internal_token_key(
+    async def get_internal_token_key(
         self, token_data: TokenData, service: str, scopes: List[str]
     ) -> Optional[str]:
         """Retrieve an existing internal child token.
@@ -160,19 +289,21 @@ class TokenDatabaseStore:
             The key of an existing internal child token with the desired
             properties, or `None` if none exist.
         """
-        return (
-            self._session.query(Subtoken.child)
-            .filter_by(parent=token_data.token.key)
+        stmt = (
+            select(Subtoken.child)
+            .where(Subtoken.parent == token_data.token.key)
             .join(SQLToken, Subtoken.child == SQLToken.token)
-            .filter(
+            .where(
                 SQLToken.token_type == TokenType.internal,
                 SQLToken.service == service,
                 SQLToken.scopes == ",".join(sorted(scopes)),
             )
-            .scalar()
         )
+        return await self._session.scalar(stmt)
 
-    def get_notebook_token_key(self, token_data: TokenData) -> Optional[str]:
+    async def get_notebook_token_key(
+        self, token_data: TokenData
+    ) -> Optional[str]:
         """Retrieve an existing notebook child token.
 
         Parameters
@@ -186,38 +317,98 @@ class TokenDatabaseStore:
             The key of an existing notebook child token, or `None` if none
             exist.
         """
-        return (
-            self._session.query(Subtoken.child)
-            .filter_by(parent=token_data.token.key)
+        stmt = (
+            select(Subtoken.child)
+            .where(Subtoken.parent == token_data.token.key)
             .join(SQLToken, Subtoken.child == SQLToken.token)
-            .filter(SQLToken.token_type == TokenType.notebook)
-            .scalar()
+            .where(SQLToken.token_type == TokenType.notebook)
         )
+        return await self._session.scalar(stmt)
 
-    def list(self, *, username: Optional[str] = None) -> List[TokenInfo]:
+    async def list(
+        self,
+        *,
+        username: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[TokenCursor] = None,
+    ) -> List[TokenInfo]:
         """List tokens.
 
+        Tokens are returned in order of creation time and then key, which
+        allows keyset pagination using the position of the last token
+        returned.
+
         Parameters
         ----------
         username : `str` or `None`
             Limit the returned tokens to ones for the given username.
+        limit : `int`, optional
+            Return at most this many tokens.
+        cursor : `gafaelfawr.models.token.TokenCursor`, optional
+            Only return tokens after this position.
 
         Returns
         -------
         tokens : List[`gafaelfawr.models.token.TokenInfo`]
             Information about the tokens.
         """
+        stmt = select(SQLToken)
         if username:
-            tokens = (
-                self._session.query(SQLToken)
-                .filter_by(username=username)
-                .order_by(SQLToken.token)
+            stmt = stmt.where(SQLToken.username == username)
+        if cursor:
+            stmt = stmt.where(
+                or_(
+                    SQLToken.created > cursor.created,
+                    and_(
+                        SQLToken.created == cursor.created,
+                        SQLToken.token > cursor.token,
+                    ),
+                )
             )
-        else:
-            tokens = self._session.query(SQLToken).order_by(SQLToken.token)
-        return [TokenInfo.from_orm(t) for t in tokens]
+        stmt = stmt.order_by(SQLToken.created, SQLToken.token)
+        if limit:
+            stmt = stmt.limit(limit)
+        result = await self._session.execute(stmt)
+        return [TokenInfo.from_orm(t) for t in result.scalars().all()]
 
-    def modify(
+    async def stream(
+        self,
+        *,
+        username: Optional[str] = None,
+        cursor: Optional[TokenCursor] = None,
+        batch_size: int,
+    ) -> AsyncIterator[TokenInfo]:
+        """Iterate over tokens without loading them all into memory.
+
+        Tokens are retrieved a batch at a time with the same ordering and
+        keyset pagination as `list`, so only one batch is held in memory and
+        no database cursor is held open between batches.
+
+        Parameters
+        ----------
+        username : `str` or `None`
+            Limit the returned tokens to ones for the given username.
+        cursor : `gafaelfawr.models.token.TokenCursor`, optional
+            Only return tokens after this position.
+        batch_size : `int`
+            Number of tokens to retrieve from the database at a time.
+
+        Yields
+        ------
+        token : `gafaelfawr.models.token.TokenInfo`
+            Information about each token.
+        """
+        while True:
+            tokens = await self.list(
+                username=username, limit=batch_size, cursor=cursor
+            )
+            for token in tokens:
+                yield token
+            if len(tokens) < batch_size:
+                break
+            cursor = TokenCursor.from_info(tokens[-1])
+
+    async def modify(
         self,
         key: str,
         *,
@@ -252,18 +443,12 @@ class TokenDatabaseStore:
         gafaelfawr.exceptions.DuplicateTokenNameError
             The user already has a token by that name.
         """
-        token = self._session.query(SQLToken).filter_by(token=key).scalar()
+        stmt = select(SQLToken).where(SQLToken.token == key)
+        token = await self._session.scalar(stmt)
         if not token:
             return None
         if token_name:
-            name_conflict = (
-                self._session.query(SQLToken.token)
-                .filter_by(username=token.username, token_name=token_name)
-                .scalar()
-            )
-            if name_conflict:
-                msg = f"Token name {token_name} already used"
-                raise DuplicateTokenNameError(msg)
+            await self._check_name_conflict(token.username, token_name)
             token.token_name = token_name
         if scopes:
             token.scopes = ",".join(sorted(scopes))
@@ -273,6 +458,135 @@ class TokenDatabaseStore:
             token.expires = expires
         return TokenInfo.from_orm(token)
 
+    async def update_last_used(self, usage: Mapping[str, datetime]) -> None:
+        """Record when tokens were last used.
+
+        All of the updates are made with a single statement.  A token's last
+        use time is never moved backwards, so updates from several processes
+        can be applied in any order.
+
+        Parameters
+        ----------
+        usage : Mapping[`str`, `datetime.datetime`]
+            Mapping of token keys to the time each token was last used.
+        """
+        if not usage:
+            return
+        if self._session.bind.dialect.name == "postgresql":
+            # Use UPDATE ... FROM (VALUES ...), which PostgreSQL runs as a
+            # single join against the table.
+            data = values(
+                column("token", String),
+                column("last_used", UTCDateTime),
+                name="usage",
+            ).data(list(usage.items()))
+            stmt = (
+                update(SQLToken)
+                .where(SQLToken.token == data.c.token)
+                .where(self._is_newer(data.c.last_used))
+                .values(last_used=data.c.last_used)
+            )
+            await self._session.execute(stmt)
+        else:
+            # Other databases may not support UPDATE ... FROM, so use a
+            # single statement with many sets of parameters.
+            last_used = bindparam("used_time", type_=UTCDateTime)
+            stmt = (
+                update(SQLToken)
+                .where(SQLToken.token == bindparam("used_token"))
+                .where(self._is_newer(last_used))
+                .values(last_used=last_used)
+            )
+            params = [
+                {"used_token": k, "used_time": v} for k, v in usage.items()
+            ]
+            await self._session.execute(stmt, params)
+
+    async def _check_name_conflict(
+        self, username: str, token_name: str
+    ) -> None:
+        """Raise an exception if the user already has a token by that name.
+
+        Raises
+        ------
+        gafaelfawr.exceptions.DuplicateTokenNameError
+            The user already has a token by that name.
+        """
+        stmt = select(SQLToken.token).where(
+            SQLToken.username == username, SQLToken.token_name == token_name
+        )
+        if await self._session.scalar(stmt):
+            msg = f"Token name {token_name} already used"
+            raise DuplicateTokenNameError(msg)
+
+    async def _delete_keys(self, keys: List[str]) -> int:
+        """Delete tokens and their subtoken entries by key.
+
+        The subtoken entries for the deleted tokens are deleted, and entries
+        naming a deleted token as their parent are cleared, rather than
+        relying on the database to enforce the foreign key constraints.
+        """
+        options = {"synchronize_session": False}
+        subtoken_stmt = delete(Subtoken).where(Subtoken.child.in_(keys))
+        await self._session.execute(subtoken_stmt.execution_options(**options))
+        parent_stmt = (
+            update(Subtoken)
+            .where(Subtoken.parent.in_(keys))
+            .values(parent=None)
+        )
+        await self._session.execute(parent_stmt.execution_options(**options))
+        stmt = delete(SQLToken).where(SQLToken.token.in_(keys))
+        result = await self._session.execute(stmt.execution_options(**options))
+        return result.rowcount
+
+    @staticmethod
+    def _descendants(key: str) -> CTE:
+        """Build a recursive query for the descendants of a token.
+
+        Parameters
+        ----------
+        key : `str`
+            The key of the token.
+
+        Returns
+        -------
+        tree : `sqlalchemy.sql.expression.CTE`
+            Common table expression with ``child`` and ``parent`` columns
+            holding each descendant and its parent.
+        """
+        # Nest the common table expression inside the statement that uses it
+        # so that a DELETE using it still starts with DELETE.  Otherwise,
+        # some drivers, including SQLite, do not report the number of deleted
+        # rows.
+        tree = (
+            select(Subtoken.child, Subtoken.parent)
+            .where(Subtoken.parent == key)
+            .cte("descendants", recursive=True, nesting=True)
+        )
+        return tree.union_all(
+            select(Subtoken.child, Subtoken.parent).join(
+                tree, Subtoken.parent == tree.c.child
+            )
+        )
+
+    @staticmethod
+    def _is_newer(last_used: ColumnElement) -> ColumnElement:
+        """Build a condition that a last use time is newer than the stored one.
+
+        Parameters
+        ----------
+        last_used : `sqlalchemy.sql.expression.ColumnElement`
+            The new last use time.
+
+        Returns
+        -------
+        condition : `sqlalchemy.sql.expression.ColumnElement`
+            The condition for use in a WHERE clause.
+        """
+        return or_(
+            SQLToken.last_used.is_(None), SQLToken.last_used < last_used
+        )
+
 
 class TokenRedisStore:
     """Stores and retrieves token data in Redis.
@@ -286,6 +600,14 @@ class TokenRedisStore:
     use those keys directly as tokens and still needs access to the stored
     Redis data plus the decryption key to be able to reconstruct a token.
 
+    Notebook and internal tokens are also indexed by their parent token and
+    the properties used to find an existing child token, so that the child
+    can be found without a database query.  The index entry holds only the
+    key of the child and expires at the same time as the child.  A second
+    entry keyed by the child holds the key of its parent and, for internal
+    tokens, the service, so that the parent of a child token can be
+    recovered from Redis.
+
     Parameters
     ----------
     storage : `gafaelfawr.storage.base.RedisStorage`
@@ -302,19 +624,134 @@ class TokenRedisStore:
         self._storage = storage
         self._logger = logger
 
-    async def delete(self, key: str) -> None:
-        """Delete a token from Redis.
+    async def delete_many(self, tokens: List[TokenInfo]) -> None:
+        """Delete several tokens and their index entries from Redis.
 
-        This only requires the token key, not the full token, so that users
-        can delete tokens for their account without needing possession of the
-        token.
+        All of the keys are removed with a single Redis command, so this is
+        suitable for revoking a large tree of child tokens.
 
         Parameters
         ----------
-        key : `str`
-            The key portion of the token.
+        tokens : List[`gafaelfawr.models.token.TokenInfo`]
+            The tokens to delete.  The index entry used to find each token
+            from its parent is also deleted.
+        """
+        keys = []
+        for info in tokens:
+            keys.append(f"token:{info.token}")
+            if not info.parent:
+                continue
+            keys.append(self._parent_key(info.token))
+            if info.token_type == TokenType.notebook:
+                index = self._index_key(info.parent, TokenType.notebook)
+                keys.append(index)
+            elif info.token_type == TokenType.internal and info.service:
+                index = self._index_key(
+                    info.parent, TokenType.internal, info.service, info.scopes
+                )
+                keys.append(index)
+        await self._storage.delete_many(keys)
+
+    async def delete_keys(self, keys: List[str]) -> None:
+        """Delete the data for several tokens by key.
+
+        Index entries pointing to the tokens are left to expire.
+
+        Parameters
+        ----------
+        keys : List[`str`]
+            The keys of the tokens.
+        """
+        await self._storage.delete_many([f"token:{k}" for k in keys])
+
+    async def get_existing_keys(self, keys: List[str]) -> Set[str]:
+        """Determine which of several tokens are in Redis.
+
+        Parameters
+        ----------
+        keys : List[`str`]
+            The keys of the tokens.
+
+        Returns
+        -------
+        existing : Set[`str`]
+            The subset of ``keys`` that have data in Redis.
+        """
+        redis_keys = [f"token:{k}" for k in keys]
+        exists = await self._storage.exists_many(redis_keys)
+        return {k for k, e in zip(keys, exists) if e}
+
+    async def get_parents(
+        self, keys: List[str]
+    ) -> Dict[str, Tuple[str, Optional[str]]]:
+        """Retrieve the parents of several child tokens.
+
+        The parents are retrieved with a single Redis command.
+
+        Parameters
+        ----------
+        keys : List[`str`]
+            The keys of notebook and internal tokens.
+
+        Returns
+        -------
+        parents : Dict[`str`, Tuple[`str`, `str` or `None`]]
+            Mapping of the keys of the children to the key of their parent
+            and, for internal tokens, their service.  Children without a
+            parent entry are omitted.
+        """
+        parent_keys = [self._parent_key(k) for k in keys]
+        values = await self._storage.get_index_many(parent_keys)
+        parents: Dict[str, Tuple[str, Optional[str]]] = {}
+        for key, value in zip(keys, values):
+            if value:
+                parent, _, service = value.partition(":")
+                parents[key] = (parent, service or None)
+        return parents
+
+    async def get_internal_token_key(
+        self, token_data: TokenData, service: str, scopes: List[str]
+    ) -> Optional[str]:
+        """Retrieve the key of an existing internal child token.
+
+        Parameters
+        ----------
+        token_data : `gafaelfawr.models.token.TokenData`
+            The data for the parent token.
+        service : `str`
+            The service to which the internal token is delegated.
+        scopes : List[`str`]
+            The scopes of the delegated token.
+
+        Returns
+        -------
+        key : `str` or `None`
+            The key of the indexed internal child token with the desired
+            properties, or `None` if there is no index entry.
+        """
+        index = self._index_key(
+            token_data.token.key, TokenType.internal, service, scopes
+        )
+        return await self._storage.get_index(index)
+
+    async def get_notebook_token_key(
+        self, token_data: TokenData
+    ) -> Optional[str]:
+        """Retrieve the key of an existing notebook child token.
+
+        Parameters
+        ----------
+        token_data : `gafaelfawr.models.token.TokenData`
+            The data for the parent token.
+
+        Returns
+        -------
+        key : `str` or `None`
+            The key of the indexed notebook child token, or `None` if there is
+            no index entry.
         """
-        await self._storage.delete(f"token:{key}")
+        index = self._index_key(token_data.token.key, TokenType.notebook)
+        return await self._storage.get_index(index)
 
     async def get_data(self, token: Token) -> Optional[TokenData]:
         """Retrieve the data for a token from Redis.
@@ -368,16 +805,84 @@ class TokenRedisStore:
             return None
         return data
 
-    async def store_data(self, data: TokenData) -> None:
+    async def scan(
+        self, batch_size: int
+    ) -> AsyncIterator[Dict[str, Optional[TokenData]]]:
+        """Iterate over all tokens in Redis in batches.
+
+        Parameters
+        ----------
+        batch_size : `int`
+            Approximate number of tokens to retrieve at a time.
+
+        Yields
+        ------
+        tokens : Dict[`str`, `gafaelfawr.models.token.TokenData` or `None`]
+            Mapping of token keys to their data, or to `None` if the data
+            could not be decrypted or parsed.  A token may appear in more than
+            one batch.
+        """
+        async for redis_keys in self._storage.scan("token:*", batch_size):
+            data = await self._storage.get_many(redis_keys)
+            yield {k[len("token:") :]: v for k, v in data.items()}
+
+    async def store_data(
+        self,
+        data: TokenData,
+        *,
+        parent: Optional[str] = None,
+        service: Optional[str] = None,
+    ) -> None:
         """Store the data for a token.
 
         Parameters
         ----------
         data : `gafaelfawr.models.token.TokenData`
             The data underlying that token.
+        parent : `str`, optional
+            The key of the parent of this token.  If given and the token is a
+            notebook or internal token, also store the index entry used to
+            find this token from its parent and the entry recording its
+            parent.
+        service : `str`, optional
+            The service for an internal token.
         """
         lifetime = None
         if data.expires:
             now = datetime.now(tz=timezone.utc)
             lifetime = int((data.expires - now).total_seconds())
-        await self._storage.store(f"token:{data.token.key}", data, lifetime)
+        indexes = None
+        parent_key = self._parent_key(data.token.key)
+        if parent and data.token_type == TokenType.notebook:
+            index = self._index_key(parent, TokenType.notebook)
+            indexes = {index: data.token.key, parent_key: parent}
+        elif parent and data.token_type == TokenType.internal and service:
+            index = self._index_key(
+                parent, TokenType.internal, service, data.scopes
+            )
+            indexes = {
+                index: data.token.key,
+                parent_key: f"{parent}:{service}",
+            }
+        await self._storage.store(
+            f"token:{data.token.key}", data, lifetime, indexes=indexes
+        )
+
+    @staticmethod
+    def _index_key(
+        parent: str,
+        token_type: TokenType,
+        service: Optional[str] = None,
+        scopes: Optional[List[str]] = None,
+    ) -> str:
+        """Construct the Redis key of a child token index entry."""
+        if token_type == TokenType.internal:
+            scope = ",".join(sorted(scopes)) if scopes else ""
+            return f"subtoken:{parent}:internal:{service}:{scope}"
+        else:
+            return f"subtoken:{parent}:{token_type.value}"
+
+    @staticmethod
+    def _parent_key(key: str) -> str:
+        """Construct the Redis key of the parent entry of a child token."""
+        return f"subtoken-parent:{key}"
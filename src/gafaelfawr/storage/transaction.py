@@ -8,39 +8,39 @@ if TYPE_CHECKING:
     from types import TracebackType
     from typing import Literal, Optional
 
-    from sqlalchemy.orm import Session
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 __all__ = ["Transaction", "TransactionManager"]
 
 
 class Transaction:
-    """Returned by a TransactionManager as a context manager.
+    """Returned by a TransactionManager as an async context manager.
 
     This will automatically commit the transaction at the end of the context
     block and automatically roll back if there was an exception.
 
     Parameters
     ----------
-    session : `sqlalchemy.orm.Session`
+    session : `sqlalchemy.ext.asyncio.AsyncSession`
         The database session.
     """
 
-    def __init__(self, session: Session) -> None:
+    def __init__(self, session: AsyncSession) -> None:
         self._session = session
 
-    def __enter__(self) -> None:
+    async def __aenter__(self) -> None:
         pass
 
-    def __exit__(
+    async def __aexit__(
         self,
         exc_type: Optional[type],
         exc_val: Optional[Exception],
         exc_tb: Optional[TracebackType],
     ) -> Literal[False]:
         if exc_type:
-            self._session.rollback()
+            await self._session.rollback()
         else:
-            self._session.commit()
+            await self._session.commit()
         return False
 
 
@@ -49,11 +49,11 @@ class TransactionManager:
 
     Parameters
     ----------
-    session : `sqlalchemy.orm.Session`
+    session : `sqlalchemy.ext.asyncio.AsyncSession`
         The database session.
     """
 
-    def __init__(self, session: Session) -> None:
+    def __init__(self, session: AsyncSession) -> None:
         self._session = session
 
     def transaction(self) -> Transaction:
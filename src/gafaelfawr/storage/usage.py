@@ -0,0 +1,82 @@
+"""Write-behind tracking of when tokens were last used."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Tuple
+
+from gafaelfawr.storage.batch import BatchWriter
+from gafaelfawr.storage.token import TokenDatabaseStore
+
+if TYPE_CHECKING:
+    from typing import Callable, List, Optional
+
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from structlog.stdlib import BoundLogger
+
+    from gafaelfawr.config import TokenUsageConfig
+
+__all__ = ["TokenUsageTracker"]
+
+
+class TokenUsageTracker(BatchWriter[Tuple[str, datetime]]):
+    """Records token use in memory and writes it to the database in batches.
+
+    Updating the database on every authentication would add a write to the
+    hottest path in Gafaelfawr.  Instead, the last use time of each token is
+    kept in memory, coalescing repeated uses of the same token, and a
+    background task periodically writes the pending times to the database in
+    bulk.  Any remaining times are written when the tracker is stopped.
+
+    Parameters
+    ----------
+    config : `gafaelfawr.config.TokenUsageConfig`
+        Configuration for usage tracking.
+    session_factory : `typing.Callable`
+        Factory for database sessions used for writes.
+    logger : `structlog.stdlib.BoundLogger`
+        Logger for dropped usage and write failures.
+    """
+
+    description = "token usage"
+
+    def __init__(
+        self,
+        config: TokenUsageConfig,
+        session_factory: Callable[[], AsyncSession],
+        logger: BoundLogger,
+    ) -> None:
+        super().__init__(
+            queue_size=config.queue_size,
+            batch_size=config.batch_size,
+            flush_interval=config.flush_interval,
+            session_factory=session_factory,
+            logger=logger,
+        )
+
+    @property
+    def pending(self) -> int:
+        """Number of tokens whose usage has not yet been written."""
+        return self.stats.queued
+
+    def record(self, key: str, when: Optional[datetime] = None) -> None:
+        """Record that a token was used.
+
+        Parameters
+        ----------
+        key : `str`
+            The key of the token.
+        when : `datetime.datetime`, optional
+            When the token was used.  Defaults to now.
+        """
+        if not when:
+            when = datetime.now(tz=timezone.utc)
+        self.add((key, when))
+
+    def _key(self, record: Tuple[str, datetime]) -> str:
+        return record[0]
+
+    async def _write(
+        self, session: AsyncSession, batch: List[Tuple[str, datetime]]
+    ) -> None:
+        await TokenDatabaseStore(session).update_last_used(dict(batch))
@@ -2,13 +2,18 @@
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING
 from urllib.parse import urljoin
 
 import jwt
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 from httpx import RequestError
 from jwt.exceptions import InvalidIssuerError
 
@@ -25,15 +30,406 @@ from gafaelfawr.models.oidc import OIDCVerifiedToken
 from gafaelfawr.util import base64_to_number
 
 if TYPE_CHECKING:
-    from typing import Any, Dict, List, Mapping, Optional
+    from typing import Any, Dict, List, Mapping, Optional, Tuple
 
-    from httpx import AsyncClient
+    from httpx import AsyncClient, Response
     from structlog.stdlib import BoundLogger
 
     from gafaelfawr.config import VerifierConfig
     from gafaelfawr.tokens import OIDCToken
 
-__all__ = ["TokenVerifier"]
+__all__ = [
+    "JWKSCache",
+    "TokenVerifier",
+    "VerifiedTokenCache",
+    "VerifiedTokenCacheStats",
+]
+
+_MAX_AGE_REGEX = re.compile(r"max-age=(\d+)")
+"""Regex matching the max-age directive of a Cache-Control header."""
+
+
+def _cache_lifetime(response: Response, minimum: float) -> float:
+    """Determine how long a response may be cached.
+
+    Many providers send no caching headers at all, so the response is cached
+    for at least the given minimum lifetime, or longer if its ``max-age``
+    directive allows.
+
+    Parameters
+    ----------
+    response : `httpx.Response`
+        The response.
+    minimum : `float`
+        Minimum number of seconds for which to cache the response.
+
+    Returns
+    -------
+    lifetime : `float`
+        Number of seconds for which the response may be cached.
+    """
+    cache_control = response.headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return minimum
+    match = _MAX_AGE_REGEX.search(cache_control)
+    return max(int(match.group(1)), minimum) if match else minimum
+
+
+@dataclass
+class _IssuerKeys:
+    """The parsed keys of an issuer."""
+
+    keys: Dict[str, Optional[rsa.RSAPublicKey]]
+    """Mapping of key IDs to keys, or to `None` for other algorithms."""
+
+    algorithms: Dict[str, Optional[str]] = field(default_factory=dict)
+    """Mapping of key IDs to the algorithm of the key."""
+
+    fetched: float = 0
+    """When the keys were retrieved, from `time.monotonic`."""
+
+    expires: float = 0
+    """When the keys may no longer be used, from `time.monotonic`."""
+
+
+class JWKSCache:
+    """Process-wide cache of the signing keys of OpenID Connect issuers.
+
+    Keys are retrieved from the JWKS of the issuer, found via its OpenID
+    Connect discovery metadata, and are kept as parsed key objects.  Both the
+    metadata and the JWKS are cached for a minimum lifetime, or for longer if
+    the ``Cache-Control`` header of the upstream response allows.  A request
+    for a key ID that is not in the cached JWKS forces a refresh, so that key
+    rotation is noticed immediately, unless the keys were retrieved less than
+    the refresh interval ago, in which case the key ID is rejected.  Tokens
+    with random key IDs therefore cannot cause a fetch on every request.
+
+    Refreshes are single-flight: concurrent requests for keys of the same
+    issuer wait for one upstream fetch and share its result.
+
+    Parameters
+    ----------
+    http_client : `httpx.AsyncClient`
+        The client to use for retrieving metadata and keys.
+    lifetime : `float`
+        Minimum number of seconds for which to cache metadata and keys.
+    refresh_interval : `float`
+        Minimum number of seconds between retrievals of the keys of an issuer
+        forced by an unknown key ID.
+    """
+
+    def __init__(
+        self,
+        http_client: AsyncClient,
+        *,
+        lifetime: float,
+        refresh_interval: float,
+    ) -> None:
+        self._http_client = http_client
+        self._lifetime = lifetime
+        self._refresh_interval = refresh_interval
+        self._keys: Dict[str, _IssuerKeys] = {}
+        self._jwks_uris: Dict[str, Tuple[Optional[str], float]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def clear(self) -> None:
+        """Drop all cached metadata and keys."""
+        self._keys.clear()
+        self._jwks_uris.clear()
+
+    async def get_key(self, issuer_url: str, key_id: str) -> rsa.RSAPublicKey:
+        """Get a signing key of an issuer.
+
+        Parameters
+        ----------
+        issuer_url : `str`
+            The URL of the issuer.
+        key_id : `str`
+            The key ID to retrieve for the issuer in question.
+
+        Returns
+        -------
+        key : `cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicKey`
+            The public key.
+
+        Raises
+        ------
+        gafaelfawr.exceptions.FetchKeysException
+            Unable to retrieve the key set for the specified issuer.
+        gafaelfawr.exceptions.UnknownAlgorithException
+            The requested key ID was found, but is for an unsupported
+            algorithm.
+        gafaelfawr.exceptions.UnknownKeyIdException
+            The requested key ID was not found in that issuer's JWKS.
+        """
+        now = time.monotonic()
+        keys = self._keys.get(issuer_url)
+        if not keys or keys.expires <= now:
+            keys = await self._refresh(issuer_url, now)
+        elif key_id not in keys.keys:
+            if keys.fetched + self._refresh_interval <= now:
+                keys = await self._refresh(issuer_url, now)
+        if key_id not in keys.keys:
+            msg = f"Issuer {issuer_url} has no kid {key_id}"
+            raise UnknownKeyIdException(msg)
+        key = keys.keys[key_id]
+        if not key:
+            msg = (
+                f"Issuer {issuer_url} kid {key_id} had algorithm"
+                f" {keys.algorithms[key_id]} not {ALGORITHM}"
+            )
+            raise UnknownAlgorithmException(msg)
+        return key
+
+    async def _refresh(self, issuer_url: str, start: float) -> _IssuerKeys:
+        """Retrieve the keys of an issuer unless another request just did.
+
+        Parameters
+        ----------
+        issuer_url : `str`
+            The URL of the issuer.
+        start : `float`
+            When the caller decided a refresh was needed.  If the keys were
+            retrieved after this time while waiting for the lock, they are
+            returned without another fetch.
+
+        Returns
+        -------
+        keys : `_IssuerKeys`
+            The keys of the issuer.
+        """
+        lock = self._locks.setdefault(issuer_url, asyncio.Lock())
+        async with lock:
+            keys = self._keys.get(issuer_url)
+            if keys and keys.fetched >= start:
+                return keys
+            jwks, lifetime = await self._get_jwks(issuer_url)
+            keys = self._parse_keys(jwks)
+            keys.fetched = time.monotonic()
+            keys.expires = keys.fetched + lifetime
+            self._keys[issuer_url] = keys
+            return keys
+
+    @staticmethod
+    def _parse_keys(jwks: List[Dict[str, str]]) -> _IssuerKeys:
+        """Convert keys in JWKS format to key objects.
+
+        Raises
+        ------
+        gafaelfawr.exceptions.FetchKeysException
+            One of the keys is malformed.
+        """
+        keys = _IssuerKeys(keys={})
+        for jwk in jwks:
+            try:
+                key_id = jwk.get("kid")
+                if not key_id:
+                    continue
+                keys.algorithms[key_id] = jwk.get("alg")
+                if jwk.get("alg") != ALGORITHM:
+                    keys.keys[key_id] = None
+                    continue
+                e = base64_to_number(jwk["e"])
+                n = base64_to_number(jwk["n"])
+            except Exception:
+                raise FetchKeysException("Malformed key in JWKS")
+            numbers = rsa.RSAPublicNumbers(e, n)
+            keys.keys[key_id] = numbers.public_key(backend=default_backend())
+        return keys
+
+    async def _get_jwks(
+        self, issuer_url: str
+    ) -> Tuple[List[Dict[str, str]], float]:
+        """Fetch the key set for an issuer.
+
+        Parameters
+        ----------
+        issuer_url : `str`
+            URL of the issuer.
+
+        Returns
+        -------
+        body : List[Dict[`str`, `str`]]
+            List of keys (in JWKS format) for the given issuer.
+        lifetime : `float`
+            Number of seconds for which the keys may be cached.
+
+        Raises
+        ------
+        gafaelfawr.exceptions.FetchKeysException
+            On failure to retrieve a set of keys from the issuer.
+        """
+        url = await self._get_jwks_uri(issuer_url)
+        if not url:
+            url = urljoin(issuer_url, ".well-known/jwks.json")
+
+        try:
+            r = await self._http_client.get(url)
+            if r.status_code != 200:
+                reason = f"{r.status_code} {r.reason_phrase}"
+                msg = f"Cannot retrieve keys from {url}: {reason}"
+                raise FetchKeysException(msg)
+        except RequestError:
+            raise FetchKeysException(f"Cannot retrieve keys from {url}")
+
+        try:
+            body = r.json()
+            return body["keys"], _cache_lifetime(r, self._lifetime)
+        except Exception:
+            msg = f"No keys property in JWKS metadata for {url}"
+            raise FetchKeysException(msg)
+
+    async def _get_jwks_uri(self, issuer_url: str) -> Optional[str]:
+        """Retrieve the JWKS URI for a given issuer.
+
+        Ask for the OpenID Connect metadata and determine the JWKS URI from
+        that.  The result is cached like the keys.
+
+        Parameters
+        ----------
+        issuer_url : `str`
+            URL of the issuer.
+
+        Returns
+        -------
+        url : `str` or `None`
+            URI for the JWKS of that issuer, or None if the OpenID Connect
+            metadata is not present.
+
+        Raises
+        ------
+        gafaelfawr.exceptions.FetchKeysException
+            If the OpenID Connect metadata doesn't contain the expected
+            parameter.
+        """
+        if issuer_url in self._jwks_uris:
+            jwks_uri, expires = self._jwks_uris[issuer_url]
+            if expires > time.monotonic():
+                return jwks_uri
+
+        url = urljoin(issuer_url, ".well-known/openid-configuration")
+        try:
+            r = await self._http_client.get(url)
+        except RequestError:
+            return None
+        lifetime = _cache_lifetime(r, self._lifetime)
+        if r.status_code != 200:
+            jwks_uri = None
+        else:
+            try:
+                jwks_uri = r.json()["jwks_uri"]
+            except Exception:
+                msg = f"No jwks_uri property in OIDC metadata for {issuer_url}"
+                raise FetchKeysException(msg)
+        if lifetime:
+            expires = time.monotonic() + lifetime
+            self._jwks_uris[issuer_url] = (jwks_uri, expires)
+        return jwks_uri
+
+
+@dataclass(frozen=True)
+class VerifiedTokenCacheStats:
+    """Counters for the behavior of a `VerifiedTokenCache`."""
+
+    hits: int
+    """Number of lookups satisfied from the cache."""
+
+    misses: int
+    """Number of lookups that required verifying the token."""
+
+    evictions: int
+    """Number of entries dropped to stay within the size limit."""
+
+    size: int
+    """Number of entries currently in the cache."""
+
+
+class VerifiedTokenCache:
+    """Per-process cache of verified internal JWTs.
+
+    OpenID Connect clients often present the same ID token to
+    ``/auth/userinfo`` many times.  Each worker keeps a bounded LRU cache of
+    the tokens it has recently verified, keyed by a SHA-256 hash of the
+    encoded token, so that repeated verification of the same token is a hash
+    lookup rather than an RSA signature check.  Entries are dropped when the
+    token expires.
+
+    JWTs issued by Gafaelfawr cannot be revoked, so no invalidation is
+    needed.  The cache belongs to the
+    `~gafaelfawr.factory.ProcessContext`, which is rebuilt if the
+    configuration (and thus the signing key) changes.
+
+    Parameters
+    ----------
+    size : `int`
+        Maximum number of verified tokens to cache.
+    """
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._entries: OrderedDict[bytes, OIDCVerifiedToken] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def stats(self) -> VerifiedTokenCacheStats:
+        """Current counters for the cache."""
+        return VerifiedTokenCacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            size=len(self._entries),
+        )
+
+    def clear(self) -> None:
+        """Drop all entries from the cache."""
+        self._entries.clear()
+
+    def get(self, encoded: str) -> Optional[OIDCVerifiedToken]:
+        """Retrieve a previously verified token.
+
+        Parameters
+        ----------
+        encoded : `str`
+            The encoded JWT.
+
+        Returns
+        -------
+        token : `gafaelfawr.models.oidc.OIDCVerifiedToken` or `None`
+            The verified token, or `None` if it is not cached or has expired.
+        """
+        digest = hashlib.sha256(encoded.encode()).digest()
+        token = self._entries.get(digest)
+        if not token:
+            self._misses += 1
+            return None
+        if token.claims["exp"] <= time.time():
+            del self._entries[digest]
+            self._misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self._hits += 1
+        return token
+
+    def store(self, token: OIDCVerifiedToken) -> None:
+        """Add a verified token to the cache.
+
+        Tokens without an ``exp`` claim are not cached.
+
+        Parameters
+        ----------
+        token : `gafaelfawr.models.oidc.OIDCVerifiedToken`
+            A token whose signature and claims have been verified.
+        """
+        if "exp" not in token.claims:
+            return
+        digest = hashlib.sha256(token.encoded.encode()).digest()
+        self._entries[digest] = token
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
 
 
 class TokenVerifier:
@@ -46,25 +442,38 @@ class TokenVerifier:
     ----------
     config : `gafaelfawr.config.VerifierConfig`
         The JWT Authorizer configuration.
-    http_client : `httpx.AsyncClient`
-        The client to use for making requests.
+    jwks_cache : `JWKSCache`
+        Process-wide cache of the signing keys of external issuers.
     logger : `structlog.BoundLogger`
         Logger to use to report status information.
+    token_cache : `VerifiedTokenCache`, optional
+        Process-wide cache of verified internal tokens.  If not given,
+        internal tokens are verified every time.
     """
 
     def __init__(
         self,
         config: VerifierConfig,
-        http_client: AsyncClient,
+        jwks_cache: JWKSCache,
         logger: BoundLogger,
+        token_cache: Optional[VerifiedTokenCache] = None,
     ) -> None:
         self._config = config
-        self._http_client = http_client
+        self._jwks_cache = jwks_cache
         self._logger = logger
+        self._token_cache = token_cache
+
+        # Verify with the key object so that PyJWT does not have to parse a
+        # PEM-encoded key for every token.  PyJWT accepts key objects at
+        # runtime, but its type annotations only allow str.
+        self._verify_key: Any = config.keypair.public_key
 
     def verify_internal_token(self, token: OIDCToken) -> OIDCVerifiedToken:
         """Verify a token issued by the internal issuer.
 
+        If a token cache was provided, a token that was already verified and
+        has not yet expired is returned from the cache.
+
         Parameters
         ----------
         token : `gafaelfawr.models.oidc.OIDCToken`
@@ -83,16 +492,23 @@ class TokenVerifier:
         gafaelfawr.exceptions.MissingClaimsException
             The token is missing required claims.
         """
+        if self._token_cache:
+            cached = self._token_cache.get(token.encoded)
+            if cached:
+                return cached
         try:
             payload = jwt.decode(
                 token.encoded,
-                self._config.keypair.public_key_as_pem().decode(),
+                self._verify_key,
                 algorithms=[ALGORITHM],
                 audience=self._config.aud,
             )
         except jwt.InvalidTokenError as e:
             raise InvalidTokenError(str(e))
-        return self._build_token(token.encoded, payload)
+        verified_token = self._build_token(token.encoded, payload)
+        if self._token_cache:
+            self._token_cache.store(verified_token)
+        return verified_token
 
     async def verify_oidc_token(self, token: OIDCToken) -> OIDCVerifiedToken:
         """Verifies the provided JWT from an OpenID Connect provider.
@@ -143,7 +559,10 @@ class TokenVerifier:
                 msg = f"kid {key_id} not allowed for {issuer_url}"
                 raise UnknownKeyIdException(msg)
 
-        key = await self._get_key_as_pem(issuer_url, key_id)
+        self._logger.debug("Getting key %s from %s", key_id, issuer_url)
+        # PyJWT accepts key objects at runtime, but its type annotations only
+        # allow str.
+        key: Any = await self._jwks_cache.get_key(issuer_url, key_id)
         payload = jwt.decode(
             token.encoded,
             key,
@@ -194,142 +613,3 @@ class TokenVerifier:
             username=claims[self._config.username_claim],
             uid=uid,
         )
-
-    async def _get_key_as_pem(self, issuer_url: str, key_id: str) -> str:
-        """Get the key for an issuer.
-
-        Gets a key as PEM, given the issuer and the request key ID.
-
-        Parameters
-        ----------
-        issuer_url : `str`
-            The URL of the issuer.
-        key_id : `str`
-            The key ID to retrieve for the issuer in question.
-
-        Returns
-        -------
-        key : `bytes`
-            The issuer's key in PEM format.
-
-        Raises
-        ------
-        gafaelfawr.exceptions.FetchKeysException
-            Unable to retrieve the key set for the specified issuer.
-        gafaelfawr.exceptions.UnknownAlgorithException
-            The requested key ID was found, but is for an unsupported
-            algorithm.
-        gafaelfawr.exceptions.UnknownKeyIdException
-            The requested key ID was not present in the issuer configuration
-            or was not found in that issuer's JWKS.
-        """
-        self._logger.debug("Getting key %s from %s", key_id, issuer_url)
-
-        # Retrieve the JWKS information.
-        keys = await self._get_keys(issuer_url)
-
-        # Find the key that we want.
-        key = None
-        for k in keys:
-            if key_id == k["kid"]:
-                key = k
-        if not key:
-            msg = f"Issuer {issuer_url} has no kid {key_id}"
-            raise UnknownKeyIdException(msg)
-        if key["alg"] != ALGORITHM:
-            msg = (
-                f"Issuer {issuer_url} kid {key_id} had algorithm"
-                f" {key['alg']} not {ALGORITHM}"
-            )
-            raise UnknownAlgorithmException(msg)
-
-        # Convert and return the key.
-        e = base64_to_number(key["e"])
-        m = base64_to_number(key["n"])
-        public_key = self._build_public_key(e, m)
-        return public_key
-
-    @staticmethod
-    def _build_public_key(exponent: int, modulus: int) -> str:
-        """Convert an exponent and modulus to a PEM-encoded key."""
-        components = rsa.RSAPublicNumbers(exponent, modulus)
-        public_key = components.public_key(backend=default_backend())
-        return public_key.public_bytes(
-            encoding=Encoding.PEM, format=PublicFormat.SubjectPublicKeyInfo
-        ).decode()
-
-    async def _get_keys(self, issuer_url: str) -> List[Dict[str, str]]:
-        """Fetch the key set for an issuer.
-
-        Parameters
-        ----------
-        issuer_url : `str`
-            URL of the issuer.
-
-        Returns
-        -------
-        body : List[Dict[`str`, `str`]]
-            List of keys (in JWKS format) for the given issuer.
-
-        Raises
-        ------
-        gafaelfawr.exceptions.FetchKeysException
-            On failure to retrieve a set of keys from the issuer.
-        """
-        url = await self._get_jwks_uri(issuer_url)
-        if not url:
-            url = urljoin(issuer_url, ".well-known/jwks.json")
-
-        try:
-            r = await self._http_client.get(url)
-            if r.status_code != 200:
-                reason = f"{r.status_code} {r.reason_phrase}"
-                msg = f"Cannot retrieve keys from {url}: {reason}"
-                raise FetchKeysException(msg)
-        except RequestError:
-            raise FetchKeysException(f"Cannot retrieve keys from {url}")
-
-        try:
-            body = r.json()
-            return body["keys"]
-        except Exception:
-            msg = f"No keys property in JWKS metadata for {url}"
-            raise FetchKeysException(msg)
-
-    async def _get_jwks_uri(self, issuer_url: str) -> Optional[str]:
-        """Retrieve the JWKS URI for a given issuer.
-
-        Ask for the OpenID Connect metadata and determine the JWKS URI from
-        that.
-
-        Parameters
-        ----------
-        issuer_url : `str`
-            URL of the issuer.
-
-        Returns
-        -------
-        url : `str` or `None`
-            URI for the JWKS of that issuer, or None if the OpenID Connect
-            metadata is not present.
-
-        Raises
-        ------
-        gafaelfawr.exceptions.FetchKeysException
-            If the OpenID Connect metadata doesn't contain the expected
-            parameter.
-        """
-        url = urljoin(issuer_url, ".well-known/openid-configuration")
-        try:
-            r = await self._http_client.get(url)
-            if r.status_code != 200:
-                return None
-        except RequestError:
-            return None
-
-        try:
-            body = r.json()
-            return body["jwks_uri"]
-        except Exception:
-            msg = f"No jwks_uri property in OIDC metadata for {issuer_url}"
-            raise FetchKeysException(msg)
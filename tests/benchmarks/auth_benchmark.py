@@ -0,0 +1,92 @@
+"""Benchmark of the components built for each ``/auth`` request.
+
+This is not run as part of the normal test suite.  To run it, name the file
+explicitly and disable output capturing:
+
+.. code-block:: console
+
+   $ pytest -s tests/benchmarks/auth_benchmark.py
+
+It reports how many times each of the major Gafaelfawr components and the
+underlying Fernet encryption object are constructed per ``/auth`` request
+with a delegated token, and the average time per request.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import Counter
+from contextlib import ExitStack
+from typing import TYPE_CHECKING
+from unittest.mock import patch
+
+import pytest
+from cryptography.fernet import Fernet
+
+from gafaelfawr.factory import ComponentFactory
+from gafaelfawr.issuer import TokenIssuer
+from gafaelfawr.services.token import TokenService
+from gafaelfawr.storage.base import RedisStorage
+from gafaelfawr.storage.token import TokenDatabaseStore, TokenRedisStore
+from gafaelfawr.storage.transaction import TransactionManager
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, ContextManager
+    from typing import Counter as CounterType
+
+    from tests.support.setup import SetupTest
+
+REQUESTS = 500
+"""Number of ``/auth`` requests to measure."""
+
+COUNTED = [
+    ComponentFactory,
+    Fernet,
+    RedisStorage,
+    TokenDatabaseStore,
+    TokenIssuer,
+    TokenRedisStore,
+    TokenService,
+    TransactionManager,
+]
+"""Classes whose construction is counted."""
+
+
+def count_constructions(
+    cls: type, counts: CounterType[str]
+) -> ContextManager[Any]:
+    """Patch a class to count the number of times it is constructed."""
+    original: Callable[..., None] = cls.__init__  # type: ignore[misc]
+
+    def __init__(self: Any, *args: Any, **kwargs: Any) -> None:
+        counts[cls.__name__] += 1
+        original(self, *args, **kwargs)
+
+    return patch.object(cls, "__init__", __init__)
+
+
+@pytest.mark.asyncio
+async def test_auth_components(setup: SetupTest) -> None:
+    token_data = await setup.create_session_token(scopes=["read:all"])
+    params = {"scope": "read:all", "delegate_to": "a-service"}
+    headers = {"Authorization": f"Bearer {token_data.token}"}
+
+    # Warm up to create the delegated token and any process-wide state.
+    r = await setup.client.get("/auth", params=params, headers=headers)
+    assert r.status_code == 200
+
+    counts: CounterType[str] = Counter()
+    with ExitStack() as stack:
+        for cls in COUNTED:
+            stack.enter_context(count_constructions(cls, counts))
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            r = await setup.client.get("/auth", params=params, headers=headers)
+            assert r.status_code == 200
+        elapsed = time.perf_counter() - start
+
+    print(f"\n{REQUESTS} /auth requests with delegate_to")
+    print(f"  {elapsed / REQUESTS * 1000:.3f}ms per request")
+    for cls in COUNTED:
+        per_request = counts[cls.__name__] / REQUESTS
+        print(f"  {cls.__name__}: {per_request:.2f} per request")
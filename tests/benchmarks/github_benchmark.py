@@ -0,0 +1,114 @@
+"""Benchmark of retrieving user information from GitHub.
+
+This is not run as part of the normal test suite.  To run it, name the file
+explicitly and disable output capturing:
+
+.. code-block:: console
+
+   $ pytest -s tests/benchmarks/github_benchmark.py
+
+It runs a local stub of the GitHub API that adds a fixed latency to every
+response and reports the time to retrieve the user information for a user
+whose teams span several pages, both with the requests made one after
+another and as done by `~gafaelfawr.providers.github.GitHubProvider`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any, Dict, List
+
+import pytest
+import structlog
+from fastapi import FastAPI, Request, Response
+from httpx import AsyncClient
+
+from gafaelfawr.constants import GITHUB_TEAMS_PER_PAGE
+from gafaelfawr.providers.github import GitHubProvider
+
+if TYPE_CHECKING:
+    from tests.support.setup import SetupTest
+
+LATENCY = 0.05
+"""Latency in seconds added to every response from the stub."""
+
+LOGINS = 20
+"""Number of user information retrievals to measure."""
+
+TEAMS = 250
+"""Number of teams of the user, spanning several pages."""
+
+stub = FastAPI()
+"""Stub of the GitHub API."""
+
+
+@stub.get("/user")
+async def get_user() -> Dict[str, Any]:
+    await asyncio.sleep(LATENCY)
+    return {"login": "githubuser", "id": 123456, "name": "GitHub User"}
+
+
+@stub.get("/user/emails")
+async def get_emails() -> List[Dict[str, Any]]:
+    await asyncio.sleep(LATENCY)
+    return [{"email": "githubuser@example.com", "primary": True}]
+
+
+@stub.get("/user/teams")
+async def get_teams(
+    request: Request, response: Response, per_page: int = 30, page: int = 1
+) -> List[Dict[str, Any]]:
+    await asyncio.sleep(LATENCY)
+    last_page = (TEAMS - 1) // per_page + 1
+    if last_page > 1:
+        url = request.url.include_query_params(page=last_page)
+        response.headers["Link"] = f'<{url}>; rel="last"'
+    start = (page - 1) * per_page
+    return [
+        {"slug": f"team-{n}", "id": n, "organization": {"login": "org"}}
+        for n in range(start, min(start + per_page, TEAMS))
+    ]
+
+
+async def get_sequential(http_client: AsyncClient, token: str) -> None:
+    """Retrieve the same information one request at a time."""
+    headers = {"Authorization": f"token {token}"}
+    await http_client.get(GitHubProvider._USER_URL, headers=headers)
+    pages = (TEAMS - 1) // GITHUB_TEAMS_PER_PAGE + 1
+    for page in range(1, pages + 1):
+        params = {"per_page": GITHUB_TEAMS_PER_PAGE, "page": page}
+        await http_client.get(
+            GitHubProvider._TEAMS_URL, params=params, headers=headers
+        )
+    await http_client.get(GitHubProvider._EMAILS_URL, headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_github_user_info(setup: SetupTest) -> None:
+    assert setup.config.github
+    logger = structlog.get_logger(setup.config.safir.logger_name)
+
+    async with AsyncClient(app=stub) as http_client:
+        provider = GitHubProvider(
+            config=setup.config.github,
+            http_client=http_client,
+            logger=logger,
+        )
+        user_info = await provider._get_user_info("some-token")
+        assert len(user_info.teams) == TEAMS
+
+        start = time.perf_counter()
+        for _ in range(LOGINS):
+            await get_sequential(http_client, "some-token")
+        sequential = (time.perf_counter() - start) / LOGINS
+
+        start = time.perf_counter()
+        for _ in range(LOGINS):
+            await provider._get_user_info("some-token")
+        concurrent = (time.perf_counter() - start) / LOGINS
+
+    print(f"\nGitHub user information with {TEAMS} teams")
+    print(f"  {LATENCY * 1000:.0f}ms latency per request")
+    print(f"  sequential: {sequential * 1000:.1f}ms per login")
+    print(f"  GitHubProvider: {concurrent * 1000:.1f}ms per login")
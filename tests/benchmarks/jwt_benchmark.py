@@ -0,0 +1,103 @@
+"""Benchmark of signing and verifying internal JWTs.
+
+This is not run as part of the normal test suite.  To run it, name the file
+explicitly and disable output capturing:
+
+.. code-block:: console
+
+   $ pytest -s tests/benchmarks/jwt_benchmark.py
+
+It reports the throughput of signing and verifying tokens with the internal
+issuer key, both when the key is passed to PyJWT as a PEM-encoded string (so
+that it must be parsed for each token) and when it is passed as a parsed key
+object, as well as the throughput of `~gafaelfawr.issuer.TokenIssuer` and
+`~gafaelfawr.verify.TokenVerifier` themselves.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING
+
+import jwt
+import pytest
+
+from gafaelfawr.constants import ALGORITHM
+from gafaelfawr.models.oidc import OIDCToken
+
+if TYPE_CHECKING:
+    from typing import Any, Callable
+
+    from tests.support.setup import SetupTest
+
+ITERATIONS = 1000
+"""Number of tokens to sign or verify for each measurement."""
+
+
+def report(name: str, func: Callable[[], object]) -> None:
+    """Call a function repeatedly and print its throughput."""
+    func()
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"  {name}: {ITERATIONS / elapsed:.0f} ops/s")
+
+
+@pytest.mark.asyncio
+async def test_jwt_throughput(setup: SetupTest) -> None:
+    setup.configure("oidc")
+    config = setup.config.issuer
+    keypair = config.keypair
+    issuer = setup.factory.create_token_issuer()
+    verifier = setup.factory.create_token_verifier()
+
+    token_data = await setup.create_session_token()
+    token = issuer.issue_token(token_data, jti="some-jti", scope="openid")
+    payload = token.claims
+    headers = {"kid": config.kid}
+    private_pem = keypair.private_key_as_pem().decode()
+    public_pem = keypair.public_key_as_pem().decode()
+
+    # PyJWT accepts key objects at runtime, but its type annotations only
+    # allow str.
+    private_key: Any = keypair.private_key
+    public_key: Any = keypair.public_key
+
+    def sign_pem() -> str:
+        return jwt.encode(
+            payload, private_pem, algorithm=ALGORITHM, headers=headers
+        )
+
+    def sign_key() -> str:
+        return jwt.encode(
+            payload, private_key, algorithm=ALGORITHM, headers=headers
+        )
+
+    def verify_pem() -> object:
+        return jwt.decode(
+            token.encoded,
+            public_pem,
+            algorithms=[ALGORITHM],
+            audience=config.aud,
+        )
+
+    def verify_key() -> object:
+        return jwt.decode(
+            token.encoded,
+            public_key,
+            algorithms=[ALGORITHM],
+            audience=config.aud,
+        )
+
+    print(f"\n{ITERATIONS} internal JWTs")
+    report("sign with PEM", sign_pem)
+    report("sign with key object", sign_key)
+    report("TokenIssuer.issue_token", lambda: issuer.issue_token(token_data))
+    report("verify with PEM", verify_pem)
+    report("verify with key object", verify_key)
+    unverified = OIDCToken(encoded=token.encoded)
+    report(
+        "TokenVerifier.verify_internal_token",
+        lambda: verifier.verify_internal_token(unverified),
+    )
@@ -0,0 +1,68 @@
+"""Benchmark of the serialization of token data stored in Redis.
+
+This is not run as part of the normal test suite.  To run it, name the file
+explicitly and disable output capturing:
+
+.. code-block:: console
+
+   $ pytest -s tests/benchmarks/storage_benchmark.py
+
+It reports the size and decoding time of token data for a user in many
+groups, both as JSON parsed by pydantic and in the compact form written by
+`~gafaelfawr.storage.codec.ModelCodec`, and the size once encrypted as it is
+stored by `~gafaelfawr.storage.base.RedisStorage`.
+"""
+
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+from cryptography.fernet import Fernet
+
+from gafaelfawr.models.token import Token, TokenData, TokenGroup, TokenType
+from gafaelfawr.storage.codec import ModelCodec
+
+if TYPE_CHECKING:
+    from typing import Callable
+
+GROUPS = 200
+"""Number of groups of the user."""
+
+ITERATIONS = 10000
+"""Number of times to decode the token data for each measurement."""
+
+
+def report(name: str, data: bytes, decode: Callable[[], object]) -> None:
+    """Print the size of encoded data and the time to decode it."""
+    encrypted = Fernet(Fernet.generate_key()).encrypt(data)
+    decode()
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        decode()
+    elapsed = (time.perf_counter() - start) / ITERATIONS
+    print(f"  {name}: {len(data)} bytes ({len(encrypted)} encrypted),")
+    print(f"    {elapsed * 1_000_000:.1f}us to decode")
+
+
+def test_token_data_serialization() -> None:
+    now = datetime.now(tz=timezone.utc)
+    token_data = TokenData(
+        token=Token(),
+        username="example",
+        token_type=TokenType.session,
+        scopes=["exec:admin", "read:all", "user:token"],
+        created=now,
+        expires=now + timedelta(days=7),
+        name="Example Person",
+        uid=4137,
+        groups=[TokenGroup(name=f"group-{n}", id=n) for n in range(GROUPS)],
+    )
+    codec = ModelCodec(TokenData)
+    json_data = token_data.json().encode()
+    compact_data = codec.encode(token_data)
+
+    print(f"\nToken data with {GROUPS} groups")
+    report("JSON", json_data, lambda: TokenData.parse_raw(json_data))
+    report("compact", compact_data, lambda: codec.decode(compact_data))
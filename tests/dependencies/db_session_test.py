@@ -0,0 +1,40 @@
+"""Tests for the database session dependency."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+from sqlalchemy.future import select
+
+from gafaelfawr.dependencies.db_session import DatabaseSessionDependency
+from gafaelfawr.schema import Admin
+
+if TYPE_CHECKING:
+    from tests.support.setup import SetupTest
+
+
+@pytest.mark.asyncio
+async def test_lazy_session(setup: SetupTest) -> None:
+    db_session_dependency = DatabaseSessionDependency()
+
+    # If the database is not used, no session is created.
+    generator = db_session_dependency(setup.config)
+    session = await generator.__anext__()
+    assert not session.registry.has()
+    with pytest.raises(StopAsyncIteration):
+        await generator.__anext__()
+    assert not session.registry.has()
+
+    # The session is created on first use and closed at the end of the
+    # request.
+    generator = db_session_dependency(setup.config)
+    session = await generator.__anext__()
+    result = await session.scalar(select(Admin.username))
+    assert result == "admin"
+    assert session.registry.has()
+    with pytest.raises(StopAsyncIteration):
+        await generator.__anext__()
+    assert not session.registry.has()
+
+    await db_session_dependency.close()
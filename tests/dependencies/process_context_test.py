@@ -0,0 +1,50 @@
+"""Tests for the process context dependency."""
+
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING
+
+import pytest
+
+from gafaelfawr.dependencies.process_context import process_context_dependency
+from gafaelfawr.factory import ProcessContext
+
+if TYPE_CHECKING:
+    from _pytest.logging import LogCaptureFixture
+
+    from tests.support.setup import SetupTest
+
+
+@pytest.mark.asyncio
+async def test_close(setup: SetupTest, caplog: LogCaptureFixture) -> None:
+    process_context = ProcessContext(
+        config=setup.config, redis=setup.redis, http_client=setup.client
+    )
+    assert process_context.verified_token_cache.get("some-token") is None
+    process_context_dependency.process_context = process_context
+
+    caplog.clear()
+    process_context_dependency.close()
+    logs = [json.loads(r[2]) for r in caplog.record_tuples]
+    assert logs == [
+        {
+            "component": "github_cache",
+            "event": "Component statistics",
+            "hits": 0,
+            "level": "info",
+            "logger": "gafaelfawr",
+            "misses": 0,
+            "rate_limit_remaining": None,
+        },
+        {
+            "component": "verified_token_cache",
+            "evictions": 0,
+            "event": "Component statistics",
+            "hits": 0,
+            "level": "info",
+            "logger": "gafaelfawr",
+            "misses": 1,
+            "size": 0,
+        },
+    ]
@@ -35,7 +35,9 @@ async def test_admins(setup: SetupTest) -> None:
     assert r.json() == [{"username": "admin"}]
 
     admin_service = setup.factory.create_admin_service()
-    admin_service.add_admin("example", actor="admin", ip_address="127.0.0.1")
+    await admin_service.add_admin(
+        "example", actor="admin", ip_address="127.0.0.1"
+    )
 
     r = await setup.client.get(
         "/auth/api/v1/admins",
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import json
 import time
 from datetime import datetime, timedelta, timezone
 from typing import TYPE_CHECKING
@@ -92,7 +93,7 @@ async def test_create_delete_modify(setup: SetupTest) -> None:
             },
             info,
         ],
-        key=lambda t: t["token"],
+        key=lambda t: (t["created"], t["token"]),
     )
 
     # Change the name, scope, and expiration of the token.
@@ -813,3 +814,71 @@ async def test_create_admin(setup: SetupTest) -> None:
         json={"username": "other-service", "token_type": "service"},
     )
     assert r.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_list_paginated(setup: SetupTest) -> None:
+    token_data = await setup.create_session_token()
+    token_service = setup.factory.create_token_service()
+    for i in range(4):
+        await token_service.create_user_token(
+            token_data, token_data.username, token_name=f"token {i}"
+        )
+    await setup.login(token_data.token)
+    url = f"/auth/api/v1/users/{token_data.username}/tokens"
+    r = await setup.client.get(url)
+    assert r.status_code == 200
+    expected = r.json()
+    assert len(expected) == 5
+    assert expected == sorted(
+        expected, key=lambda t: (t["created"], t["token"])
+    )
+
+    # Follow the Link headers through all of the pages.
+    seen = []
+    r = await setup.client.get(url, params={"limit": 2})
+    while True:
+        assert r.status_code == 200
+        seen.extend(r.json())
+        assert f'<{url}?limit=2>; rel="first"' in r.headers["Link"]
+        links = r.headers["Link"].split(", ")
+        next_links = [link for link in links if link.endswith('"next"')]
+        if not next_links:
+            break
+        next_url = next_links[0].split(";")[0].strip("<>")
+        r = await setup.client.get(next_url)
+    assert seen == expected
+
+    # A streaming NDJSON response contains the same tokens.
+    r = await setup.client.get(url, headers={"Accept": "application/x-ndjson"})
+    assert r.status_code == 200
+    assert r.headers["Content-Type"].startswith("application/x-ndjson")
+    lines = r.text.splitlines()
+    assert [json.loads(line) for line in lines] == expected
+
+    # Start streaming from a cursor taken from the middle of the list.
+    r = await setup.client.get(url, params={"limit": 3})
+    cursor = r.headers["Link"].split("cursor=")[1].split(">")[0]
+    r = await setup.client.get(url, params={"cursor": cursor})
+    assert r.json() == expected[3:]
+
+    r = await setup.client.get(url, params={"cursor": "invalid"})
+    assert r.status_code == 422
+    assert r.json()["detail"]["type"] == "invalid_cursor"
+    r = await setup.client.get(url, params={"limit": 0})
+    assert r.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_list_schema(setup: SetupTest) -> None:
+    r = await setup.client.get("/openapi.json")
+    assert r.status_code == 200
+    path = "/auth/api/v1/users/{username}/tokens"
+    response = r.json()["paths"][path]["get"]["responses"]["200"]
+    assert response["content"]["application/json"]["schema"]["items"] == {
+        "$ref": "#/components/schemas/TokenInfo"
+    }
+    assert response["content"]["application/x-ndjson"]["schema"] == {
+        "$ref": "#/components/schemas/TokenInfo"
+    }
+    assert "Link" in response["headers"]
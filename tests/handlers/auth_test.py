@@ -9,13 +9,30 @@ from unittest.mock import ANY
 import pytest
 
 from gafaelfawr.auth import AuthError, AuthErrorChallenge, AuthType
+from gafaelfawr.dependencies.auth_history import auth_history_dependency
+from gafaelfawr.dependencies.token_cache import token_cache_dependency
+from gafaelfawr.dependencies.token_usage import token_usage_dependency
 from gafaelfawr.models.token import Token
 from tests.support.headers import parse_www_authenticate
 
 if TYPE_CHECKING:
+    from _pytest.fixtures import SubRequest
+
     from tests.support.setup import SetupTest
 
 
+@pytest.fixture(params=["false", "true"], autouse=True)
+def fast_auth(request: SubRequest, setup: SetupTest) -> str:
+    """Run each test against both implementations of ``/auth``.
+
+    Returns the value of the ``fast_auth`` setting, which must be included in
+    any later call to ``setup.configure``.
+    """
+    if request.param == "true":
+        setup.configure(fast_auth=request.param)
+    return request.param
+
+
 @pytest.mark.asyncio
 async def test_no_auth(setup: SetupTest) -> None:
     r = await setup.client.get("/auth", params={"scope": "exec:admin"})
@@ -461,3 +478,152 @@ async def test_ajax_unauthorized(setup: SetupTest) -> None:
     assert not isinstance(authenticate, AuthErrorChallenge)
     assert authenticate.auth_type == AuthType.Bearer
     assert authenticate.realm == setup.config.realm
+
+
+@pytest.mark.asyncio
+async def test_token_cache(setup: SetupTest, fast_auth: str) -> None:
+    setup.configure(
+        token_cache="{size: 100, lifetime: 60}", fast_auth=fast_auth
+    )
+    token_data = await setup.create_session_token(scopes=["exec:admin"])
+
+    for _ in range(3):
+        r = await setup.client.get(
+            "/auth",
+            params={"scope": "exec:admin"},
+            headers={"Authorization": f"Bearer {token_data.token}"},
+        )
+        assert r.status_code == 200
+        assert r.headers["X-Auth-Request-User"] == token_data.username
+
+    token_cache = token_cache_dependency.token_cache
+    assert token_cache
+    assert token_cache.stats.hits == 2
+    assert token_cache.stats.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_fast_auth(setup: SetupTest) -> None:
+    setup.configure(fast_auth="true")
+    token_data = await setup.create_session_token(scopes=["exec:admin"])
+
+    r = await setup.client.get(
+        "/auth",
+        params={"scope": "exec:admin"},
+        headers={"Authorization": f"Bearer {token_data.token}"},
+    )
+    assert r.status_code == 200
+    assert r.content == b""
+    assert r.headers["X-Auth-Request-User"] == token_data.username
+
+    # Validation errors use the same format as FastAPI.
+    r = await setup.client.get(
+        "/auth",
+        params={"scope": "exec:admin", "notebook": "maybe"},
+        headers={"Authorization": f"Bearer {token_data.token}"},
+    )
+    assert r.status_code == 422
+    assert r.json() == {
+        "detail": [
+            {
+                "loc": ["query", "notebook"],
+                "msg": "value could not be parsed to a boolean",
+                "type": "type_error.bool",
+            }
+        ]
+    }
+
+
+@pytest.mark.asyncio
+async def test_profile(setup: SetupTest, fast_auth: str) -> None:
+    setup.configure(
+        fast_auth=fast_auth,
+        auth_profiles=(
+            "{portal: {scopes: [exec:admin, read:all], satisfy: any},"
+            " lab: {scopes: [exec:admin], notebook: true}}"
+        ),
+    )
+    token_data = await setup.create_session_token(
+        group_names=["admin"], scopes=["exec:admin"]
+    )
+    headers = {"Authorization": f"Bearer {token_data.token}"}
+
+    r = await setup.client.get(
+        "/auth", params={"profile": "portal"}, headers=headers
+    )
+    assert r.status_code == 200
+    assert r.headers["X-Auth-Request-Scopes-Accepted"] == "exec:admin read:all"
+    assert r.headers["X-Auth-Request-Scopes-Satisfy"] == "any"
+    assert "X-Auth-Request-Token" not in r.headers
+
+    r = await setup.client.get(
+        "/auth", params={"profile": "lab"}, headers=headers
+    )
+    assert r.status_code == 200
+    assert r.headers["X-Auth-Request-Scopes-Accepted"] == "exec:admin"
+    assert r.headers["X-Auth-Request-Scopes-Satisfy"] == "all"
+    notebook_token = Token.from_str(r.headers["X-Auth-Request-Token"])
+    assert notebook_token != token_data.token
+
+    r = await setup.client.get(
+        "/auth", params={"profile": "unknown"}, headers=headers
+    )
+    assert r.status_code == 422
+    assert r.json()["detail"]["type"] == "invalid_profile"
+
+    # Profiles cannot be combined with other parameters.
+    r = await setup.client.get(
+        "/auth",
+        params={"profile": "portal", "scope": "read:all"},
+        headers=headers,
+    )
+    assert r.status_code == 422
+    assert r.json()["detail"]["type"] == "invalid_profile"
+
+    # Unauthenticated requests get the usual challenge.
+    r = await setup.client.get("/auth", params={"profile": "lab"})
+    assert r.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_last_used(setup: SetupTest) -> None:
+    token_data = await setup.create_session_token(scopes=["exec:admin"])
+    token_service = setup.factory.create_token_service()
+    info = await token_service.get_token_info_unchecked(token_data.token.key)
+    assert info
+    assert info.last_used is None
+
+    r = await setup.client.get(
+        "/auth",
+        params={"scope": "exec:admin"},
+        headers={"Authorization": f"Bearer {token_data.token}"},
+    )
+    assert r.status_code == 200
+
+    token_usage = token_usage_dependency.token_usage
+    assert token_usage
+    assert token_usage.pending == 1
+    await token_usage.flush()
+    await setup.session.commit()
+    setup.session.expire_all()
+    info = await token_service.get_token_info_unchecked(token_data.token.key)
+    assert info
+    assert info.last_used
+
+
+@pytest.mark.asyncio
+async def test_auth_history(setup: SetupTest) -> None:
+    token_data = await setup.create_session_token(scopes=["exec:admin"])
+
+    r = await setup.client.get(
+        "/auth",
+        params={"scope": "exec:admin"},
+        headers={"Authorization": f"Bearer {token_data.token}"},
+    )
+    assert r.status_code == 200
+
+    auth_history = auth_history_dependency.auth_history
+    assert auth_history
+    assert auth_history.stats.queued == 1
+    await auth_history.flush()
+    assert auth_history.stats.written == 1
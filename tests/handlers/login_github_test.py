@@ -80,6 +80,20 @@ async def test_login(setup: SetupTest, caplog: LogCaptureFixture) -> None:
     )
     assert r.status_code == 307
     assert r.headers["Location"] == return_url
+    data = json.loads(caplog.record_tuples[-2][2])
+    assert data == {
+        "cache_hit_ratio": 0.0,
+        "event": "GitHub API cache statistics",
+        "level": "info",
+        "logger": "gafaelfawr",
+        "method": "GET",
+        "path": "/login",
+        "rate_limit_remaining": 4999,
+        "remote": "127.0.0.1",
+        "return_url": return_url,
+        "request_id": ANY,
+        "user_agent": ANY,
+    }
     data = json.loads(caplog.record_tuples[-1][2])
     assert data == {
         "event": "Successfully authenticated user githubuser (123456)",
@@ -331,7 +345,9 @@ async def test_github_uppercase(setup: SetupTest) -> None:
 async def test_github_admin(setup: SetupTest) -> None:
     """Test that a token administrator gets the admin:token scope."""
     admin_service = setup.factory.create_admin_service()
-    admin_service.add_admin("someuser", actor="admin", ip_address="127.0.0.1")
+    await admin_service.add_admin(
+        "someuser", actor="admin", ip_address="127.0.0.1"
+    )
     user_info = GitHubUserInfo(
         name="A User",
         username="someuser",
@@ -399,3 +415,49 @@ async def test_invalid_username(setup: SetupTest) -> None:
             "type": "permission_denied",
         }
     }
+
+
+@pytest.mark.asyncio
+async def test_login_paginated_teams(setup: SetupTest) -> None:
+    # The team that grants read:all is on the last page.
+    teams = [
+        GitHubTeam(slug=f"team-{n}", gid=2000 + n, organization="org")
+        for n in range(250)
+    ]
+    teams.append(GitHubTeam(slug="a-team", gid=1000, organization="org"))
+    user_info = GitHubUserInfo(
+        name="GitHub User",
+        username="githubuser",
+        uid=123456,
+        email="githubuser@example.com",
+        teams=teams,
+    )
+    return_url = "https://example.com/"
+
+    setup.set_github_token_response("some-code", "some-github-token")
+    r = await setup.client.get(
+        "/login", params={"rd": return_url}, allow_redirects=False
+    )
+    assert r.status_code == 307
+    query = parse_qs(urlparse(r.headers["Location"]).query)
+    setup.set_github_userinfo_response("some-github-token", user_info)
+    r = await setup.client.get(
+        "/login",
+        params={"code": "some-code", "state": query["state"][0]},
+        allow_redirects=False,
+    )
+    assert r.status_code == 307
+
+    # All three pages of teams were retrieved.
+    teams_url = GitHubProvider._TEAMS_URL
+    requests = [
+        r
+        for r in setup.httpx_mock.get_requests()
+        if str(r.url).startswith(teams_url)
+    ]
+    assert len(requests) == 3
+
+    r = await setup.client.get("/auth", params={"scope": "read:all"})
+    assert r.status_code == 200
+    groups = r.headers["X-Auth-Request-Groups"].split(",")
+    assert sorted(groups) == sorted(t.group_name for t in teams)
@@ -47,6 +47,25 @@ async def test_logout(setup: SetupTest, caplog: LogCaptureFixture) -> None:
     assert r.status_code == 401
 
 
+@pytest.mark.asyncio
+async def test_logout_revokes_children(setup: SetupTest) -> None:
+    token_data = await setup.create_session_token(scopes=["read:all"])
+    token_service = setup.factory.create_token_service()
+    notebook_token = await token_service.get_notebook_token(token_data)
+    internal_token = await token_service.get_internal_token(
+        token_data, service="some-service", scopes=["read:all"]
+    )
+    await setup.login(token_data.token)
+
+    r = await setup.client.get("/logout", allow_redirects=False)
+    assert r.status_code == 307
+
+    for token in (token_data.token, notebook_token, internal_token):
+        assert await token_service.get_data(token) is None
+        info = await token_service.get_token_info_unchecked(token.key)
+        assert info is None
+
+
 @pytest.mark.asyncio
 async def test_logout_with_url(setup: SetupTest) -> None:
     token_data = await setup.create_session_token(scopes=["read:all"])
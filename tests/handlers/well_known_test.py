@@ -58,3 +58,36 @@ async def test_well_known_oidc(setup: SetupTest) -> None:
         "id_token_signing_alg_values_supported": [ALGORITHM],
         "token_endpoint_auth_methods_supported": ["client_secret_post"],
     }
+
+
+@pytest.mark.asyncio
+async def test_well_known_caching(setup: SetupTest) -> None:
+    max_age = setup.config.issuer.metadata_max_age
+    routes = ("/.well-known/jwks.json", "/.well-known/openid-configuration")
+    for route in routes:
+        r = await setup.client.get(route)
+        assert r.status_code == 200
+        assert r.headers["Cache-Control"] == f"public, max-age={max_age}"
+        etag = r.headers["ETag"]
+        assert etag.startswith('"')
+        body = r.content
+
+        # The body and entity tag are stable across requests.
+        r = await setup.client.get(route)
+        assert r.headers["ETag"] == etag
+        assert r.content == body
+
+        # A matching If-None-Match, including a weak or listed match, returns
+        # 304 with no body.
+        for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+            r = await setup.client.get(
+                route, headers={"If-None-Match": if_none_match}
+            )
+            assert r.status_code == 304
+            assert r.headers["ETag"] == etag
+            assert r.content == b""
+
+        # A stale entity tag returns the full body.
+        r = await setup.client.get(route, headers={"If-None-Match": '"old"'})
+        assert r.status_code == 200
+        assert r.content == body
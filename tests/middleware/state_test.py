@@ -0,0 +1,101 @@
+"""Test the state cookie middleware."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import pytest
+from fastapi import FastAPI, Request
+from httpx import AsyncClient
+
+from gafaelfawr.middleware.state import BaseState, StateMiddleware
+
+
+@dataclass
+class ExampleState(BaseState):
+    """Unencrypted state that counts how often it is decoded."""
+
+    value: Optional[str] = None
+
+    decoded = 0
+
+    @classmethod
+    def from_cookie(cls, cookie: str, request: Request) -> ExampleState:
+        cls.decoded += 1
+        return cls(value=cookie)
+
+    def as_cookie(self) -> str:
+        return self.value or ""
+
+
+def build_app() -> FastAPI:
+    """Construct a test FastAPI app with the middleware registered."""
+    app = FastAPI()
+    app.add_middleware(
+        StateMiddleware, cookie_name="state", state_class=ExampleState
+    )
+
+    @app.get("/ignore")
+    async def ignore() -> Dict[str, str]:
+        return {}
+
+    @app.get("/read")
+    async def read(request: Request) -> Dict[str, Optional[str]]:
+        return {"value": request.state.cookie.get().value}
+
+    @app.get("/write")
+    async def write(request: Request) -> Dict[str, str]:
+        request.state.cookie.get().value = "new"
+        return {}
+
+    @app.get("/replace")
+    async def replace(request: Request) -> Dict[str, str]:
+        request.state.cookie.set(ExampleState(value="old"))
+        return {}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_lazy_decode() -> None:
+    app = build_app()
+    ExampleState.decoded = 0
+
+    async with AsyncClient(app=app, base_url="https://example.com") as client:
+        client.cookies["state"] = "old"
+        r = await client.get("/ignore")
+        assert r.status_code == 200
+        assert "set-cookie" not in r.headers
+        assert ExampleState.decoded == 0
+
+        r = await client.get("/read")
+        assert r.status_code == 200
+        assert r.json() == {"value": "old"}
+        assert "set-cookie" not in r.headers
+        assert ExampleState.decoded == 1
+
+        # Replacing the state with an equal state does not set the cookie.
+        r = await client.get("/replace")
+        assert r.status_code == 200
+        assert "set-cookie" not in r.headers
+        assert ExampleState.decoded == 2
+
+
+@pytest.mark.asyncio
+async def test_write_back() -> None:
+    app = build_app()
+
+    async with AsyncClient(app=app, base_url="https://example.com") as client:
+        r = await client.get("/write")
+        assert r.status_code == 200
+        assert r.headers["set-cookie"] == (
+            "state=new; HttpOnly; Path=/; SameSite=lax; Secure"
+        )
+
+    async with AsyncClient(app=app, base_url="http://localhost") as client:
+        r = await client.get("/replace")
+        assert r.status_code == 200
+        assert r.headers["set-cookie"] == (
+            "state=old; HttpOnly; Path=/; SameSite=lax"
+        )
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from ipaddress import _BaseNetwork, ip_network
+from ipaddress import _BaseNetwork, ip_address, ip_network
 from typing import Dict, List
 
 import pytest
@@ -147,3 +147,24 @@ async def test_too_many_headers() -> None:
     assert middleware._get_forwarded_for(request) == []
     assert middleware._get_forwarded_proto(request) == []
     assert not middleware._get_forwarded_host(request)
+
+
+def test_trusted_networks() -> None:
+    app = FastAPI()
+    proxies = [
+        ip_network("10.0.0.0/8"),
+        ip_network("10.1.0.0/16"),
+        ip_network("11.0.0.0/8"),
+        ip_network("192.168.1.1"),
+        ip_network("2001:db8::/32"),
+    ]
+    middleware = XForwardedMiddleware(app, proxies=proxies)
+    trusted = middleware._trusted
+
+    for address in ("10.0.0.0", "10.1.2.3", "11.255.255.255", "192.168.1.1"):
+        assert ip_address(address) in trusted
+    for address in ("9.255.255.255", "12.0.0.0", "192.168.1.2"):
+        assert ip_address(address) not in trusted
+    assert ip_address("2001:db8::1") in trusted
+    assert ip_address("2001:db9::1") not in trusted
+    assert ip_address("::ffff:10.0.0.1") not in trusted
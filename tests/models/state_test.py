@@ -0,0 +1,31 @@
+"""Tests for the state cookie model."""
+
+from __future__ import annotations
+
+import pytest
+
+from gafaelfawr.models import state as state_module
+from gafaelfawr.models.state import State
+from gafaelfawr.models.token import Token
+from tests.support.setup import SetupTest
+
+
+@pytest.mark.asyncio
+async def test_cookie_cache(setup: SetupTest) -> None:
+    state = State(csrf="some-csrf", token=Token())
+    cookie = state.as_cookie()
+
+    assert State.from_cookie(cookie, None) == state
+    codec = state_module._codec
+    assert codec
+    assert list(codec.cache.keys()) == [cookie]
+
+    # The cache must hand out copies so callers can't modify cached data.
+    cached = State.from_cookie(cookie, None)
+    assert cached == state
+    cached.csrf = "other"
+    assert State.from_cookie(cookie, None) == state
+
+    # Invalid cookies are not cached.
+    assert State.from_cookie("XXX" + cookie, None) == State()
+    assert len(codec.cache) == 1
@@ -2,11 +2,18 @@
 
 from __future__ import annotations
 
+from datetime import datetime, timezone
+
 import pytest
 from pydantic import ValidationError
 
-from gafaelfawr.exceptions import InvalidTokenError
-from gafaelfawr.models.token import AdminTokenRequest, Token, TokenType
+from gafaelfawr.exceptions import InvalidCursorError, InvalidTokenError
+from gafaelfawr.models.token import (
+    AdminTokenRequest,
+    Token,
+    TokenCursor,
+    TokenType,
+)
 
 
 def test_token() -> None:
@@ -56,3 +63,28 @@ def test_admin_request() -> None:
             token_type=TokenType.service,
             token_name="some token name",
         )
+
+
+def test_token_cursor() -> None:
+    created = datetime(2021, 1, 2, 3, 4, 5, 678, tzinfo=timezone.utc)
+    cursor = TokenCursor(created=created, token="MLF5MB3Peg79wEC0BY8U8Q")
+    assert str(cursor) == "1609556645000678_MLF5MB3Peg79wEC0BY8U8Q"
+    assert TokenCursor.from_str(str(cursor)) == cursor
+
+    # Timezone-naive times are assumed to be in UTC.
+    naive = TokenCursor(created=created.replace(tzinfo=None), token="a" * 22)
+    assert str(naive).startswith("1609556645000678_")
+
+    bad_cursors = [
+        "",
+        "_",
+        "1609556645000678",
+        "1609556645000678_",
+        "_MLF5MB3Peg79wEC0BY8U8Q",
+        "-1_MLF5MB3Peg79wEC0BY8U8Q",
+        "now_MLF5MB3Peg79wEC0BY8U8Q",
+        "1609556645000678_MLF5MB3Peg79wEC0BY8U8",
+    ]
+    for cursor_str in bad_cursors:
+        with pytest.raises(InvalidCursorError):
+            TokenCursor.from_str(cursor_str)
@@ -0,0 +1,121 @@
+"""Tests for the GitHub authentication provider."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+import structlog
+from httpx import AsyncClient
+
+from gafaelfawr.models.github import GitHubCachedResponse
+from gafaelfawr.providers.github import (
+    GitHubProvider,
+    GitHubTeam,
+    GitHubUserInfo,
+)
+from gafaelfawr.storage.base import RedisStorage
+from gafaelfawr.storage.github import GitHubResponseCache
+
+if TYPE_CHECKING:
+    from tests.support.setup import SetupTest
+
+
+@pytest.mark.asyncio
+async def test_response_cache(setup: SetupTest) -> None:
+    assert setup.config.github
+    user_info = GitHubUserInfo(
+        name="GitHub User",
+        username="githubuser",
+        uid=123456,
+        email="githubuser@example.com",
+        teams=[GitHubTeam(slug="a-team", gid=1000, organization="org")],
+    )
+    setup.set_github_userinfo_response("some-github-token", user_info)
+    storage = RedisStorage(
+        GitHubCachedResponse, setup.config.session_secret, setup.redis
+    )
+    cache = GitHubResponseCache(storage)
+    logger = structlog.get_logger(setup.config.safir.logger_name)
+    async with AsyncClient() as http_client:
+        provider = GitHubProvider(
+            config=setup.config.github,
+            http_client=http_client,
+            logger=logger,
+            cache=cache,
+        )
+
+        # The first retrieval caches the teams and emails.
+        assert await provider._get_user_info("some-github-token") == user_info
+        stats = cache.stats
+        assert (stats.hits, stats.misses) == (0, 2)
+        assert stats.rate_limit_remaining == 4999
+        requests = setup.httpx_mock.get_requests()
+        assert not any("If-None-Match" in r.headers for r in requests)
+
+        # The second uses conditional requests and the cached data.
+        assert await provider._get_user_info("some-github-token") == user_info
+        stats = cache.stats
+        assert (stats.hits, stats.misses) == (2, 2)
+        assert stats.hit_ratio == 0.5
+        requests = setup.httpx_mock.get_requests()[3:]
+        conditional = [r for r in requests if "If-None-Match" in r.headers]
+        assert len(conditional) == 2
+
+    # If the data changes, the new data is retrieved.
+    user_info = GitHubUserInfo(
+        name="GitHub User",
+        username="githubuser",
+        uid=123456,
+        email="githubuser@example.com",
+        teams=[GitHubTeam(slug="other-team", gid=1001, organization="org")],
+    )
+    setup.set_github_userinfo_response("some-github-token", user_info)
+    async with AsyncClient() as http_client:
+        provider = GitHubProvider(
+            config=setup.config.github,
+            http_client=http_client,
+            logger=logger,
+            cache=cache,
+        )
+        assert await provider._get_user_info("some-github-token") == user_info
+        assert (cache.stats.hits, cache.stats.misses) == (3, 3)
+
+
+@pytest.mark.asyncio
+async def test_response_cache_new_token(setup: SetupTest) -> None:
+    """GitHub issues a new token on each login, so the cache is keyed by ID."""
+    assert setup.config.github
+    user_info = GitHubUserInfo(
+        name="GitHub User",
+        username="githubuser",
+        uid=123456,
+        email="githubuser@example.com",
+        teams=[GitHubTeam(slug="a-team", gid=1000, organization="org")],
+    )
+    storage = RedisStorage(
+        GitHubCachedResponse, setup.config.session_secret, setup.redis
+    )
+    cache = GitHubResponseCache(storage)
+    logger = structlog.get_logger(setup.config.safir.logger_name)
+    async with AsyncClient() as http_client:
+        provider = GitHubProvider(
+            config=setup.config.github,
+            http_client=http_client,
+            logger=logger,
+            cache=cache,
+        )
+        setup.set_github_userinfo_response("first-token", user_info)
+        assert await provider._get_user_info("first-token") == user_info
+        assert (cache.stats.hits, cache.stats.misses) == (0, 2)
+
+        setup.set_github_userinfo_response("second-token", user_info)
+        assert await provider._get_user_info("second-token") == user_info
+        assert (cache.stats.hits, cache.stats.misses) == (2, 2)
+        requests = setup.httpx_mock.get_requests()[3:]
+        assert all(
+            r.headers["Authorization"] == "token second-token"
+            for r in requests
+        )
+        conditional = [r for r in requests if "If-None-Match" in r.headers]
+        assert len(conditional) == 2
@@ -0,0 +1,57 @@
+"""Tests for the database schema."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from gafaelfawr.models.token import Token, TokenData, TokenType
+from gafaelfawr.schema.base import UTCDateTime
+from gafaelfawr.storage.token import TokenDatabaseStore
+
+if TYPE_CHECKING:
+    from tests.support.setup import SetupTest
+
+
+def test_utc_datetime() -> None:
+    column_type = UTCDateTime()
+    dialect = postgresql.dialect()
+    offset = timezone(timedelta(hours=-5))
+    aware = datetime(2021, 2, 1, 7, 30, tzinfo=offset)
+    naive = datetime(2021, 2, 1, 12, 30)
+
+    assert column_type.process_bind_param(aware, dialect) == naive
+    assert column_type.process_bind_param(naive, dialect) == naive
+    assert column_type.process_bind_param(None, dialect) is None
+
+
+@pytest.mark.asyncio
+async def test_store_aware_datetime(setup: SetupTest) -> None:
+    """Datetimes in any time zone are stored as the same instant in UTC."""
+    offset = timezone(timedelta(hours=5))
+    created = datetime.now(tz=offset).replace(microsecond=0)
+    expires = created + timedelta(days=1)
+    data = TokenData(
+        token=Token(),
+        username="example",
+        token_type=TokenType.session,
+        scopes=[],
+        created=created,
+        expires=expires,
+    )
+    async with AsyncSession(setup.session.bind) as session:
+        async with session.begin():
+            store = TokenDatabaseStore(session)
+            await store.add(data)
+            await store.update_last_used({data.token.key: expires})
+        info = await store.get_info(data.token.key)
+
+    assert info
+    assert info.created == created
+    assert info.created.tzinfo == timezone.utc
+    assert info.expires == expires
+    assert info.last_used == expires
@@ -0,0 +1,64 @@
+"""Tests for the gafaelfawr.scopes package."""
+
+from __future__ import annotations
+
+from gafaelfawr.scopes import GroupMapping, ScopeIndex
+
+
+def test_group_mapping() -> None:
+    mapping = GroupMapping(
+        {
+            "admin": frozenset(["admin:token", "exec:admin", "read:all"]),
+            "foo": frozenset(["read:all"]),
+            "test": frozenset(["exec:test"]),
+        },
+        cache_size=2,
+    )
+    assert mapping["foo"] == frozenset(["read:all"])
+    assert sorted(mapping) == ["admin", "foo", "test"]
+    assert "bar" not in mapping
+
+    assert mapping.get_scopes([]) == []
+    assert mapping.get_scopes(["bar"]) == []
+    assert mapping.get_scopes(["foo", "test", "bar"]) == [
+        "exec:test",
+        "read:all",
+    ]
+    assert mapping.get_scopes(["test", "admin", "foo"]) == [
+        "admin:token",
+        "exec:admin",
+        "exec:test",
+        "read:all",
+    ]
+
+    # Cached results are not affected by changes to returned lists.
+    scopes = mapping.get_scopes(["foo"])
+    scopes.append("exec:test")
+    assert mapping.get_scopes(["foo"]) == ["read:all"]
+    assert mapping.get_scopes(iter(["foo", "foo"])) == ["read:all"]
+
+
+def test_scope_index() -> None:
+    index = ScopeIndex(["admin:token", "exec:admin", "read:all"])
+
+    token = index.compile(["read:all", "exec:admin", "other"])
+    assert token.header == "exec:admin other read:all"
+    assert token.unknown == frozenset(["other"])
+    assert index.compile(["read:all", "exec:admin", "other"]) is token
+
+    assert token.has_all(index.compile(["read:all"]))
+    assert token.has_all(index.compile(["exec:admin", "read:all"]))
+    assert token.has_all(index.compile(["other", "read:all"]))
+    assert token.has_all(index.compile([]))
+    assert not token.has_all(index.compile(["admin:token", "read:all"]))
+    assert not token.has_all(index.compile(["read:all", "unknown"]))
+
+    assert token.has_any(index.compile(["admin:token", "read:all"]))
+    assert token.has_any(index.compile(["other", "unknown"]))
+    assert not token.has_any(index.compile(["admin:token", "unknown"]))
+    assert not token.has_any(index.compile([]))
+
+    empty = index.compile([])
+    assert empty.header == ""
+    assert not empty.has_all(index.compile(["read:all"]))
+    assert not empty.has_any(index.compile(["read:all"]))
@@ -7,14 +7,20 @@ from datetime import datetime, timedelta, timezone
 from typing import TYPE_CHECKING
 
 import pytest
+import structlog
 from cryptography.fernet import Fernet
 from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from gafaelfawr.config import ChangeHistoryConfig, TokenCacheConfig
 from gafaelfawr.exceptions import (
     BadExpiresError,
     BadScopesError,
     PermissionDeniedError,
 )
+from gafaelfawr.factory import ComponentFactory, ProcessContext
+from gafaelfawr.models.history import TokenChange
 from gafaelfawr.models.token import (
     AdminTokenRequest,
     Token,
@@ -24,11 +30,30 @@ from gafaelfawr.models.token import (
     TokenType,
     TokenUserInfo,
 )
+from gafaelfawr.schema import TokenChangeHistory
+from gafaelfawr.storage.cache import TokenCache
+from gafaelfawr.storage.change_history import TokenChangeRecorder
+from gafaelfawr.storage.token import TokenDatabaseStore
 
 if TYPE_CHECKING:
+    from typing import List
+
     from tests.support.setup import SetupTest
 
 
+async def get_change_history(
+    setup: SetupTest, key: str
+) -> List[TokenChangeHistory]:
+    async with AsyncSession(setup.session.bind) as session:
+        stmt = (
+            select(TokenChangeHistory)
+            .where(TokenChangeHistory.token == key)
+            .order_by(TokenChangeHistory.id)
+        )
+        result = await session.execute(stmt)
+        return result.scalars().all()
+
+
 @pytest.mark.asyncio
 async def test_session_token(setup: SetupTest) -> None:
     token_service = setup.factory.create_token_service()
@@ -64,7 +89,9 @@ async def test_session_token(setup: SetupTest) -> None:
     expires = data.created + timedelta(minutes=setup.config.issuer.exp_minutes)
     assert data.expires == expires
 
-    assert token_service.get_token_info_unchecked(token.key) == TokenInfo(
+    assert await token_service.get_token_info_unchecked(
+        token.key
+    ) == TokenInfo(
         token=token.key,
         username=user_info.username,
         token_name=None,
@@ -84,7 +111,7 @@ async def test_session_token(setup: SetupTest) -> None:
     data = await token_service.get_data(token)
     assert data
     assert data.scopes == ["exec:admin", "read:all"]
-    info = token_service.get_token_info_unchecked(token.key)
+    info = await token_service.get_token_info_unchecked(token.key)
     assert info
     assert info.scopes == ["exec:admin", "read:all"]
 
@@ -118,7 +145,7 @@ async def test_user_token(setup: SetupTest) -> None:
         expires=expires,
     )
     assert await token_service.get_user_info(user_token) == user_info
-    info = token_service.get_token_info_unchecked(user_token.key)
+    info = await token_service.get_token_info_unchecked(user_token.key)
     assert info
     assert info == TokenInfo(
         token=user_token.key,
@@ -169,7 +196,7 @@ async def test_notebook_token(setup: SetupTest) -> None:
 
     notebook_token = await token_service.get_notebook_token(data)
     assert await token_service.get_user_info(notebook_token) == user_info
-    info = token_service.get_token_info_unchecked(notebook_token.key)
+    info = await token_service.get_token_info_unchecked(notebook_token.key)
     assert info
     assert info == TokenInfo(
         token=notebook_token.key,
@@ -208,7 +235,7 @@ async def test_notebook_token(setup: SetupTest) -> None:
     assert data
     new_notebook_token = await token_service.get_notebook_token(data)
     assert new_notebook_token != notebook_token
-    info = token_service.get_token_info_unchecked(new_notebook_token.key)
+    info = await token_service.get_token_info_unchecked(new_notebook_token.key)
     assert info
     expires = info.created + timedelta(minutes=setup.config.issuer.exp_minutes)
     assert info.expires == expires
@@ -233,7 +260,7 @@ async def test_internal_token(setup: SetupTest) -> None:
         data, service="some-service", scopes=["read:all"]
     )
     assert await token_service.get_user_info(internal_token) == user_info
-    info = token_service.get_token_info_unchecked(internal_token.key)
+    info = await token_service.get_token_info_unchecked(internal_token.key)
     assert info
     assert info == TokenInfo(
         token=internal_token.key,
@@ -286,13 +313,61 @@ async def test_internal_token(setup: SetupTest) -> None:
         data, service="some-service", scopes=[]
     )
     assert new_internal_token != internal_token
-    info = token_service.get_token_info_unchecked(new_internal_token.key)
+    info = await token_service.get_token_info_unchecked(new_internal_token.key)
     assert info
     assert info.scopes == []
     expires = info.created + timedelta(minutes=setup.config.issuer.exp_minutes)
     assert info.expires == expires
 
 
+@pytest.mark.asyncio
+async def test_child_token_index(setup: SetupTest) -> None:
+    data = await setup.create_session_token(scopes=["read:all"])
+    token_service = setup.factory.create_token_service()
+
+    notebook_token = await token_service.get_notebook_token(data)
+    internal_token = await token_service.get_internal_token(
+        data, service="some-service", scopes=["read:all"]
+    )
+    notebook_index = f"subtoken:{data.token.key}:notebook"
+    internal_index = (
+        f"subtoken:{data.token.key}:internal:some-service:read:all"
+    )
+    assert await setup.redis.get(notebook_index) == notebook_token.key.encode()
+    assert await setup.redis.get(internal_index) == internal_token.key.encode()
+    assert data.expires
+    lifetime = (data.expires - datetime.now(tz=timezone.utc)).total_seconds()
+    assert lifetime - 5 <= await setup.redis.ttl(notebook_index) <= lifetime
+    assert lifetime - 5 <= await setup.redis.ttl(internal_index) <= lifetime
+
+    # The parent of each child token is also recorded.
+    notebook_parent = f"subtoken-parent:{notebook_token.key}"
+    internal_parent = f"subtoken-parent:{internal_token.key}"
+    assert await setup.redis.get(notebook_parent) == data.token.key.encode()
+    assert await setup.redis.get(internal_parent) == (
+        f"{data.token.key}:some-service".encode()
+    )
+
+    # If the index entries are missing, as they will be for tokens created
+    # before the index was added, the child tokens are found in the database
+    # and the index is repaired.
+    await setup.redis.delete(notebook_index, internal_index)
+    assert notebook_token == await token_service.get_notebook_token(data)
+    assert internal_token == await token_service.get_internal_token(
+        data, service="some-service", scopes=["read:all"]
+    )
+    assert await setup.redis.get(notebook_index) == notebook_token.key.encode()
+    assert await setup.redis.get(internal_index) == internal_token.key.encode()
+
+    # If the child token no longer exists, a new one is created.
+    await setup.redis.delete(f"token:{notebook_token.key}")
+    new_notebook_token = await token_service.get_notebook_token(data)
+    assert new_notebook_token != notebook_token
+    assert await setup.redis.get(notebook_index) == (
+        new_notebook_token.key.encode()
+    )
+
+
 @pytest.mark.asyncio
 async def test_token_from_admin_request(setup: SetupTest) -> None:
     user_info = TokenUserInfo(
@@ -378,12 +453,16 @@ async def test_list(setup: SetupTest) -> None:
         data, data.username, token_name="some-token"
     )
 
-    session_info = token_service.get_token_info_unchecked(session_token.key)
+    session_info = await token_service.get_token_info_unchecked(
+        session_token.key
+    )
     assert session_info
-    user_token_info = token_service.get_token_info_unchecked(user_token.key)
+    user_token_info = await token_service.get_token_info_unchecked(
+        user_token.key
+    )
     assert user_token_info
-    assert token_service.list_tokens(data, "example") == sorted(
-        (session_info, user_token_info), key=lambda t: t.token
+    assert await token_service.list_tokens(data, "example") == sorted(
+        (session_info, user_token_info), key=lambda t: (t.created, t.token)
     )
 
 
@@ -410,7 +489,7 @@ async def test_modify(setup: SetupTest) -> None:
     await token_service.modify_token(
         user_token.key, data, scopes=["read:all"], expires=expires
     )
-    info = token_service.get_token_info_unchecked(user_token.key)
+    info = await token_service.get_token_info_unchecked(user_token.key)
     assert info
     assert info == TokenInfo(
         token=user_token.key,
@@ -436,12 +515,72 @@ async def test_delete(setup: SetupTest) -> None:
     assert await token_service.delete_token(token.key, data)
 
     assert await token_service.get_data(token) is None
-    assert token_service.get_token_info_unchecked(token.key) is None
+    assert await token_service.get_token_info_unchecked(token.key) is None
     assert await token_service.get_user_info(token) is None
 
     assert not await token_service.delete_token(token.key, data)
 
 
+@pytest.mark.asyncio
+async def test_delete_cascade(setup: SetupTest) -> None:
+    data = await setup.create_session_token(scopes=["read:all"])
+    token_service = setup.factory.create_token_service()
+    notebook_token = await token_service.get_notebook_token(data)
+    notebook_data = await token_service.get_data(notebook_token)
+    assert notebook_data
+    internal_token = await token_service.get_internal_token(
+        notebook_data, service="some-service", scopes=["read:all"]
+    )
+    user_token = await token_service.create_user_token(
+        data, data.username, token_name="some token"
+    )
+
+    assert await token_service.delete_token(
+        data.token.key, data, ip_address="192.0.2.1"
+    )
+
+    # The whole tree of child tokens is gone from Redis and the database,
+    # including the index entries, but the unrelated user token is not.
+    for token in (data.token, notebook_token, internal_token):
+        assert await token_service.get_data(token) is None
+        info = await token_service.get_token_info_unchecked(token.key)
+        assert info is None
+    notebook_index = f"subtoken:{data.token.key}:notebook"
+    internal_index = (
+        f"subtoken:{notebook_token.key}:internal:some-service:read:all"
+    )
+    assert await setup.redis.get(notebook_index) is None
+    assert await setup.redis.get(internal_index) is None
+    for token in (notebook_token, internal_token):
+        assert await setup.redis.get(f"subtoken-parent:{token.key}") is None
+    assert await token_service.get_data(user_token)
+
+    # Each revocation is recorded.
+    history = await get_change_history(setup, internal_token.key)
+    assert [h.action for h in history] == [
+        TokenChange.create,
+        TokenChange.revoke,
+    ]
+    assert history[1].parent == notebook_token.key
+    assert history[1].actor == data.username
+    assert history[1].ip_address == "192.0.2.1"
+
+    # Deleting a child token only deletes its own subtree and its index entry
+    # in the parent.
+    data = await setup.create_session_token(scopes=["read:all"])
+    notebook_token = await token_service.get_notebook_token(data)
+    notebook_data = await token_service.get_data(notebook_token)
+    assert notebook_data
+    internal_token = await token_service.get_internal_token(
+        notebook_data, service="some-service", scopes=["read:all"]
+    )
+    assert await token_service.delete_token(notebook_token.key, data)
+    assert await token_service.get_data(data.token)
+    assert await token_service.get_data(internal_token) is None
+    notebook_index = f"subtoken:{data.token.key}:notebook"
+    assert await setup.redis.get(notebook_index) is None
+
+
 @pytest.mark.asyncio
 async def test_invalid(setup: SetupTest) -> None:
     token_service = setup.factory.create_token_service()
@@ -530,3 +669,189 @@ async def test_invalid_username(setup: SetupTest) -> None:
             )
         with pytest.raises(ValidationError):
             AdminTokenRequest(username=user, token_type=TokenType.service)
+
+
+@pytest.mark.asyncio
+async def test_token_cache(setup: SetupTest) -> None:
+    data = await setup.create_session_token()
+    token_cache = TokenCache(
+        TokenCacheConfig(size=10, lifetime=60),
+        None,
+        structlog.get_logger("gafaelfawr"),
+    )
+    process_context = ProcessContext(
+        config=setup.config,
+        redis=setup.redis,
+        http_client=setup.client,
+        token_cache=token_cache,
+    )
+    factory = ComponentFactory(
+        process_context=process_context, session=setup.session
+    )
+    token_service = factory.create_token_service()
+    user_token = await token_service.create_user_token(
+        data, data.username, token_name="some token"
+    )
+
+    assert await token_service.get_data(user_token)
+    assert await token_service.get_data(user_token)
+    assert token_cache.stats.hits == 1
+    assert token_cache.stats.misses == 1
+
+    # Deleting the token must remove it from the cache.
+    assert await token_service.delete_token(user_token.key, data)
+    assert await token_service.get_data(user_token) is None
+    assert token_cache.stats.invalidations == 1
+
+
+@pytest.mark.asyncio
+async def test_change_history(setup: SetupTest) -> None:
+    data = await setup.create_session_token(scopes=["read:all"])
+    token_service = setup.factory.create_token_service()
+    history = await get_change_history(setup, data.token.key)
+    assert [h.action for h in history] == [TokenChange.create]
+
+    now = datetime.now(tz=timezone.utc).replace(microsecond=0)
+    expires = now + timedelta(days=10)
+    token = await token_service.create_user_token(
+        data,
+        data.username,
+        token_name="some token",
+        expires=expires,
+        ip_address="192.0.2.1",
+    )
+    new_expires = now + timedelta(days=50)
+    await token_service.modify_token(
+        token.key,
+        data,
+        token_name="happy token",
+        scopes=["read:all"],
+        expires=new_expires,
+        ip_address="192.0.2.2",
+    )
+    await token_service.delete_token(token.key, data, ip_address="192.0.2.3")
+
+    history = await get_change_history(setup, token.key)
+    assert [h.action for h in history] == [
+        TokenChange.create,
+        TokenChange.edit,
+        TokenChange.revoke,
+    ]
+    assert all(h.actor == data.username for h in history)
+    assert [h.ip_address for h in history] == [
+        "192.0.2.1",
+        "192.0.2.2",
+        "192.0.2.3",
+    ]
+    create, edit, revoke = history
+    assert create.token_type == TokenType.user
+    assert create.token_name == "some token"
+    assert create.scopes is None
+    assert create.expires == expires.replace(tzinfo=None)
+    assert edit.token_name == "happy token"
+    assert edit.old_token_name == "some token"
+    assert edit.scopes == "read:all"
+    assert edit.old_scopes is None
+    assert edit.expires == new_expires.replace(tzinfo=None)
+    assert edit.old_expires == expires.replace(tzinfo=None)
+    assert revoke.token_name == "happy token"
+    assert revoke.scopes == "read:all"
+
+    # Deleting a token records the revocation of its descendants as well.
+    notebook_token = await token_service.get_notebook_token(data)
+    notebook_data = await token_service.get_data(notebook_token)
+    assert notebook_data
+    internal_token = await token_service.get_internal_token(
+        notebook_data, "some-service", ["read:all"]
+    )
+    assert await token_service.delete_token(
+        data.token.key, data, ip_address="192.0.2.4"
+    )
+    for key in (data.token.key, notebook_token.key, internal_token.key):
+        history = await get_change_history(setup, key)
+        assert [h.action for h in history] == [
+            TokenChange.create,
+            TokenChange.revoke,
+        ]
+        revoke = history[1]
+        assert revoke.actor == data.username
+        assert revoke.ip_address == "192.0.2.4"
+    history = await get_change_history(setup, internal_token.key)
+    assert history[1].token_type == TokenType.internal
+    assert history[1].service == "some-service"
+    assert history[1].parent == notebook_token.key
+
+
+@pytest.mark.asyncio
+async def test_change_history_background(setup: SetupTest) -> None:
+    data = await setup.create_session_token(scopes=["read:all"])
+    recorder = TokenChangeRecorder(
+        ChangeHistoryConfig(queue_size=10, batch_size=10, flush_interval=60),
+        setup.session_factory,
+        setup.logger,
+    )
+    process_context = ProcessContext(
+        config=setup.config,
+        redis=setup.redis,
+        http_client=setup.client,
+        change_history=recorder,
+    )
+    factory = ComponentFactory(
+        process_context=process_context, session=setup.session
+    )
+    token_service = factory.create_token_service()
+
+    internal_token = await token_service.get_internal_token(
+        data, "some-service", ["read:all"], ip_address="192.0.2.1"
+    )
+    notebook_token = await token_service.get_notebook_token(
+        data, ip_address="192.0.2.1"
+    )
+    assert recorder.stats.queued == 2
+    assert await get_change_history(setup, internal_token.key) == []
+
+    await recorder.flush()
+    history = await get_change_history(setup, internal_token.key)
+    assert len(history) == 1
+    assert history[0].action == TokenChange.create
+    assert history[0].token_type == TokenType.internal
+    assert history[0].parent == data.token.key
+    assert history[0].service == "some-service"
+    assert history[0].actor == data.username
+    assert history[0].ip_address == "192.0.2.1"
+    history = await get_change_history(setup, notebook_token.key)
+    assert len(history) == 1
+    assert history[0].token_type == TokenType.notebook
+
+
+@pytest.mark.asyncio
+async def test_list_page(setup: SetupTest) -> None:
+    data = await setup.create_session_token()
+    token_service = setup.factory.create_token_service()
+    for i in range(4):
+        await token_service.create_user_token(
+            data, data.username, token_name=f"token {i}"
+        )
+    tokens = await token_service.list_tokens(data, data.username)
+    assert len(tokens) == 5
+
+    page, cursor = await token_service.list_tokens_page(
+        data, data.username, limit=3
+    )
+    assert page == tokens[:3]
+    assert cursor
+    page, cursor = await token_service.list_tokens_page(
+        data, data.username, limit=3, cursor=cursor
+    )
+    assert page == tokens[3:]
+    assert cursor is None
+
+    with pytest.raises(PermissionDeniedError):
+        await token_service.list_tokens_page(data, "other-user", limit=3)
+    with pytest.raises(PermissionDeniedError):
+        token_service.stream_tokens(data, "other-user")
+
+    # Stream in batches smaller than the number of tokens.
+    store = TokenDatabaseStore(setup.session)
+    streamed = [t async for t in store.stream(batch_size=2)]
+    assert streamed == tokens
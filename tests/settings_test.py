@@ -63,3 +63,11 @@ def test_config_invalid_token() -> None:
     settings_path = Path(__file__).parent / "settings" / "bad-token.yaml"
     with pytest.raises(ValidationError):
         parse_settings(settings_path)
+
+
+def test_config_invalid_auth_profile() -> None:
+    settings_path = (
+        Path(__file__).parent / "settings" / "bad-auth-profile.yaml"
+    )
+    with pytest.raises(ValidationError):
+        parse_settings(settings_path)
@@ -0,0 +1,138 @@
+"""Tests for background recording of authentication history."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from gafaelfawr.config import AuthHistoryConfig
+from gafaelfawr.models.history import TokenAuthHistoryEntry
+from gafaelfawr.models.token import TokenType
+from gafaelfawr.schema import TokenAuthHistory
+from gafaelfawr.storage.auth_history import AuthHistoryRecorder
+
+if TYPE_CHECKING:
+    from typing import Dict, List, Optional
+
+    from tests.support.setup import SetupTest
+
+
+def make_recorder(
+    setup: SetupTest,
+    *,
+    queue_size: int = 100,
+    batch_size: int = 10,
+    flush_interval: float = 60,
+    sample_rates: Optional[Dict[TokenType, float]] = None,
+) -> AuthHistoryRecorder:
+    config = AuthHistoryConfig(
+        queue_size=queue_size,
+        batch_size=batch_size,
+        flush_interval=flush_interval,
+        sample_rates=sample_rates or {},
+    )
+    return AuthHistoryRecorder(config, setup.session_factory, setup.logger)
+
+
+async def get_history(setup: SetupTest) -> List[TokenAuthHistory]:
+    async with AsyncSession(setup.session.bind) as session:
+        stmt = select(TokenAuthHistory).order_by(TokenAuthHistory.id)
+        result = await session.execute(stmt)
+        return result.scalars().all()
+
+
+@pytest.mark.asyncio
+async def test_flush(setup: SetupTest) -> None:
+    token_data = await setup.create_session_token(scopes=["read:all"])
+    recorder = make_recorder(setup, queue_size=5, batch_size=2)
+    now = datetime.now(tz=timezone.utc).replace(microsecond=0)
+
+    for _ in range(3):
+        recorder.record(token_data, ip_address="192.0.2.1", when=now)
+    assert recorder.stats.queued == 3
+    assert await get_history(setup) == []
+
+    await recorder.flush()
+    stats = recorder.stats
+    assert stats.queued == 0
+    assert stats.max_queued == 3
+    assert stats.recorded == 3
+    assert stats.written == 3
+    history = await get_history(setup)
+    assert len(history) == 3
+    assert history[0].token == token_data.token.key
+    assert history[0].username == token_data.username
+    assert history[0].token_type == TokenType.session
+    assert history[0].scopes == "read:all"
+    assert history[0].ip_address == "192.0.2.1"
+    assert history[0].event_time == now.replace(tzinfo=None)
+
+    # Once the queue is full, new events are dropped.
+    for _ in range(7):
+        recorder.record(token_data)
+    assert recorder.stats.queued == 5
+    assert recorder.stats.dropped == 2
+    await recorder.flush()
+    assert len(await get_history(setup)) == 8
+
+
+@pytest.mark.asyncio
+async def test_parameter_limit(setup: SetupTest) -> None:
+    token_data = await setup.create_session_token()
+    recorder = make_recorder(setup)
+
+    # Limit each insert to two rows, so that the batch needs two statements.
+    limit = 2 * len(TokenAuthHistoryEntry.__fields__)
+    for _ in range(3):
+        recorder.record(token_data)
+    with patch("gafaelfawr.storage.history.DATABASE_MAX_PARAMETERS", limit):
+        await recorder.flush()
+    assert recorder.stats.written == 3
+    assert len(await get_history(setup)) == 3
+
+
+@pytest.mark.asyncio
+async def test_sampling(setup: SetupTest) -> None:
+    session_data = await setup.create_session_token()
+    service_data = await setup.create_session_token()
+    service_data.token_type = TokenType.service
+    recorder = make_recorder(
+        setup,
+        sample_rates={TokenType.service: 0, TokenType.session: 1},
+    )
+
+    for _ in range(5):
+        recorder.record(session_data)
+        recorder.record(service_data)
+    assert recorder.stats.queued == 5
+    assert recorder.stats.sampled_out == 5
+    await recorder.flush()
+    history = await get_history(setup)
+    assert [h.token for h in history] == [session_data.token.key] * 5
+
+
+@pytest.mark.asyncio
+async def test_background(setup: SetupTest) -> None:
+    token_data = await setup.create_session_token()
+    recorder = make_recorder(setup, flush_interval=0.1)
+    await recorder.start()
+
+    recorder.record(token_data)
+    for _ in range(50):
+        await asyncio.sleep(0.1)
+        if not recorder.stats.queued:
+            break
+    assert not recorder.stats.queued
+    assert len(await get_history(setup)) == 1
+
+    # Queued events are written when the recorder is stopped.
+    recorder.record(token_data)
+    await recorder.stop()
+    assert recorder.stats.written == 2
+    assert len(await get_history(setup)) == 2
@@ -0,0 +1,183 @@
+"""Tests for the in-memory token cache."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Optional
+from unittest.mock import patch
+
+import pytest
+import structlog
+from aioredis import Channel
+
+from gafaelfawr.config import TokenCacheConfig
+from gafaelfawr.constants import TOKEN_CACHE_CHANNEL
+from gafaelfawr.models.token import Token, TokenData, TokenType
+from gafaelfawr.storage.cache import TokenCache, TokenCacheStats
+
+if TYPE_CHECKING:
+    from typing import List
+
+
+class FakePubSub:
+    """Minimal stand-in for the Redis pub/sub calls used by the cache.
+
+    mockaioredis does not support pub/sub, so this hands out channels that the
+    test can close to simulate losing the connection to Redis.
+    """
+
+    def __init__(self) -> None:
+        self.channels: List[Channel] = []
+        self.failures = 0
+
+    async def subscribe(self, name: str) -> List[Channel]:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Redis is down")
+        channel = Channel(name, is_pattern=False)
+        self.channels.append(channel)
+        return [channel]
+
+    async def unsubscribe(self, name: str) -> None:
+        self.channels[-1].close()
+
+
+def make_cache(size: int = 10, lifetime: int = 60) -> TokenCache:
+    config = TokenCacheConfig(size=size, lifetime=lifetime)
+    logger = structlog.get_logger("gafaelfawr")
+    return TokenCache(config, None, logger)
+
+
+def make_data(expires: Optional[datetime] = None) -> TokenData:
+    return TokenData(
+        token=Token(),
+        username="example",
+        token_type=TokenType.session,
+        scopes=["read:all"],
+        created=datetime.now(tz=timezone.utc),
+        expires=expires,
+    )
+
+
+def test_get_store() -> None:
+    cache = make_cache()
+    data = make_data()
+
+    assert cache.get(data.token) is None
+    cache.store(data)
+    assert cache.get(data.token) == data
+
+    # The cache must hand out copies so callers can't modify cached data.
+    cached = cache.get(data.token)
+    assert cached
+    cached.username = "other"
+    assert cache.get(data.token) == data
+
+    # The secret must match.
+    wrong_token = Token(key=data.token.key)
+    assert cache.get(wrong_token) is None
+
+    assert cache.stats == TokenCacheStats(
+        hits=3, misses=2, evictions=0, invalidations=0, size=1
+    )
+
+
+def test_expiration() -> None:
+    cache = make_cache()
+
+    # Tokens that have already expired are not cached.
+    data = make_data(expires=datetime.now(tz=timezone.utc) - timedelta(1))
+    cache.store(data)
+    assert cache.get(data.token) is None
+    assert cache.stats.size == 0
+
+    # Entries never outlive the token.
+    now = datetime.now(tz=timezone.utc)
+    expires = now + timedelta(seconds=1)
+    data = make_data(expires=expires)
+    cache.store(data)
+    assert cache.get(data.token) == data
+    entry = cache._entries[data.token.key]
+    assert entry.expires == expires.timestamp()
+
+    # Nor the configured lifetime.
+    data = make_data(expires=now + timedelta(days=1))
+    cache.store(data)
+    entry = cache._entries[data.token.key]
+    assert entry.expires <= now.timestamp() + 61
+
+
+def test_eviction() -> None:
+    cache = make_cache(size=2)
+    first = make_data()
+    second = make_data()
+    third = make_data()
+
+    cache.store(first)
+    cache.store(second)
+    assert cache.get(first.token) == first
+    cache.store(third)
+    assert cache.get(second.token) is None
+    assert cache.get(first.token) == first
+    assert cache.get(third.token) == third
+    assert cache.stats.evictions == 1
+    assert cache.stats.size == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate() -> None:
+    cache = make_cache()
+    data = make_data()
+    cache.store(data)
+
+    await cache.invalidate(data.token.key)
+    assert cache.get(data.token) is None
+    assert cache.stats.invalidations == 1
+
+    # Invalidations received from other workers.
+    cache.store(data)
+    channel = Channel(TOKEN_CACHE_CHANNEL, is_pattern=False)
+    listener = asyncio.create_task(cache.listen(channel))
+    channel.put_nowait(data.token.key.encode())
+    channel.close()
+    await listener
+    assert cache.get(data.token) is None
+    assert cache.stats.invalidations == 2
+
+
+@pytest.mark.asyncio
+@patch("gafaelfawr.storage.cache.TOKEN_CACHE_RESUBSCRIBE_DELAY", 0.01)
+async def test_resubscribe() -> None:
+    config = TokenCacheConfig(size=10, lifetime=60)
+    logger = structlog.get_logger("gafaelfawr")
+    pubsub = FakePubSub()
+    cache = TokenCache(config, pubsub, logger)
+    await cache.start()
+    data = make_data()
+    cache.store(data)
+
+    # Losing the channel drops the cache and disables caching until the
+    # subscription has been restored.
+    pubsub.failures = 1
+    pubsub.channels[0].close()
+    await asyncio.sleep(0)
+    assert cache.stats.size == 0
+    cache.store(data)
+    assert cache.get(data.token) is None
+    for _ in range(100):
+        if len(pubsub.channels) == 2:
+            break
+        await asyncio.sleep(0.01)
+    assert len(pubsub.channels) == 2
+    assert pubsub.failures == 0
+
+    # Caching resumes, and invalidations arrive on the new channel.
+    cache.store(data)
+    assert cache.get(data.token) == data
+    pubsub.channels[1].put_nowait(data.token.key.encode())
+    await asyncio.sleep(0)
+    assert cache.get(data.token) is None
+
+    await cache.stop()
+    assert pubsub.channels[1].is_active is False
@@ -0,0 +1,120 @@
+"""Tests for the compact serialization of stored models."""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import pytest
+from cryptography.fernet import Fernet
+from pydantic import BaseModel
+
+from gafaelfawr.models.oidc import OIDCAuthorization
+from gafaelfawr.models.token import Token, TokenData, TokenGroup, TokenType
+from gafaelfawr.storage.base import RedisStorage
+from gafaelfawr.storage.codec import COMPACT_VERSION, ModelCodec
+
+if TYPE_CHECKING:
+    from tests.support.setup import SetupTest
+
+
+def test_token_data() -> None:
+    codec = ModelCodec(TokenData)
+    now = datetime.now(tz=timezone.utc).replace(microsecond=0)
+    data = TokenData(
+        token=Token(),
+        username="example",
+        token_type=TokenType.session,
+        scopes=["exec:admin", "read:all"],
+        created=now,
+        expires=None,
+        name="Example Person",
+        uid=4137,
+        groups=[TokenGroup(name="foo", id=1000)],
+    )
+
+    encoded = codec.encode(data)
+    assert encoded[0] == COMPACT_VERSION
+    assert len(encoded) < len(data.json())
+    decoded = codec.decode(encoded)
+    assert decoded == data
+    assert decoded == TokenData.parse_raw(data.json())
+    assert decoded.token_type == TokenType.session
+    assert decoded.created == now
+    assert decoded.groups == [TokenGroup(name="foo", id=1000)]
+
+    data.groups = None
+    assert codec.decode(codec.encode(data)) == data
+
+
+def test_oidc_authorization() -> None:
+    codec = ModelCodec(OIDCAuthorization)
+    authorization = OIDCAuthorization(
+        client_id="some-client",
+        redirect_uri="https://example.com/",
+        token=Token(),
+    )
+
+    decoded = codec.decode(codec.encode(authorization))
+    assert decoded == OIDCAuthorization.parse_raw(authorization.json())
+
+
+def test_added_field() -> None:
+    class Old(BaseModel):
+        name: str
+
+    class New(BaseModel):
+        name: str
+        groups: List[str] = []
+        uid: Optional[int] = None
+
+    encoded = ModelCodec(Old).encode(Old(name="example"))
+    assert ModelCodec(New).decode(encoded) == New(name="example")
+
+    with pytest.raises(ValueError):
+        ModelCodec(Old).decode(ModelCodec(New).encode(New(name="example")))
+
+
+def test_invalid() -> None:
+    codec = ModelCodec(TokenGroup)
+
+    with pytest.raises(ValueError):
+        codec.decode(b"")
+    with pytest.raises(ValueError):
+        codec.decode(json.dumps({"name": "foo", "id": 1000}).encode())
+    with pytest.raises(ValueError):
+        codec.decode(bytes([COMPACT_VERSION + 1]) + b'["foo",1000]')
+    with pytest.raises(ValueError):
+        codec.decode(bytes([COMPACT_VERSION]) + b'{"name":"foo"}')
+
+
+def test_supports() -> None:
+    class Mapping(BaseModel):
+        data: Dict[str, int]
+
+    assert ModelCodec.supports(TokenData)
+    assert ModelCodec.supports(OIDCAuthorization)
+    assert not ModelCodec.supports(Mapping)
+    with pytest.raises(TypeError):
+        ModelCodec(Mapping)
+
+
+@pytest.mark.asyncio
+async def test_redis_storage(setup: SetupTest) -> None:
+    key = setup.config.session_secret
+    fernet = Fernet(key.encode())
+    json_storage = RedisStorage(TokenGroup, key, setup.redis)
+    compact_storage = RedisStorage(TokenGroup, key, setup.redis, compact=True)
+    group = TokenGroup(name="foo", id=1000)
+
+    # JSON is written by default, and both forms are read by either.
+    await json_storage.store("json", group, None)
+    data = fernet.decrypt(await setup.redis.get("json"))
+    assert json.loads(data) == {"name": "foo", "id": 1000}
+    await compact_storage.store("compact", group, None)
+    data = fernet.decrypt(await setup.redis.get("compact"))
+    assert data[0] == COMPACT_VERSION
+    for storage in (json_storage, compact_storage):
+        assert await storage.get("json") == group
+        assert await storage.get("compact") == group
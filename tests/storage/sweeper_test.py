@@ -0,0 +1,106 @@
+"""Tests for deletion of expired tokens."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from gafaelfawr.config import TokenSweeperConfig
+from gafaelfawr.models.history import TokenChange
+from gafaelfawr.models.token import Token, TokenData, TokenType
+from gafaelfawr.schema import TokenChangeHistory
+from gafaelfawr.schema.subtoken import Subtoken
+from gafaelfawr.storage.sweeper import TokenSweeper
+from gafaelfawr.storage.token import TokenDatabaseStore
+
+if TYPE_CHECKING:
+    from typing import List, Optional, Tuple
+
+    from tests.support.setup import SetupTest
+
+
+def make_sweeper(setup: SetupTest, batch_size: int = 10) -> TokenSweeper:
+    config = TokenSweeperConfig(
+        enabled=False, interval=60, batch_size=batch_size, delay=0
+    )
+    return TokenSweeper(config, setup.session_factory, setup.logger)
+
+
+async def add_token(
+    setup: SetupTest,
+    expires: Optional[datetime],
+    parent: Optional[str] = None,
+) -> str:
+    now = datetime.now(tz=timezone.utc).replace(microsecond=0)
+    data = TokenData(
+        token=Token(),
+        username="some-user",
+        token_type=TokenType.session,
+        scopes=[],
+        created=now - timedelta(days=2),
+        expires=expires,
+    )
+    async with AsyncSession(setup.session.bind) as session:
+        async with session.begin():
+            await TokenDatabaseStore(session).add(data, parent=parent)
+    return data.token.key
+
+
+async def token_exists(setup: SetupTest, key: str) -> bool:
+    async with AsyncSession(setup.session.bind) as session:
+        info = await TokenDatabaseStore(session).get_info(key)
+    return info is not None
+
+
+async def get_subtokens(
+    setup: SetupTest,
+) -> List[Tuple[str, Optional[str]]]:
+    async with AsyncSession(setup.session.bind) as session:
+        stmt = select(Subtoken.child, Subtoken.parent)
+        result = await session.execute(stmt)
+        return [(child, parent) for child, parent in result.all()]
+
+
+@pytest.mark.asyncio
+async def test_sweep(setup: SetupTest) -> None:
+    now = datetime.now(tz=timezone.utc).replace(microsecond=0)
+    expired = [
+        await add_token(setup, now - timedelta(hours=1)) for _ in range(5)
+    ]
+    child = await add_token(setup, now - timedelta(hours=1), expired[0])
+    current = await add_token(setup, now + timedelta(hours=1))
+    forever = await add_token(setup, None)
+    orphan = await add_token(setup, None, expired[1])
+
+    # A batch size smaller than the number of expired tokens requires
+    # several batches.
+    sweeper = make_sweeper(setup, batch_size=2)
+    assert await sweeper.sweep() == 6
+
+    for key in [*expired, child]:
+        assert not await token_exists(setup, key)
+    assert await token_exists(setup, current)
+    assert await token_exists(setup, forever)
+    assert await token_exists(setup, orphan)
+
+    # Subtoken entries of deleted tokens are deleted, and entries of tokens
+    # whose parent was deleted no longer have a parent.
+    assert await get_subtokens(setup) == [(orphan, None)]
+
+    # Each deletion is recorded as an expiration at the time the token
+    # expired.
+    async with AsyncSession(setup.session.bind) as session:
+        result = await session.execute(select(TokenChangeHistory))
+        history = {h.token: h for h in result.scalars().all()}
+    assert sorted(history) == sorted([*expired, child])
+    for entry in history.values():
+        assert entry.action == TokenChange.expire
+        assert entry.actor is None
+        expires = now - timedelta(hours=1)
+        assert entry.event_time == expires.replace(tzinfo=None)
+
+    assert await sweeper.sweep() == 0
@@ -0,0 +1,127 @@
+"""Tests for write-behind tracking of token usage."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from gafaelfawr.config import TokenUsageConfig
+from gafaelfawr.storage.token import TokenDatabaseStore
+from gafaelfawr.storage.usage import TokenUsageTracker
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+    from tests.support.setup import SetupTest
+
+
+def make_tracker(
+    setup: SetupTest,
+    flush_interval: float = 60,
+    batch_size: int = 10,
+    queue_size: int = 100,
+) -> TokenUsageTracker:
+    config = TokenUsageConfig(
+        flush_interval=flush_interval,
+        batch_size=batch_size,
+        queue_size=queue_size,
+    )
+    return TokenUsageTracker(config, setup.session_factory, setup.logger)
+
+
+async def get_last_used(setup: SetupTest, key: str) -> Optional[datetime]:
+    async with AsyncSession(setup.session.bind) as session:
+        info = await TokenDatabaseStore(session).get_info(key)
+    assert info
+    return info.last_used
+
+
+@pytest.mark.asyncio
+async def test_flush(setup: SetupTest) -> None:
+    first = await setup.create_session_token()
+    second = await setup.create_session_token()
+    tracker = make_tracker(setup, batch_size=1)
+    now = datetime.now(tz=timezone.utc).replace(microsecond=0)
+
+    tracker.record(first.token.key, now - timedelta(seconds=10))
+    tracker.record(first.token.key, now)
+    tracker.record(second.token.key, now)
+    assert tracker.pending == 2
+    assert await get_last_used(setup, first.token.key) is None
+
+    await tracker.flush()
+    assert tracker.pending == 0
+    assert await get_last_used(setup, first.token.key) == now
+    assert await get_last_used(setup, second.token.key) == now
+
+    # The last use time never moves backwards.
+    tracker.record(first.token.key, now - timedelta(minutes=1))
+    await tracker.flush()
+    assert await get_last_used(setup, first.token.key) == now
+
+
+@pytest.mark.asyncio
+async def test_background(setup: SetupTest) -> None:
+    token_data = await setup.create_session_token()
+    tracker = make_tracker(setup, flush_interval=0.1)
+    await tracker.start()
+
+    tracker.record(token_data.token.key)
+    for _ in range(50):
+        await asyncio.sleep(0.1)
+        if not tracker.pending:
+            break
+    assert not tracker.pending
+    assert await get_last_used(setup, token_data.token.key)
+
+    # Pending usage is written when the tracker is stopped.
+    later = datetime.now(tz=timezone.utc) + timedelta(minutes=1)
+    later = later.replace(microsecond=0)
+    tracker.record(token_data.token.key, later)
+    await tracker.stop()
+    assert not tracker.pending
+    assert await get_last_used(setup, token_data.token.key) == later
+
+
+@pytest.mark.asyncio
+async def test_queue_full(setup: SetupTest) -> None:
+    first = await setup.create_session_token()
+    second = await setup.create_session_token()
+    tracker = make_tracker(setup, queue_size=1)
+    now = datetime.now(tz=timezone.utc).replace(microsecond=0)
+
+    # Repeated uses of a queued token replace it rather than being dropped.
+    tracker.record(first.token.key, now - timedelta(seconds=10))
+    tracker.record(first.token.key, now)
+    tracker.record(second.token.key, now)
+    assert tracker.stats.dropped == 1
+    assert tracker.stats.recorded == 2
+
+    await tracker.flush()
+    assert await get_last_used(setup, first.token.key) == now
+    assert await get_last_used(setup, second.token.key) is None
+
+
+@pytest.mark.asyncio
+async def test_write_failure(setup: SetupTest) -> None:
+    token_data = await setup.create_session_token()
+    tracker = make_tracker(setup)
+    now = datetime.now(tz=timezone.utc).replace(microsecond=0)
+
+    # Usage that could not be written is kept to retry on the next flush.
+    tracker.record(token_data.token.key, now)
+    with patch.object(
+        TokenDatabaseStore, "update_last_used", side_effect=Exception("oops")
+    ):
+        await tracker.flush()
+    assert tracker.stats.failed == 1
+    assert tracker.pending == 1
+
+    await tracker.flush()
+    assert tracker.pending == 0
+    assert await get_last_used(setup, token_data.token.key) == now
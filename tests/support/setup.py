@@ -2,20 +2,28 @@
 
 from __future__ import annotations
 
+import hashlib
+import json
 from contextlib import asynccontextmanager
 from typing import TYPE_CHECKING
 from unittest.mock import ANY
-from urllib.parse import parse_qs, urljoin
+from urllib.parse import parse_qs, urlencode, urljoin, urlparse
 
+import structlog
 from asgi_lifespan import LifespanManager
 from httpx import AsyncClient
 from pytest_httpx import to_response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
 
 from gafaelfawr.constants import COOKIE_NAME
-from gafaelfawr.database import initialize_database
+from gafaelfawr.database import (
+    create_async_database_engine,
+    initialize_database,
+)
 from gafaelfawr.dependencies.config import config_dependency
 from gafaelfawr.dependencies.redis import redis_dependency
-from gafaelfawr.factory import ComponentFactory
+from gafaelfawr.factory import ComponentFactory, ProcessContext
 from gafaelfawr.main import app
 from gafaelfawr.models.state import State
 from gafaelfawr.models.token import Token, TokenData, TokenGroup, TokenUserInfo
@@ -32,6 +40,7 @@ if TYPE_CHECKING:
     from httpx import Request
     from pytest_httpx import HTTPXMock
     from pytest_httpx._httpx_internals import Response
+    from structlog.stdlib import BoundLogger
 
     from gafaelfawr.config import Config, OIDCClient
     from gafaelfawr.keypair import RSAKeyPair
@@ -80,6 +89,8 @@ class SetupTest:
         initialize_database(config)
         redis_dependency.is_mocked = True
         redis = await redis_dependency(config)
+        engine = create_async_database_engine(database_url)
+        session = AsyncSession(engine, expire_on_commit=False)
         try:
             async with LifespanManager(app):
                 base_url = f"https://{TEST_HOSTNAME}"
@@ -89,9 +100,12 @@ class SetupTest:
                         httpx_mock=httpx_mock,
                         config=config,
                         redis=redis,
+                        session=session,
                         client=client,
                     )
         finally:
+            await session.close()
+            await engine.dispose()
             await redis_dependency.close()
 
     def __init__(
@@ -101,12 +115,14 @@ class SetupTest:
         httpx_mock: HTTPXMock,
         config: Config,
         redis: Redis,
+        session: AsyncSession,
         client: AsyncClient,
     ) -> None:
         self.tmp_path = tmp_path
         self.httpx_mock = httpx_mock
         self.config = config
         self.redis = redis
+        self.session = session
         self.client = client
 
     @property
@@ -121,9 +137,33 @@ class SetupTest:
         factory : `gafaelfawr.factory.ComponentFactory`
             Newly-created factory.
         """
-        return ComponentFactory(
+        process_context = ProcessContext(
             config=self.config, redis=self.redis, http_client=self.client
         )
+        return ComponentFactory(
+            process_context=process_context, session=self.session
+        )
+
+    @property
+    def logger(self) -> BoundLogger:
+        """Return the logger used by the application."""
+        return structlog.get_logger(self.config.safir.logger_name)
+
+    @property
+    def session_factory(self) -> sessionmaker:
+        """Return a factory for new sessions on the test database.
+
+        Background writers such as the token usage tracker open their own
+        sessions rather than using the session of a request.
+
+        Returns
+        -------
+        session_factory : `sqlalchemy.orm.sessionmaker`
+            Factory for new `~sqlalchemy.ext.asyncio.AsyncSession` objects.
+        """
+        return sessionmaker(
+            self.session.bind, class_=AsyncSession, expire_on_commit=False
+        )
 
     def configure(
         self,
@@ -269,9 +309,27 @@ class SetupTest:
         """
         assert self.config.github
 
+        def conditional(
+            request: Request,
+            data: List[Dict[str, Any]],
+            headers: Optional[Dict[str, str]] = None,
+        ) -> Response:
+            body = json.dumps(data).encode()
+            etag = '"' + hashlib.sha256(body).hexdigest() + '"'
+            headers = {
+                **(headers or {}),
+                "ETag": etag,
+                "X-RateLimit-Remaining": "4999",
+            }
+            if request.headers.get("If-None-Match") == etag:
+                return to_response(status_code=304, headers=headers)
+            return to_response(json=data, headers=headers)
+
         def callback(request: Request, ext: Dict[str, Any]) -> Response:
             assert request.headers["Authorization"] == f"token {token}"
             assert request.method == "GET"
+            url = urlparse(str(request.url))
+            base_url = url._replace(query="").geturl()
             if str(request.url) == GitHubProvider._USER_URL:
                 return to_response(
                     json={
@@ -280,23 +338,32 @@ class SetupTest:
                         "name": user_info.name,
                     }
                 )
-            elif str(request.url) == GitHubProvider._TEAMS_URL:
+            elif base_url == GitHubProvider._TEAMS_URL:
+                query = parse_qs(url.query)
+                per_page = int(query["per_page"][0])
+                page = int(query.get("page", ["1"])[0])
+                start = (page - 1) * per_page
                 teams = []
-                for team in user_info.teams:
+                for team in user_info.teams[start : start + per_page]:
                     data = {
                         "slug": team.slug,
                         "id": team.gid,
                         "organization": {"login": team.organization},
                     }
                     teams.append(data)
-                return to_response(json=teams)
+                headers = {}
+                last_page = (len(user_info.teams) - 1) // per_page + 1
+                if last_page > 1:
+                    params = {"per_page": per_page, "page": last_page}
+                    last_url = f"{base_url}?{urlencode(params)}"
+                    headers["Link"] = f'<{last_url}>; rel="last"'
+                return conditional(request, teams, headers)
             elif str(request.url) == GitHubProvider._EMAILS_URL:
-                return to_response(
-                    json=[
-                        {"email": "otheremail@example.com", "primary": False},
-                        {"email": user_info.email, "primary": True},
-                    ]
-                )
+                emails = [
+                    {"email": "otheremail@example.com", "primary": False},
+                    {"email": user_info.email, "primary": True},
+                ]
+                return conditional(request, emails)
             else:
                 assert False, f"unexpected request for {request.url}"
 
@@ -2,23 +2,28 @@
 
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timedelta, timezone
 from typing import TYPE_CHECKING
 from urllib.parse import urljoin
 
 import jwt
 import pytest
+import structlog
+from httpx import AsyncClient
 from jwt.exceptions import InvalidIssuerError
 
 from gafaelfawr.constants import ALGORITHM
 from gafaelfawr.exceptions import (
     FetchKeysException,
+    InvalidTokenError,
     MissingClaimsException,
     UnknownAlgorithmException,
     UnknownKeyIdException,
 )
 from gafaelfawr.keypair import RSAKeyPair
 from gafaelfawr.models.oidc import OIDCToken
+from gafaelfawr.verify import JWKSCache, TokenVerifier, VerifiedTokenCache
 
 if TYPE_CHECKING:
     from typing import Any, Dict, Optional
@@ -95,8 +100,7 @@ async def test_verify_oidc(setup: SetupTest) -> None:
     expected = f"No {setup.config.verifier.username_claim} claim in token"
     assert str(excinfo.value) == expected
 
-    # Missing UID claim.
-    setup.set_oidc_configuration_response(keypair)
+    # Missing UID claim.  The keys are now cached.
     payload[setup.config.verifier.username_claim] = "some-user"
     token = encode_token(payload, setup.config.issuer.keypair, kid=kid)
     with pytest.raises(MissingClaimsException) as excinfo:
@@ -131,7 +135,11 @@ async def test_verify_oidc_no_kids(setup: SetupTest) -> None:
 async def test_key_retrieval(setup: SetupTest) -> None:
     setup.configure("oidc-no-kids")
     assert setup.config.oidc
-    verifier = setup.factory.create_token_verifier()
+    logger = structlog.get_logger(setup.config.safir.logger_name)
+
+    # Disable caching so that each verification retrieves the keys.
+    jwks_cache = JWKSCache(AsyncClient(), lifetime=0, refresh_interval=0)
+    verifier = TokenVerifier(setup.config.verifier, jwks_cache, logger)
 
     # Initial working JWKS configuration.
     keys = [setup.config.issuer.keypair.public_key_as_jwks("some-kid")]
@@ -196,3 +204,151 @@ async def test_key_retrieval(setup: SetupTest) -> None:
         url=oidc_url, method="GET", json={"jwks_uri": jwks_url}
     )
     assert await verifier.verify_oidc_token(token)
+
+
+@pytest.mark.asyncio
+async def test_key_cache(setup: SetupTest) -> None:
+    setup.configure("oidc-no-kids")
+    assert setup.config.oidc
+    logger = structlog.get_logger(setup.config.safir.logger_name)
+    jwks_cache = JWKSCache(AsyncClient(), lifetime=0, refresh_interval=0)
+    verifier = TokenVerifier(setup.config.verifier, jwks_cache, logger)
+    oidc_url = urljoin(
+        setup.config.oidc.issuer, "/.well-known/openid-configuration"
+    )
+    jwks_url = urljoin(setup.config.oidc.issuer, "/jwks.json")
+    cache_headers = {"Cache-Control": "public, max-age=3600"}
+    keys = [setup.config.issuer.keypair.public_key_as_jwks("some-kid")]
+    setup.httpx_mock.add_response(
+        url=oidc_url,
+        method="GET",
+        json={"jwks_uri": jwks_url},
+        headers=cache_headers,
+    )
+    setup.httpx_mock.add_response(
+        url=jwks_url, method="GET", json={"keys": keys}, headers=cache_headers
+    )
+
+    # Repeated verification only retrieves the metadata and keys once.
+    token = setup.create_upstream_oidc_token(kid="some-kid")
+    assert await verifier.verify_oidc_token(token)
+    assert await verifier.verify_oidc_token(token)
+    assert len(setup.httpx_mock.get_requests()) == 2
+
+    # An unknown key ID forces a refresh of the keys but not the metadata.
+    # A burst of concurrent requests sends only one request upstream.
+    keypair = RSAKeyPair.generate()
+    keys.append(keypair.public_key_as_jwks("new-kid"))
+    setup.httpx_mock.add_response(
+        url=jwks_url, method="GET", json={"keys": keys}, headers=cache_headers
+    )
+    token = encode_token(
+        {
+            "aud": setup.config.verifier.oidc_aud,
+            "iss": setup.config.verifier.oidc_iss,
+            "exp": int(datetime.now(tz=timezone.utc).timestamp()) + 3600,
+            setup.config.verifier.username_claim: "some-user",
+            setup.config.verifier.uid_claim: "1000",
+        },
+        keypair,
+        kid="new-kid",
+    )
+    results = await asyncio.gather(
+        *[verifier.verify_oidc_token(token) for _ in range(10)]
+    )
+    assert all(r.username == "some-user" for r in results)
+    assert len(setup.httpx_mock.get_requests(url=jwks_url)) == 2
+    assert len(setup.httpx_mock.get_requests(url=oidc_url)) == 1
+
+    # A key ID that is still unknown after a refresh is rejected.
+    token = setup.create_upstream_oidc_token(kid="other-kid")
+    with pytest.raises(UnknownKeyIdException):
+        await verifier.verify_oidc_token(token)
+    assert len(setup.httpx_mock.get_requests(url=jwks_url)) == 3
+
+
+@pytest.mark.asyncio
+async def test_key_cache_limits(setup: SetupTest) -> None:
+    setup.configure("oidc-no-kids")
+    assert setup.config.oidc
+    logger = structlog.get_logger(setup.config.safir.logger_name)
+    jwks_cache = JWKSCache(
+        AsyncClient(),
+        lifetime=setup.config.verifier.oidc_keys_lifetime,
+        refresh_interval=setup.config.verifier.oidc_keys_refresh_interval,
+    )
+    verifier = TokenVerifier(setup.config.verifier, jwks_cache, logger)
+    oidc_url = urljoin(
+        setup.config.oidc.issuer, "/.well-known/openid-configuration"
+    )
+    jwks_url = urljoin(setup.config.oidc.issuer, "/jwks.json")
+    keys = [setup.config.issuer.keypair.public_key_as_jwks("some-kid")]
+    setup.httpx_mock.add_response(
+        url=oidc_url, method="GET", json={"jwks_uri": jwks_url}
+    )
+    setup.httpx_mock.add_response(
+        url=jwks_url, method="GET", json={"keys": keys}
+    )
+
+    # Responses without caching headers are cached for the minimum lifetime.
+    token = setup.create_upstream_oidc_token(kid="some-kid")
+    assert await verifier.verify_oidc_token(token)
+    assert await verifier.verify_oidc_token(token)
+    assert len(setup.httpx_mock.get_requests()) == 2
+
+    # Unknown key IDs do not force a refresh if the keys were just retrieved.
+    token = setup.create_upstream_oidc_token(kid="other-kid")
+    for _ in range(5):
+        with pytest.raises(UnknownKeyIdException):
+            await verifier.verify_oidc_token(token)
+    assert len(setup.httpx_mock.get_requests()) == 2
+
+    # Once the refresh interval has passed, they force one refresh.
+    interval = setup.config.verifier.oidc_keys_refresh_interval
+    assert setup.config.oidc.issuer in jwks_cache._keys
+    jwks_cache._keys[setup.config.oidc.issuer].fetched -= interval
+    setup.httpx_mock.add_response(
+        url=jwks_url, method="GET", json={"keys": keys}
+    )
+    for _ in range(5):
+        with pytest.raises(UnknownKeyIdException):
+            await verifier.verify_oidc_token(token)
+    assert len(setup.httpx_mock.get_requests(url=jwks_url)) == 2
+    assert len(setup.httpx_mock.get_requests(url=oidc_url)) == 1
+
+
+@pytest.mark.asyncio
+async def test_verified_token_cache(setup: SetupTest) -> None:
+    token_data = await setup.create_session_token()
+    issuer = setup.factory.create_token_issuer()
+    oidc_token = issuer.issue_token(token_data, jti="some-jti")
+    other_token = issuer.issue_token(token_data, jti="other-jti")
+    cache = VerifiedTokenCache(1)
+    logger = structlog.get_logger(setup.config.safir.logger_name)
+    jwks_cache = JWKSCache(AsyncClient(), lifetime=0, refresh_interval=0)
+    verifier = TokenVerifier(setup.config.verifier, jwks_cache, logger, cache)
+
+    # The second verification is answered from the cache.
+    unverified = OIDCToken(encoded=oidc_token.encoded)
+    verified = verifier.verify_internal_token(unverified)
+    assert verifier.verify_internal_token(unverified) is verified
+    assert verified.claims == oidc_token.claims
+    stats = cache.stats
+    assert (stats.hits, stats.misses, stats.size) == (1, 1, 1)
+
+    # Invalid tokens are not cached.
+    bad_token = OIDCToken(encoded=oidc_token.encoded[:-8] + "AAAAAAAA")
+    with pytest.raises(InvalidTokenError):
+        verifier.verify_internal_token(bad_token)
+    assert cache.stats.size == 1
+
+    # The cache is bounded.
+    verifier.verify_internal_token(OIDCToken(encoded=other_token.encoded))
+    assert cache.get(oidc_token.encoded) is None
+    assert cache.stats.evictions == 1
+
+    # Expired tokens are dropped from the cache.
+    expired = verified.copy(update={"claims": {**verified.claims, "exp": 0}})
+    cache.store(expired)
+    assert cache.get(expired.encoded) is None
+    assert cache.stats.size == 0